@@ -1,21 +1,41 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory, stream_with_context
 from werkzeug.utils import secure_filename
 import os
-from config.config import API_KEY, KNOWLEDGE_BASE_DIR
-from src.rag.rag_system import RAGSystem
+import json
+import time
+import uuid
+from config.config import (
+    API_KEY, KNOWLEDGE_BASE_DIR, JOB_DB_PATH, INGEST_WORKERS, INGEST_MAX_YIELD_SECONDS,
+    BATCH_MAX_QUERIES, DEFAULT_COLLECTION
+)
+from src.rag.collection_manager import CollectionManager, CollectionUnavailable
+from src.rag.job_queue import JobQueue, PriorityGate
+from src.monitoring import metrics
+from src.storage.metadata import MetadataFilter
+
+# 冷启动计时起点
+STARTED_AT = time.time()
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = KNOWLEDGE_BASE_DIR
 app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024  # 32MB
 
 # 确保上传目录存在
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+os.makedirs(KNOWLEDGE_BASE_DIR, exist_ok=True)
 
-# 初始化 RAG 系统
-rag = RAGSystem(
-    knowledge_base_dir=KNOWLEDGE_BASE_DIR,
-    api_key=API_KEY
-)
+# 以下对象在导入时启动后台线程并写入 data/ 下的快照、清单和任务表，
+# 同一数据目录只能由一个进程导入本模块（见文件末尾关闭自动重载的说明）
+# 按集合划分的知识库；其他集合在首次请求时加载，空闲集合在内存超出预算时卸载
+collections = CollectionManager(API_KEY)
+# 默认集合在后台加载（连接存储、检查表结构、加载索引，再同步知识库目录），服务立即开始监听
+collections.warmup(DEFAULT_COLLECTION)
+
+# 后台摄取任务，优先级低于聊天请求
+priority_gate = PriorityGate(max_wait=INGEST_MAX_YIELD_SECONDS)
+jobs = JobQueue(collections, db_path=JOB_DB_PATH, workers=INGEST_WORKERS, gate=priority_gate)
+
+INIT_SECONDS = round(time.time() - STARTED_AT, 3)
+metrics.observe('startup_init', INIT_SECONDS)
+print(f"App initialized in {INIT_SECONDS:.2f}s, loading collection {DEFAULT_COLLECTION} in the background")
 
 # 支持的文件类型
 ALLOWED_EXTENSIONS = {'doc', 'docx', 'pdf', 'txt', 'jpg', 'jpeg', 'png'}
@@ -23,10 +43,60 @@ ALLOWED_EXTENSIONS = {'doc', 'docx', 'pdf', 'txt', 'jpg', 'jpeg', 'png'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def parse_collection(name, must_exist=True):
+    """请求指定的知识库集合，未指定时为默认集合；名称无效抛出 ValueError，不存在抛出 KeyError"""
+    name = collections.validate(name)
+    if must_exist and not collections.exists(name):
+        raise KeyError(name)
+    return name
+
+def collection_error(e):
+    if isinstance(e, KeyError):
+        return jsonify({'error': f'集合不存在: {e.args[0]}'}), 404
+    return jsonify({'error': f'集合名称无效: {e}'}), 400
+
+def collection_unavailable(e):
+    """集合仍在加载或加载失败时的降级响应，客户端按 Retry-After 重试"""
+    if e.state == 'failed':
+        message = f'知识库集合 {e.name} 加载失败，稍后重试时将重新加载: {e.error}'
+    else:
+        message = f'知识库集合 {e.name} 正在加载，请稍后重试'
+    response = jsonify({'error': message, 'collection': e.name, 'state': e.state})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def sync_warning(collection):
+    """知识库目录仍在后台同步时，回答可能不包含尚未索引的文件"""
+    if collections.status(collection)['state'] == 'syncing':
+        return '知识库仍在同步中，回答可能不包含尚未索引的文件'
+    return None
+
 @app.route('/')
 def home():
     return render_template('index.html')
 
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """存活检查：进程能够处理请求即返回200"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """就绪检查：默认集合的存储与索引加载完成后返回200，此时知识库目录可能仍在后台同步"""
+    status = collections.status(DEFAULT_COLLECTION)
+    ready = status['state'] in ('syncing', 'ready')
+    startup = {'init_seconds': INIT_SECONDS}
+    if status.get('loaded_at'):
+        startup['cold_start_seconds'] = round(status['loaded_at'] - STARTED_AT, 3)
+    if status.get('synced_at'):
+        startup['synced_seconds'] = round(status['synced_at'] - STARTED_AT, 3)
+    return jsonify({
+        'ready': ready,
+        'state': status['state'],
+        'startup': startup,
+        'collection': status
+    }), 200 if ready else 503
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     try:
@@ -39,36 +109,71 @@ def upload_file():
             
         if not file or not allowed_file(file.filename):
             return jsonify({'error': '不支持的文件类型。支持的类型：doc, docx, pdf, txt, jpg, jpeg, png'}), 400
+
+        # 上传到尚不存在的集合时创建该集合
+        try:
+            collection = parse_collection(request.form.get('collection'), must_exist=False)
+        except ValueError as e:
+            return collection_error(e)
+        upload_folder = collections.create(collection)
             
         filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        file_path = os.path.join(upload_folder, filename)
         
         # 如果文件已存在，添加数字后缀
         base, extension = os.path.splitext(filename)
         counter = 1
         while os.path.exists(file_path):
             filename = f"{base}_{counter}{extension}"
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            file_path = os.path.join(upload_folder, filename)
             counter += 1
             
         file.save(file_path)
         
-        # 重新加载知识库
-        rag.load_knowledge_base(app.config['UPLOAD_FOLDER'])
+        # 提交后台任务，立即返回任务ID
+        job, coalesced = jobs.submit(file_path, collection=collection)
+        if coalesced:
+            # 内容相同的文件已存在，丢弃本次上传的副本
+            os.remove(file_path)
+            return jsonify({
+                'message': f"文件内容与 {job['filename']} 相同，已合并到现有任务",
+                'filename': job['filename'],
+                'collection': collection,
+                'job_id': job['id'],
+                'job': job
+            }), 202
         
         return jsonify({
-            'message': '文件上传成功',
-            'filename': filename
-        })
+            'message': '文件上传成功，正在后台处理',
+            'filename': filename,
+            'collection': collection,
+            'job_id': job['id'],
+            'job': job
+        }), 202
         
     except Exception as e:
         return jsonify({'error': f'上传失败: {str(e)}'}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job)
+
+@app.route('/api/collections', methods=['GET'])
+def list_collections():
+    return jsonify(collections.stats())
+
 @app.route('/api/files', methods=['GET'])
 def list_files():
     try:
+        try:
+            collection = parse_collection(request.args.get('collection'))
+        except (KeyError, ValueError) as e:
+            return collection_error(e)
         files = []
-        for filename in os.listdir(app.config['UPLOAD_FOLDER']):
+        for filename in os.listdir(collections.knowledge_base_dir(collection)):
             if any(filename.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS):
                 files.append(filename)
         return jsonify(sorted(files))  # 按字母顺序排序文件列表
@@ -78,43 +183,191 @@ def list_files():
 @app.route('/api/files/<filename>', methods=['DELETE'])
 def delete_file(filename):
     try:
+        try:
+            collection = parse_collection(request.args.get('collection'))
+        except (KeyError, ValueError) as e:
+            return collection_error(e)
+
         # 构建完整的文件路径
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        file_path = os.path.join(collections.knowledge_base_dir(collection), filename)
         
         # 检查文件是否存在
         if not os.path.exists(file_path):
             return jsonify({'error': '文件不存在'}), 404
             
         # 使用RAG系统的删除方法，它会同时处理存储和物理文件
-        if rag.delete_file(file_path):
+        with collections.use(collection) as rag:
+            deleted = rag.delete_file(file_path)
+        if deleted:
             return jsonify({'message': '文件删除成功'})
         else:
             return jsonify({'error': '文件删除失败'}), 500
         
+    except CollectionUnavailable as e:
+        return collection_unavailable(e)
     except Exception as e:
         return jsonify({'error': f'删除文件时出错: {str(e)}'}), 500
 
+def format_sources(retrieved_documents):
+    return [
+        {
+            'content': doc['text'],
+            'source': doc['metadata']['source'],
+            'score': doc['score']
+        }
+        for doc in retrieved_documents
+    ]
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def request_trace_id():
+    # 沿用上游网关传入的请求ID，便于串联日志
+    return request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+
+def parse_filters(data):
+    """请求中的检索过滤条件: sources, file_types, date_from, date_to, tags"""
+    filters = data.get('filters')
+    if filters is not None and not isinstance(filters, dict):
+        raise ValueError('filters 必须是对象')
+    return MetadataFilter.from_dict(filters)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
         data = request.json
         if not data or 'message' not in data:
             return jsonify({'error': '消息不能为空'}), 400
+        try:
+            filters = parse_filters(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'过滤条件无效: {e}'}), 400
+        try:
+            collection = parse_collection(data.get('collection'))
+        except (KeyError, ValueError) as e:
+            return collection_error(e)
         
-        result = rag.answer_question(data['message'])
-        return jsonify({
+        with metrics.trace(request_trace_id(), name='chat') as trace:
+            with priority_gate.interactive(), collections.use(collection) as rag:
+                result = rag.answer_question(data['message'], filters=filters)
+        payload = {
             'answer': result['answer'],
-            'sources': [
-                {
-                    'content': doc['text'],
-                    'source': doc['metadata']['source'],
-                    'score': doc['score']
-                }
-                for doc in result['retrieved_documents']
-            ]
-        })
+            'sources': format_sources(result['retrieved_documents']),
+            'trace': trace.to_dict()
+        }
+        warning = sync_warning(collection)
+        if warning:
+            payload['warning'] = warning
+        response = jsonify(payload)
+        response.headers['X-Trace-Id'] = trace.trace_id
+        return response
+    except CollectionUnavailable as e:
+        return collection_unavailable(e)
     except Exception as e:
         return jsonify({'error': f'处理问题时出错: {str(e)}'}), 500
 
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """批量问答，用于离线评测和缓存预热；retrieve_only 为 true 时只返回检索结果"""
+    try:
+        data = request.json
+        messages = data.get('messages') if isinstance(data, dict) else None
+        if not isinstance(messages, list) or not messages \
+                or not all(isinstance(message, str) and message.strip() for message in messages):
+            return jsonify({'error': 'messages 必须是非空的问题列表'}), 400
+        if len(messages) > BATCH_MAX_QUERIES:
+            return jsonify({'error': f'单次最多提交 {BATCH_MAX_QUERIES} 个问题'}), 400
+        try:
+            filters = parse_filters(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'过滤条件无效: {e}'}), 400
+        try:
+            collection = parse_collection(data.get('collection'))
+        except (KeyError, ValueError) as e:
+            return collection_error(e)
+
+        with metrics.trace(request_trace_id(), name='chat_batch') as trace, collections.use(collection) as rag:
+            if data.get('retrieve_only'):
+                results = [
+                    {'query': message, 'sources': format_sources(docs)}
+                    for message, docs in zip(messages, rag.retrieve_batch(messages, filters=filters))
+                ]
+            else:
+                results = [
+                    {
+                        'query': result['query'],
+                        'answer': result['answer'],
+                        'sources': format_sources(result['retrieved_documents']),
+                        'cached': bool(result.get('cached'))
+                    }
+                    for result in rag.answer_batch(messages, filters=filters)
+                ]
+        payload = {'results': results, 'trace': trace.to_dict()}
+        warning = sync_warning(collection)
+        if warning:
+            payload['warning'] = warning
+        response = jsonify(payload)
+        response.headers['X-Trace-Id'] = trace.trace_id
+        return response
+    except CollectionUnavailable as e:
+        return collection_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': f'批量处理问题时出错: {str(e)}'}), 500
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    data = request.json
+    if not data or 'message' not in data:
+        return jsonify({'error': '消息不能为空'}), 400
+    message = data['message']
+    try:
+        filters = parse_filters(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'过滤条件无效: {e}'}), 400
+    try:
+        collection = parse_collection(data.get('collection'))
+    except (KeyError, ValueError) as e:
+        return collection_error(e)
+    # 在开始推流之前等待集合加载，加载中时直接返回503而不是在事件流里报错
+    try:
+        with collections.use(collection):
+            pass
+    except CollectionUnavailable as e:
+        return collection_unavailable(e)
+    warning = sync_warning(collection)
+    trace_id = request_trace_id()
+
+    def generate():
+        # 先发送检索到的来源，再逐个发送生成的token
+        try:
+            with metrics.trace(trace_id, name='chat_stream') as trace, priority_gate.interactive(), \
+                    collections.use(collection) as rag:
+                for event in rag.answer_question_stream(message, filters=filters):
+                    if event['type'] == 'sources':
+                        yield sse_event('sources', format_sources(event['retrieved_documents']))
+                    elif event['type'] == 'token':
+                        yield sse_event('token', {'content': event['content']})
+                    elif event['type'] == 'error':
+                        yield sse_event('error', {'error': event['error']})
+                    else:
+                        done = {'trace': trace.to_dict()}
+                        if warning:
+                            done['warning'] = warning
+                        yield sse_event('done', done)
+        except Exception as e:
+            yield sse_event('error', {'error': f'处理问题时出错: {str(e)}'})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Trace-Id': trace_id}
+    )
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # 关闭自动重载：重载器会在父子两个进程中各导入一次本模块，
+    # 导致后台加载、摄取线程和中断任务的恢复在两个进程中重复执行，并同时写同一份快照、清单和任务表
+    app.run(debug=True, port=5000, use_reloader=False)
\ No newline at end of file
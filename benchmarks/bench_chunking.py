@@ -0,0 +1,73 @@
+# benchmarks/bench_chunking.py
+"""Chunk-count reduction of the layout-aware chunker versus one chunk per parse block
+
+用法:
+    python -m benchmarks.bench_chunking --dir data/new_knowledge_base
+    python -m benchmarks.bench_chunking --dir data/new_knowledge_base --fake   # 使用本地模拟 Parse Server
+"""
+
+import argparse
+import json
+import numpy as np
+
+from benchmarks.fake_services import FakeParseServer
+from src.processors.chunker import LayoutChunker, estimate_tokens
+from src.processors.document_processor import DocumentProcessor
+
+
+def token_stats(texts):
+    tokens = np.asarray([estimate_tokens(text) for text in texts] or [0])
+    return {
+        'mean_tokens': round(float(tokens.mean()), 1),
+        'p95_tokens': int(np.percentile(tokens, 95)),
+        'total_tokens': int(tokens.sum())
+    }
+
+
+def run(directory: str, target_tokens: int, overlap_tokens: int, parse_url: str = None) -> dict:
+    processor = DocumentProcessor(chunk_strategy='block')
+    if parse_url:
+        processor.parse_client.server_url = parse_url
+        processor.parse_client.cache = None
+    chunker = LayoutChunker(target_tokens=target_tokens, overlap_tokens=overlap_tokens)
+
+    files = []
+    block_texts, chunk_texts = [], []
+    for file_path, documents in processor.iter_files(processor.list_files(directory)):
+        blocks = [{'content': doc.page_content, 'metadata': doc.metadata} for doc in documents]
+        chunks = chunker.chunk(blocks)
+        block_texts.extend(block['content'] for block in blocks)
+        chunk_texts.extend(chunk.page_content for chunk in chunks)
+        files.append({'file': file_path, 'blocks': len(blocks), 'chunks': len(chunks)})
+
+    return {
+        'files': len(files),
+        'target_tokens': target_tokens,
+        'overlap_tokens': overlap_tokens,
+        'blocks': dict(token_stats(block_texts), count=len(block_texts)),
+        'chunks': dict(token_stats(chunk_texts), count=len(chunk_texts)),
+        'reduction': round(len(block_texts) / len(chunk_texts), 2) if chunk_texts else None,
+        'per_file': files
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', required=True)
+    parser.add_argument('--target-tokens', type=int, nargs='+', default=[200, 400, 800])
+    parser.add_argument('--overlap-tokens', type=int, default=50)
+    parser.add_argument('--fake', action='store_true', help='使用本地模拟 Parse Server（按空行切分段落）')
+    args = parser.parse_args()
+
+    server = FakeParseServer().start() if args.fake else None
+    try:
+        for target in args.target_tokens:
+            result = run(args.dir, target, args.overlap_tokens, server.url if server else None)
+            print(json.dumps(result, ensure_ascii=False))
+    finally:
+        if server:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
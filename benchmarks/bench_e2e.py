@@ -0,0 +1,243 @@
+# benchmarks/bench_e2e.py
+"""Offline end-to-end benchmark: ingestion throughput, query latency and memory per backend
+
+所有外部服务（嵌入、LLM、Parse Server）均由本地模拟服务替代；MatrixOne 可用时
+同时压测 MOManager（写入独立的压测表），否则在结果中标记为跳过。
+
+用法:
+    python -m benchmarks.bench_e2e --sizes 1000 10000 --concurrency 1 8 32 \\
+        --workload requests.jsonl --output bench_output.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.fake_services import FakeEmbeddingServer, FakeLLMServer, FakeParseServer
+from src.processors.manifest import FileManifest
+from src.rag.rag_system import RAGSystem
+from src.storage.base_storage import MemoryStorage
+from src.storage.mo_manager import MOManager
+
+HOSTS = ['db', 'web', 'cache', 'mq', 'lb', 'k8s-node', 'nas']
+ACTIONS = ['重启', '扩容', '故障切换', '备份', '巡检', '升级', '回滚']
+ENGINEERS = ['张伟', '王芳', '李娜', '刘洋', '陈静', '杨磊']
+
+
+def make_corpus(directory: Path, n_chunks: int, chunks_per_file: int = 50, seed: int = 0) -> List[str]:
+    """写入合成的运维文档，每个段落对应一个文档块"""
+    rng = np.random.default_rng(seed)
+    files = []
+    for file_index in range(0, n_chunks, chunks_per_file):
+        paragraphs = [f"# 运维手册 第{file_index // chunks_per_file}卷"]
+        for i in range(file_index, min(file_index + chunks_per_file, n_chunks)):
+            host = f"{HOSTS[i % len(HOSTS)]}-{i:05d}.prod"
+            paragraphs.append(
+                f"{host} {ACTIONS[rng.integers(len(ACTIONS))]}流程: 值班人 {ENGINEERS[i % len(ENGINEERS)]}，"
+                f"错误码 ERR-{rng.integers(10000):04d}，先检查接口 Gi0/{i % 48} 状态，"
+                f"确认监控告警恢复后在工单 {i} 中记录处理结果。"
+            )
+        path = directory / f"manual_{file_index // chunks_per_file:05d}.txt"
+        path.write_text('\n\n'.join(paragraphs), encoding='utf-8')
+        files.append(str(path))
+    return files
+
+
+def load_workload(path: Optional[str], n_queries: int, n_chunks: int) -> List[str]:
+    """从 JSONL 文件回放查询（取 title 或 query 字段），否则生成合成问题"""
+    queries = []
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    queries.append(record.get('query') or record.get('title') or record.get('body', '')[:200])
+    if not queries:
+        rng = np.random.default_rng(1)
+        for _ in range(max(n_queries, 1)):
+            i = int(rng.integers(n_chunks))
+            queries.append(f"{HOSTS[i % len(HOSTS)]}-{i:05d}.prod 出现告警，应该找谁处理？")
+    return [queries[i % len(queries)] for i in range(n_queries)]
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), falling back to the peak RSS"""
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20, 1)
+    except (OSError, ValueError):
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def percentiles(latencies: List[float]) -> Dict:
+    values = np.asarray(latencies) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(values, 50)), 2),
+        'p95_ms': round(float(np.percentile(values, 95)), 2),
+        'p99_ms': round(float(np.percentile(values, 99)), 2),
+        'mean_ms': round(float(values.mean()), 2)
+    }
+
+
+def run_queries(fn, queries: List[str], concurrency: int) -> Dict:
+    def timed(query):
+        start = time.perf_counter()
+        fn(query)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, queries))
+    wall = time.perf_counter() - start
+    return dict(percentiles(latencies), queries=len(queries), qps=round(len(queries) / wall, 1))
+
+
+def run_batch(fn, queries: List[str]) -> Dict:
+    """Whole workload through one batch call; per-query cost is the amortized wall time"""
+    start = time.perf_counter()
+    fn(queries)
+    wall = time.perf_counter() - start
+    return {
+        'queries': len(queries),
+        'wall_seconds': round(wall, 3),
+        'per_query_ms': round(wall / len(queries) * 1000, 2),
+        'qps': round(len(queries) / wall, 1)
+    }
+
+
+def make_storage(backend: str, mo_table: str):
+    if backend == 'memory':
+        return MemoryStorage()
+    # 写入独立的压测表，避免污染正式数据
+    storage = MOManager(table=mo_table, manifest_path=None)
+    with storage._cursor() as cursor:
+        cursor.execute(f"DELETE FROM {mo_table}")
+        cursor.execute(f"DELETE FROM {storage._tags_table()}")
+    storage.lexical_index = type(storage.lexical_index)()
+    return storage
+
+
+def drop_storage(storage, backend: str, mo_table: str):
+    if backend != 'mo':
+        return
+    try:
+        with storage._cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {mo_table}")
+            cursor.execute(f"DROP TABLE IF EXISTS {storage._tags_table()}")
+    finally:
+        storage.close()
+
+
+def run_backend(backend: str, size: int, args, services: Dict, workdir: Path) -> Dict:
+    result = {'backend': backend, 'size': size}
+    rss_before = rss_mb()
+    try:
+        storage = make_storage(backend, args.mo_table)
+    except Exception as e:
+        result['skipped'] = f"{type(e).__name__}: {e}"
+        return result
+
+    corpus_dir = workdir / f"{backend}_{size}"
+    corpus_dir.mkdir()
+    files = make_corpus(corpus_dir, size)
+
+    rag = RAGSystem(knowledge_base_dir=None, api_key='bench', storage=storage)
+    try:
+        rag.embedding_manager.api_url = services['embedding'].url
+        rag.embedding_manager.cache = None
+        rag.llm_client.api_url = services['llm'].url
+        rag.doc_processor.parse_client.server_url = services['parse'].url
+        rag.doc_processor.parse_client.cache = None
+        rag.manifest = FileManifest(None)
+        if not args.answer_cache:
+            rag.answer_cache.threshold = float('inf')
+
+        stats = rag.index_files(files)
+        result['ingestion'] = {
+            'files': stats['files'],
+            'chunks': stats['chunks'],
+            'stored': stats['stored'],
+            'wall_seconds': stats['wall_seconds'],
+            'chunks_per_second': stats['chunks_per_second'],
+            'stages': stats['stages']
+        }
+        result['memory'] = {'rss_mb': rss_mb(), 'rss_delta_mb': round(rss_mb() - rss_before, 1)}
+        if backend == 'memory':
+            result['memory']['vector_index_mb'] = round(storage.index.nbytes / 2 ** 20, 1)
+
+        queries = load_workload(args.workload, args.queries, size)
+        result['retrieve'] = {}
+        result['answer'] = {}
+        for concurrency in args.concurrency:
+            result['retrieve'][str(concurrency)] = run_queries(rag.retrieve, queries, concurrency)
+            result['answer'][str(concurrency)] = run_queries(rag.answer_question, queries, concurrency)
+        result['batch'] = {
+            'retrieve': run_batch(rag.retrieve_batch, queries),
+            'answer': run_batch(rag.answer_batch, queries)
+        }
+    finally:
+        drop_storage(storage, backend, args.mo_table)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='语料的文档块数量')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--queries', type=int, default=200, help='每个并发级别的查询数')
+    parser.add_argument('--backends', nargs='+', default=['memory', 'mo'], choices=['memory', 'mo'])
+    parser.add_argument('--workload', help='JSONL查询负载，例如 requests.jsonl')
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--embed-latency', type=float, default=0.02)
+    parser.add_argument('--embed-item-latency', type=float, default=0.0005)
+    parser.add_argument('--llm-first-token', type=float, default=0.2)
+    parser.add_argument('--llm-token-latency', type=float, default=0.0)
+    parser.add_argument('--parse-latency', type=float, default=0.05)
+    parser.add_argument('--answer-cache', action='store_true', help='保留答案缓存（默认关闭以测量完整路径）')
+    parser.add_argument('--mo-table', default='rag_bench_chunks')
+    parser.add_argument('--output', help='结果JSON的输出路径，默认打印到标准输出')
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix='rag_bench_'))
+    services = {
+        'embedding': FakeEmbeddingServer(dimension=args.dim, latency=args.embed_latency,
+                                         per_item_latency=args.embed_item_latency),
+        'llm': FakeLLMServer(first_token_latency=args.llm_first_token,
+                             token_latency=args.llm_token_latency),
+        'parse': FakeParseServer(latency=args.parse_latency)
+    }
+    for service in services.values():
+        service.start()
+    try:
+        results = [
+            run_backend(backend, size, args, services, workdir)
+            for size in args.sizes
+            for backend in args.backends
+        ]
+    finally:
+        for service in services.values():
+            service.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': results
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding='utf-8')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# benchmarks/bench_embeddings.py
+"""Offline throughput benchmark of EmbeddingManager against a fake embedding server
+
+用法: python -m benchmarks.bench_embeddings --texts 2000 --latency 0.05
+"""
+
+import argparse
+import json
+import time
+
+from benchmarks.fake_services import FakeEmbeddingServer
+from src.embeddings.embedding_manager import EmbeddingManager
+
+
+def run(server: FakeEmbeddingServer, texts, batch_size: int, concurrency: int) -> dict:
+    manager = EmbeddingManager("fake-model", api_url=server.url, concurrency=concurrency)
+    requests_before = server.request_count
+    start = time.perf_counter()
+    embeddings = manager.compute_embeddings(texts, batch_size=batch_size)
+    seconds = time.perf_counter() - start
+    assert embeddings.shape[0] == len(texts)
+    return {
+        'texts': len(texts),
+        'batch_size': batch_size,
+        'concurrency': concurrency,
+        'requests': server.request_count - requests_before,
+        'seconds': round(seconds, 3),
+        'texts_per_second': round(len(texts) / seconds, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--texts', type=int, default=1000)
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--latency', type=float, default=0.05, help='每个请求的固定延迟（秒）')
+    parser.add_argument('--per-item-latency', type=float, default=0.001)
+    args = parser.parse_args()
+
+    texts = [f"运维知识库文档块 {i}" for i in range(args.texts)]
+    with FakeEmbeddingServer(dimension=args.dim, latency=args.latency,
+                             per_item_latency=args.per_item_latency) as server:
+        # 基线: 每个请求一个文本、串行执行，对应旧版实现
+        for batch_size, concurrency in [(1, 1), (32, 1), (32, 4), (64, 8)]:
+            print(json.dumps(run(server, texts, batch_size, concurrency)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/bench_startup.py
+"""Cold-start time: blocking RAGSystem construction versus staged background warmup
+
+blocking 为原先的启动方式（构造 RAGSystem 时同步处理整个知识库，完成前无法监听端口）；
+staged 为 CollectionManager 的后台加载，分别测量可以监听端口、可以响应查询和知识库
+同步完成的时间。restart 使用 staged 第一次运行留下的快照和文件清单重新启动。
+所有外部服务由本地模拟服务替代，存储使用带快照的内存存储。
+
+用法:
+    python -m benchmarks.bench_startup --sizes 1000 10000
+"""
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+from benchmarks.bench_e2e import make_corpus
+from benchmarks.fake_services import FakeEmbeddingServer, FakeParseServer
+from src.rag.collection_manager import CollectionManager
+from src.rag.rag_system import RAGSystem
+from src.storage.base_storage import MemoryStorage
+
+COLLECTION = 'bench'
+
+
+class BenchCollections(CollectionManager):
+    """Collections backed by snapshot memory storage and the fake services"""
+
+    def __init__(self, base_dir: Path, services: Dict):
+        super().__init__(
+            api_key='bench',
+            base_dir=base_dir,
+            storage_factory=lambda table, snapshot_dir, manifest_path: MemoryStorage(snapshot_dir=snapshot_dir)
+        )
+        self.services = services
+        self.embedding_manager.api_url = services['embedding'].url
+        self.embedding_manager.cache = None
+
+    def _open(self, name: str) -> RAGSystem:
+        rag = super()._open(name)
+        rag.doc_processor.parse_client.server_url = self.services['parse'].url
+        rag.doc_processor.parse_client.cache = None
+        return rag
+
+
+def wait_for(predicate, timeout: float = 3600, interval: float = 0.01):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError('collection did not finish loading')
+        time.sleep(interval)
+
+
+def run_staged(base_dir: Path, services: Dict) -> Dict:
+    start = time.perf_counter()
+    collections = BenchCollections(base_dir, services)
+    collections.warmup(COLLECTION)
+    listening = time.perf_counter() - start
+    wait_for(lambda: collections.status(COLLECTION)['state'] in ('syncing', 'ready', 'failed'))
+    serving = time.perf_counter() - start
+    wait_for(lambda: collections.status(COLLECTION)['state'] in ('ready', 'failed'))
+    ready = time.perf_counter() - start
+    status = collections.status(COLLECTION)
+    collections.close()
+    return {
+        'listening_seconds': round(listening, 3),
+        'serving_seconds': round(serving, 3),
+        'synced_seconds': round(ready, 3),
+        'state': status['state']
+    }
+
+
+def run_blocking(kb_dir: Path, services: Dict) -> Dict:
+    start = time.perf_counter()
+    storage = MemoryStorage(snapshot_dir=kb_dir.parent / 'blocking_snapshot')
+    rag = RAGSystem(knowledge_base_dir=str(kb_dir), api_key='bench', storage=storage, sync_knowledge_base=False)
+    rag.embedding_manager.api_url = services['embedding'].url
+    rag.embedding_manager.cache = None
+    rag.doc_processor.parse_client.server_url = services['parse'].url
+    rag.doc_processor.parse_client.cache = None
+    rag.load_knowledge_base(str(kb_dir))
+    elapsed = round(time.perf_counter() - start, 3)
+    rag.close()
+    # 端口只有在构造完成后才能监听
+    return {'listening_seconds': elapsed, 'serving_seconds': elapsed, 'synced_seconds': elapsed}
+
+
+def run_size(size: int, services: Dict, workdir: Path) -> Dict:
+    base_dir = workdir / f"size_{size}"
+    kb_dir = base_dir / COLLECTION / 'files'
+    kb_dir.mkdir(parents=True)
+    make_corpus(kb_dir, size)
+    return {
+        'size': size,
+        'blocking': run_blocking(kb_dir, services),
+        'staged': run_staged(base_dir, services),
+        'restart': run_staged(base_dir, services)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='语料的文档块数量')
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--embed-latency', type=float, default=0.02)
+    parser.add_argument('--embed-item-latency', type=float, default=0.0005)
+    parser.add_argument('--parse-latency', type=float, default=0.05)
+    parser.add_argument('--output', help='结果JSON的输出路径，默认打印到标准输出')
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix='rag_startup_'))
+    services = {
+        'embedding': FakeEmbeddingServer(dimension=args.dim, latency=args.embed_latency,
+                                         per_item_latency=args.embed_item_latency),
+        'parse': FakeParseServer(latency=args.parse_latency)
+    }
+    for service in services.values():
+        service.start()
+    try:
+        results = [run_size(size, services, workdir) for size in args.sizes]
+    finally:
+        for service in services.values():
+            service.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': results
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding='utf-8')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/bench_vector_codecs.py
+"""Memory / recall / latency benchmark of VectorIndex codecs against a float64 baseline
+
+用法: python -m benchmarks.bench_vector_codecs --size 100000 --dim 1024 --codecs float32 float16 int8 pq
+"""
+
+import argparse
+import json
+import sys
+import time
+import numpy as np
+
+from benchmarks.bench_vector_index import make_corpus
+from src.storage.vector_index import VectorIndex
+
+
+def python_list_bytes(dim: int) -> int:
+    """Approximate size of one embedding kept as a Python list of floats"""
+    vector = [float(i) + 0.5 for i in range(dim)]
+    return sys.getsizeof(vector) + sum(sys.getsizeof(value) for value in vector)
+
+
+def run(codec: str, rerank: int, corpus: np.ndarray, queries: np.ndarray,
+        baseline_ids: list, top_k: int) -> dict:
+    n, dim = corpus.shape
+    index = VectorIndex(dimension=dim, ann_min_size=n + 1, codec=codec, rerank=rerank,
+                        codec_train_size=min(n, 20000))
+    start = time.perf_counter()
+    for offset in range(0, n, 4096):
+        index.add(corpus[offset:offset + 4096], file_path=f"file_{offset // 4096}")
+    add_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = [index.search(q, top_k, exact=True)[1] for q in queries]
+    ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    recall = np.mean([
+        len(set(f.tolist()) & set(b.tolist())) / len(b) for f, b in zip(found, baseline_ids)
+    ])
+    return {
+        'codec': codec,
+        'rerank': rerank,
+        'size': n,
+        'dim': dim,
+        'bytes_per_vector': round(index.nbytes / index._matrix.shape[0], 1),
+        'mb_per_million': round(index.nbytes / index._matrix.shape[0] * 1e6 / 2 ** 20, 1),
+        'add_seconds': round(add_seconds, 3),
+        'ms_per_query': round(ms, 3),
+        f'recall@{top_k}': round(float(recall), 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--codecs', nargs='+', default=['float32', 'float16', 'int8', 'pq'])
+    parser.add_argument('--rerank', type=int, nargs='+', default=[0, 4])
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.size, args.dim)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries = make_corpus(args.queries, args.dim, seed=1)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    # float64 精确检索作为召回率基准
+    baseline = corpus.astype(np.float64)
+    baseline_ids = [np.argsort(-(baseline @ q.astype(np.float64)))[:args.top_k] for q in queries]
+    print(json.dumps({
+        'codec': 'python_list',
+        'bytes_per_vector': python_list_bytes(args.dim),
+        'mb_per_million': round(python_list_bytes(args.dim) * 1e6 / 2 ** 20, 1)
+    }))
+
+    for codec in args.codecs:
+        for rerank in args.rerank:
+            if codec == 'float32' and rerank:
+                continue
+            print(json.dumps(run(codec, rerank, corpus, queries, baseline_ids, args.top_k)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/bench_vector_index.py
+"""Recall / latency benchmark of VectorIndex exact vs IVF search
+
+用法: python -m benchmarks.bench_vector_index --sizes 10000 100000 --dim 1024
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+
+from src.storage.vector_index import VectorIndex
+
+
+def make_corpus(n: int, dim: int, n_clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """生成带聚类结构的合成向量，近似真实embedding的分布"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, n)
+    return centers[labels] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def run(n: int, dim: int, n_queries: int, top_k: int, n_probe: int) -> dict:
+    corpus = make_corpus(n, dim)
+    queries = make_corpus(n_queries, dim, seed=1)
+
+    index = VectorIndex(dimension=dim, ann_min_size=n + 1, n_probe=n_probe)
+    start = time.perf_counter()
+    for offset in range(0, n, 4096):
+        index.add(corpus[offset:offset + 4096], file_path=f"file_{offset // 4096}")
+    add_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact_ids = [index.search(q, top_k, exact=True)[1] for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+    start = time.perf_counter()
+    index.train()
+    train_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ann_ids = [index.search(q, top_k, exact=False)[1] for q in queries]
+    ann_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+    recall = np.mean([
+        len(set(a.tolist()) & set(e.tolist())) / len(e) for a, e in zip(ann_ids, exact_ids)
+    ])
+    return {
+        'size': n,
+        'dim': dim,
+        'top_k': top_k,
+        'n_lists': int(index._centroids.shape[0]),
+        'n_probe': n_probe,
+        'add_seconds': round(add_seconds, 3),
+        'train_seconds': round(train_seconds, 3),
+        'exact_ms_per_query': round(exact_ms, 3),
+        'ivf_ms_per_query': round(ann_ms, 3),
+        f'recall@{top_k}': round(float(recall), 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--n-probe', type=int, default=8)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        print(json.dumps(run(n, args.dim, args.queries, args.top_k, args.n_probe)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+# benchmarks/fake_services.py
+"""Local stand-ins for the external HTTP services used by the RAG system
+
+所有服务均基于标准库 http.server，可在后台线程中启动，用于离线压测:
+
+    with FakeEmbeddingServer(latency=0.02) as server:
+        manager = EmbeddingManager("BAAI/bge-m3", api_url=server.url)
+"""
+
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+
+def fake_embedding(text: str, dimension: int) -> np.ndarray:
+    """由文本哈希确定的伪随机单位向量，相同文本总是得到相同向量"""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # 默认的 backlog 为5，高并发压测时会被内核直接重置连接
+    request_queue_size = 1024
+
+
+class _FakeServer:
+    """Run a handler class on a background ThreadingHTTPServer"""
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        handler = type('Handler', (self.handler_class,), {'service': self})
+        self.httpd = _Server((host, port), handler)
+        self.thread = None
+        self.request_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self):
+        with self._lock:
+            self.request_count += 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头与响应体分两次写出，不关闭Nagle时长连接上每个请求会多出约40ms的延迟确认
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def send_json(self, payload, status: int = 200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _EmbeddingHandler(_JSONHandler):
+    def do_POST(self):
+        service = self.service
+        service.count_request()
+        payload = self.read_json()
+        texts = payload.get('input', [])
+        if isinstance(texts, str):
+            texts = [texts]
+
+        time.sleep(service.latency + service.per_item_latency * len(texts))
+        if service.fail_every and service.request_count % service.fail_every == 0:
+            self.send_json({'error': 'injected failure'}, status=503)
+            return
+
+        self.send_json({
+            'object': 'list',
+            'model': payload.get('model'),
+            'data': [
+                {
+                    'object': 'embedding',
+                    'index': i,
+                    'embedding': fake_embedding(text, service.dimension).tolist()
+                }
+                for i, text in enumerate(texts)
+            ]
+        })
+
+
+class FakeEmbeddingServer(_FakeServer):
+    """OpenAI-compatible /embeddings endpoint returning deterministic vectors"""
+
+    handler_class = _EmbeddingHandler
+
+    def __init__(self, dimension: int = 1024, latency: float = 0.0,
+                 per_item_latency: float = 0.0, fail_every: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.dimension = dimension
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.fail_every = fail_every
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/v1/embeddings"
+
+
+class _LLMHandler(_JSONHandler):
+    def do_POST(self):
+        service = self.service
+        service.count_request()
+        payload = self.read_json()
+        prompt = payload['messages'][-1]['content']
+        tokens = service.make_tokens(prompt, payload.get('max_tokens'))
+
+        time.sleep(service.first_token_latency)
+        if not payload.get('stream'):
+            time.sleep(service.token_latency * len(tokens))
+            self.send_json({
+                'object': 'chat.completion',
+                'model': payload.get('model'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                    'finish_reason': 'stop'
+                }]
+            })
+            return
+
+        # 以OpenAI兼容的SSE格式逐个发送token
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(service.token_latency)
+            chunk = {
+                'object': 'chat.completion.chunk',
+                'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]
+            }
+            self.write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeLLMServer(_FakeServer):
+    """OpenAI-compatible /chat/completions endpoint with configurable latency
+
+    支持普通与 stream=true 两种模式。回答内容固定为 answer，未提供时
+    回显提示词中的问题，便于在测试中校验。
+    """
+
+    handler_class = _LLMHandler
+
+    def __init__(self, first_token_latency: float = 0.0, token_latency: float = 0.0,
+                 answer: str = None, **kwargs):
+        super().__init__(**kwargs)
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.answer = answer
+
+    def make_tokens(self, prompt: str, max_tokens: int = None):
+        text = self.answer
+        if text is None:
+            question = next((line for line in prompt.splitlines() if line.startswith('问题：')), '')
+            text = f"这是对「{question[3:]}」的模拟回答。"
+        tokens = [text[i:i + 2] for i in range(0, len(text), 2)]
+        return tokens[:max_tokens] if max_tokens else tokens
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/v1/chat/completions"
+
+
+class _ParseHandler(_JSONHandler):
+    def do_GET(self):
+        if self.path == '/docs':
+            self.send_json({'status': 'ok'})
+        else:
+            self.send_json({'error': 'not found'}, status=404)
+
+    def do_POST(self):
+        service = self.service
+        service.count_request()
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        content = self._file_content(body, self.headers.get('Content-Type', ''))
+
+        time.sleep(service.latency + service.per_kb_latency * len(content) / 1024)
+        self.send_json({'blocks': service.make_blocks(content)})
+
+    @staticmethod
+    def _file_content(body: bytes, content_type: str) -> bytes:
+        """Extract the uploaded file from a multipart/form-data body"""
+        if 'boundary=' not in content_type:
+            return body
+        boundary = b'--' + content_type.split('boundary=', 1)[1].strip('"').encode('ascii')
+        for part in body.split(boundary):
+            head, sep, data = part.partition(b'\r\n\r\n')
+            if sep and b'name="file"' in head:
+                return data[:-2] if data.endswith(b'\r\n') else data
+        return b''
+
+
+class FakeParseServer(_FakeServer):
+    """Parse Server stand-in: POST /parse/all_doc returns one block per paragraph
+
+    上传的文件按UTF-8解码后以空行切分段落，每段生成一个文本块，
+    以 "#" 开头的段落标记为标题；每隔 image_every 个块插入一个图片块。
+    """
+
+    handler_class = _ParseHandler
+
+    def __init__(self, latency: float = 0.0, per_kb_latency: float = 0.0,
+                 image_every: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.per_kb_latency = per_kb_latency
+        self.image_every = image_every
+
+    def make_blocks(self, content: bytes):
+        text = content.decode('utf-8', errors='ignore').replace('\r\n', '\n')
+        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+        blocks = []
+        for position, paragraph in enumerate(paragraphs):
+            if self.image_every and position and position % self.image_every == 0:
+                blocks.append({'type': 'image', 'is_image': True, 'content': '', 'page_num': 1})
+            blocks.append({
+                'type': 'title' if paragraph.startswith('#') else 'text',
+                'content': paragraph.lstrip('# '),
+                'page_num': position // 20 + 1,
+                'position': position,
+                'is_title': paragraph.startswith('#'),
+                'is_image': False,
+                'confidence': 1.0
+            })
+        return blocks
+
+    @property
+    def url(self) -> str:
+        return self.base_url
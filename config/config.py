@@ -7,19 +7,53 @@ from config.api_key import API_KEY
 PROJECT_ROOT = Path(__file__).parent.parent
 DATA_DIR = PROJECT_ROOT / "data"
 KNOWLEDGE_BASE_DIR = DATA_DIR / "new_knowledge_base"
+MANIFEST_PATH = DATA_DIR / "manifest.json"  # 已索引文件清单，用于增量索引
+MEMORY_SNAPSHOT_DIR = DATA_DIR / "memory_snapshot"  # 内存存储的向量快照目录，None 表示不持久化
+COLLECTIONS_DIR = DATA_DIR / "collections"  # 命名知识库集合的根目录，每个集合含 files/、manifest.json 和 memory_snapshot/
+DEFAULT_COLLECTION = "default"  # 请求未指定集合时使用，对应 KNOWLEDGE_BASE_DIR 与 MO_TABLE
+COLLECTION_MEMORY_BUDGET_MB = 4096  # 已加载集合的估算内存上限，超出时卸载最久未使用的空闲集合
+COLLECTION_LOAD_WAIT_SECONDS = 2  # 请求等待集合加载的最长时间（秒），仍在加载时返回503
 
 # Model configurations
 EMBEDDING_MODEL_NAME = "BAAI/bge-m3"
 BATCH_SIZE = 32
 
+# Embedding API configurations
+EMBEDDING_API_URL = "https://neolink-ai.com/model/api/v1/embeddings"
+EMBEDDING_CONCURRENCY = 4  # 同时进行的嵌入请求数量
+EMBEDDING_MAX_RETRIES = 3  # 单个批次的最大重试次数
+EMBEDDING_TIMEOUT = 30  # 单次请求超时时间（秒）
+EMBEDDING_CACHE_PATH = DATA_DIR / "embedding_cache.sqlite"  # 嵌入向量磁盘缓存，None表示只用内存
+EMBEDDING_CACHE_MEMORY_ITEMS = 20000  # 内存LRU缓存的最大向量数
+EMBEDDING_CACHE_DISK_ITEMS = 500000  # 磁盘缓存的最大向量数，超出时淘汰最久未用的向量，None表示不限
+
+# Ingestion pipeline configurations
+INGEST_BATCH_SIZE = 64  # 每批嵌入与写入的文档块数量
+INGEST_QUEUE_SIZE = 8  # 阶段之间队列的最大批次数
+INGEST_WORKERS = 1  # 后台摄取任务的工作线程数
+INGEST_MAX_YIELD_SECONDS = 5  # 有聊天请求时摄取批次最多让步等待的时间（秒）
+JOB_DB_PATH = DATA_DIR / "jobs.sqlite"  # 后台任务表，重启后恢复未完成的任务
+
 # API configurations 
 API_URL = "https://neolink-ai.com/model/api/v1/chat/completions"
+HTTP_POOL_SIZE = 64  # 每个API客户端保持的长连接数量
+LLM_CONNECT_TIMEOUT = 5  # LLM API建立连接的超时时间（秒）
+LLM_READ_TIMEOUT = 120  # LLM API等待响应数据的超时时间（秒），流式响应中为相邻两段数据的最长间隔
+BATCH_MAX_QUERIES = 1000  # /api/chat/batch 单次请求的问题数上限
+BATCH_LLM_CONCURRENCY = 8  # 批量问答时同时进行的LLM生成请求数
 
 # LLM configurations
 DEFAULT_MAX_TOKENS = 1000
 DEFAULT_TEMPERATURE = 0.7
 DEFAULT_MODEL = "Qwen/Qwen2-7B-Instruct"
 
+# Answer cache configurations
+ANSWER_CACHE_THRESHOLD = 0.95  # 问题向量的余弦相似度达到该值视为同一问题
+ANSWER_CACHE_TTL = 600  # 缓存答案的有效期（秒）
+ANSWER_CACHE_TIME_SENSITIVE_TTL = 60  # 涉及时间的问题答案有效期（秒），提示词中包含当前北京时间
+ANSWER_CACHE_TIME_KEYWORDS = ("今天", "明天", "昨天", "现在", "当前", "本周", "这周", "下周", "本月", "几点", "值班")
+ANSWER_CACHE_SIZE = 1000  # 最多缓存的答案数量
+
 # MatrixOne configurations
 MO_HOST = "localhost"
 MO_PORT = 6001
@@ -28,7 +62,59 @@ MO_PASSWORD = "111"
 MO_DATABASE = "rag_db"
 MO_TABLE = "document_store"
 VECTOR_DIMENSION = 1024  # 根据embedding模型输出维度设置
+MO_SEARCH_MODE = "database"  # database: 在MatrixOne内排序检索; client: 拉取全部向量在本地计算
+MO_DISTANCE_METRIC = "l2"  # l2 / cosine，向量已归一化时两者排序一致，IVF索引使用l2
+MO_IVF_LISTS = 100  # IVF索引聚类数量
+MO_IVF_PROBE = 5  # 检索时探查的聚类数量
+MO_POOL_SIZE = 16  # 数据库连接池大小，并发请求各自使用独立连接
+MO_LEXICAL_REFRESH_SECONDS = 5  # BM25索引同步其他进程写入或删除的行的最小间隔（秒），None表示只有本进程写入
+
+# In-memory vector index configurations
+ANN_MIN_SIZE = 50000  # 超过该数量的文档块时启用IVF近似检索
+IVF_LISTS = 0  # IVF聚类中心数量，0表示按 sqrt(N) 自动选择
+IVF_PROBES = 8  # 检索时探查的聚类数量
+VECTOR_CODEC = "float32"  # 向量编码: float32 / float16 / int8 / pq
+VECTOR_RERANK = 4  # 有损编码时取 top_k*N 个候选用原始向量精确重排，0 表示不重排且不保留原始向量
+PQ_SUBSPACES = 64  # PQ编码的子空间数量，即每个向量占用的字节数
+CODEC_TRAIN_SIZE = 10000  # 需要训练的编码(pq)在文档块数量达到该值后训练，此前按float32存储
+
+# Hybrid retrieval configurations
+RETRIEVAL_MODE = "hybrid"  # hybrid: BM25与向量检索结果按RRF融合; dense: 仅向量检索
+HYBRID_CANDIDATES = 200  # BM25召回的候选数量，向量相似度只在候选集中计算
+RRF_K = 60  # 倒数排名融合常数
+HYBRID_THRESHOLD_BYPASS_RANK = 3  # BM25排名前N的文档块不受向量相似度阈值限制（如精确命中主机名、错误码）
+
+# Context assembly configurations
+CONTEXT_TOKEN_BUDGET = 2000  # 提示词中参考文档的估算token上限
+CONTEXT_OVERFETCH = 2  # 检索 top_k*N 个候选，再经去重、MMR筛选后放入提示词
+CONTEXT_DEDUP_THRESHOLD = 0.85  # 字符3-gram Jaccard相似度超过该值视为重复文档块
+CONTEXT_MMR_LAMBDA = 0.7  # MMR中相关性的权重，越小越强调多样性
+
+# Rerank configurations
+RERANK_ENABLED = True  # 检索后按词项覆盖、标题、时效和来源先验对候选重新打分
+RERANK_CANDIDATES = 50  # 重排前召回的候选数量，重排后只保留 top_k 个
+RERANK_WEIGHTS = {"lexical": 0.3, "title": 0.15, "recency": 0.05}  # 各特征叠加在向量相似度上的权重
+RERANK_RECENCY_HALF_LIFE_DAYS = 180  # 时效特征的半衰期（天），0 表示不考虑时效
+RERANK_SOURCE_PRIORS = {}  # 文件路径glob -> 加分，例如 {"*值班表*": 0.1, "*/archive/*": -0.1}
+RERANK_SCORE_BUDGET_MS = 10  # 候选打分阶段的耗时预算（毫秒），超出时按实测耗时减少打分的候选数
+RERANK_METADATA_BUDGET_MS = 10  # 元数据查询阶段的耗时预算（毫秒），平均耗时超出时跳过标题与时效特征
+
+# Monitoring configurations
+METRICS_ENABLED = True  # 记录各阶段耗时直方图与事件计数，通过 /metrics 暴露
+SLOW_REQUEST_SECONDS = 10  # 超过该耗时的请求输出各阶段耗时日志
 
 # Parse Server configurations
 PARSE_SERVER_URL = "http://localhost:9406" 
-PARSE_SERVER_TIMEOUT = 30  # 设置超时时间（秒）
\ No newline at end of file
+PARSE_SERVER_TIMEOUT = 30  # 设置超时时间（秒）
+PARSE_WORKERS = 4  # 并发解析的文件数量，1表示串行解析
+PARSE_MAX_RETRIES = 2  # 解析请求失败后的重试次数（指数退避），4xx错误不重试
+PARSE_CIRCUIT_FAILURES = 5  # 连续失败达到该次数后熔断，暂停请求Parse Server
+PARSE_CIRCUIT_RESET_SECONDS = 30  # 熔断持续时间（秒），之后放行一个试探请求
+PARSE_CACHE_DIR = DATA_DIR / "parse_cache"  # 按文件内容哈希缓存的解析结果（gzip压缩的JSON），None表示不缓存
+PARSE_CACHE_MAX_MB = 1024  # 解析缓存的容量上限（MB），超出时删除最久未用的结果，None表示不限
+PARSE_LOCAL_MODE = "fallback"  # txt/html本地解析: off 不使用; fallback Parse Server不可用时使用; always 始终本地解析
+
+# Chunking configurations
+CHUNK_STRATEGY = "layout"  # layout: 按标题和版面把解析块合并为段落级文档块; block: 每个解析块单独成块
+CHUNK_TARGET_TOKENS = 400  # 合并后文档块的目标token数
+CHUNK_OVERLAP_TOKENS = 50  # 相邻文档块之间重叠的token数
\ No newline at end of file
@@ -0,0 +1,215 @@
+# src/embeddings/embedding_cache.py
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+import atexit
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+
+
+class EmbeddingCache:
+    """按内容寻址的嵌入向量缓存：内存LRU + SQLite磁盘两级
+
+    键为 sha256(模型名 + 文本)，向量以 float32 字节串紧凑存储。
+    path 为 None 时只使用内存层。
+
+    锁只保护内存LRU；磁盘读取使用每个线程各自的连接（WAL 模式下读互不阻塞），
+    写入先进入待写缓冲，由后台线程每 flush_seconds 秒批量写入并提交一次。
+    磁盘层超过 max_disk_items 条时按最近使用时间淘汰最旧的向量。
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_memory_items: int = 10000,
+                 max_disk_items: Optional[int] = None, flush_seconds: float = 0.5):
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.flush_seconds = flush_seconds
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.path = Path(path) if path is not None else None
+        # 待写入磁盘的向量，以及磁盘命中后需要刷新使用时间的键
+        self._pending: Dict[str, np.ndarray] = {}
+        self._touched: set = set()
+        self._pending_lock = threading.Lock()
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._writes_since_prune = 0
+        self._closed = threading.Event()
+        self._wakeup = threading.Event()
+        self._writer = None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = self._connection()
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            # 旧版本的缓存表没有使用时间列
+            columns = {row[1] for row in db.execute("PRAGMA table_info(embeddings)")}
+            if 'used_at' not in columns:
+                db.execute("ALTER TABLE embeddings ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_used_at ON embeddings (used_at)")
+            db.commit()
+            self._writer = threading.Thread(target=self._write_loop, name='embedding-cache-writer', daemon=True)
+            self._writer.start()
+            # 进程退出前写入缓冲中剩余的向量
+            atexit.register(self.close)
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        """当前线程的SQLite连接"""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            with self._pending_lock:
+                self._connections.append(db)
+        return db
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """返回命中的 key -> 向量，未命中的键不出现在结果中"""
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+        if not missing or self.path is None or self._closed.is_set():
+            with self._lock:
+                self.misses += len(missing)
+            return found
+
+        # 已从内存淘汰但尚未写入磁盘的向量
+        with self._pending_lock:
+            for key in missing:
+                vector = self._pending.get(key)
+                if vector is not None:
+                    found[key] = vector
+        disk = {}
+        db = self._connection()
+        remaining = [key for key in missing if key not in found]
+        # SQLite 单条语句的参数数量有限，分批查询
+        for i in range(0, len(remaining), 500):
+            part = remaining[i:i + 500]
+            placeholders = ','.join('?' * len(part))
+            rows = db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+            ).fetchall()
+            for key, blob in rows:
+                disk[key] = np.frombuffer(blob, dtype=np.float32)
+        if disk:
+            with self._pending_lock:
+                self._touched.update(disk)
+
+        found.update(disk)
+        with self._lock:
+            for key in missing:
+                if key in found:
+                    self._remember(key, found[key])
+            self.disk_hits += len(disk)
+            self.misses += sum(1 for key in missing if key not in found)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        vectors = {key: np.asarray(vector, dtype=np.float32) for key, vector in items.items()}
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+        if self.path is not None and not self._closed.is_set():
+            with self._pending_lock:
+                self._pending.update(vectors)
+
+    def _write_loop(self):
+        while not self._closed.is_set():
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"写入嵌入缓存失败: {e}")
+
+    def flush(self):
+        """把待写缓冲中的向量和使用时间批量写入磁盘，超出容量时淘汰最久未用的向量"""
+        if self.path is None:
+            return
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            touched, self._touched = self._touched - set(pending), set()
+        if not pending and not touched:
+            return
+        db = self._connection()
+        now = time.time()
+        with db:
+            if pending:
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, used_at) VALUES (?, ?, ?)",
+                    [(key, vector.tobytes(), now) for key, vector in pending.items()]
+                )
+            if touched:
+                db.executemany("UPDATE embeddings SET used_at = ? WHERE key = ?",
+                               [(now, key) for key in touched])
+        self._writes_since_prune += len(pending)
+        if self.max_disk_items and self._writes_since_prune >= max(1, self.max_disk_items // 10):
+            self._writes_since_prune = 0
+            self._prune(db)
+
+    def _prune(self, db: sqlite3.Connection):
+        """删除最久未用的向量，把磁盘层缩减到容量的 90%"""
+        count = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_disk_items:
+            return
+        excess = count - int(self.max_disk_items * 0.9)
+        with db:
+            db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY used_at LIMIT ?)",
+                (excess,)
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_items': len(self._memory),
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None
+            }
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._writer is not None:
+            self._wakeup.set()
+            self._writer.join()
+            self.flush()
+        with self._pending_lock:
+            connections, self._connections = self._connections, []
+        for db in connections:
+            db.close()
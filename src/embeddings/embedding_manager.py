@@ -1,69 +1,154 @@
 # src/embeddings/embedding_manager.py
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+import time
 import numpy as np
 import requests
-from config.config import API_KEY
+from requests.adapters import HTTPAdapter
+from .embedding_cache import EmbeddingCache
+from src.monitoring import metrics
+from config.config import (
+    API_KEY, BATCH_SIZE, EMBEDDING_API_URL, EMBEDDING_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES, EMBEDDING_TIMEOUT, HTTP_POOL_SIZE
+)
+
+def _http_status(error: Exception) -> Optional[int]:
+    """HTTP错误的状态码，其他异常返回 None"""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code
+    return None
+
+
+def _client_error(error: Exception) -> bool:
+    """4xx（429除外）说明请求本身有问题，重试也不会成功"""
+    status = _http_status(error)
+    return status is not None and 400 <= status < 500 and status != 429
+
 
 class EmbeddingManager:
     """管理文本嵌入的计算和存储，使用NeoLink AI API"""
-    
-    def __init__(self, model_name: str):
+
+    def __init__(
+        self,
+        model_name: str,
+        api_url: str = EMBEDDING_API_URL,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+        timeout: float = EMBEDDING_TIMEOUT,
+        cache: Optional[EmbeddingCache] = None,
+        pool_size: int = HTTP_POOL_SIZE
+    ):
         self.model_name = model_name
-        self.api_url = "https://neolink-ai.com/model/api/v1/embeddings"
+        self.cache = cache
+        self.api_url = api_url
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.timeout = timeout
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {API_KEY}"
         }
+        # 复用长连接；批量计算与并发查询共享同一个连接池
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(self.concurrency, pool_size))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(self.headers)
+
+    def _call_api(self, texts: List[str]) -> List[List[float]]:
+        """调用NeoLink AI API获取一批文本的嵌入向量，失败时按指数退避重试"""
+        payload = {
+            "model": self.model_name,
+            "input": texts,
+            "encoding_format": "float"
+        }
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.timer('embedding_api'):
+                    response = self.session.post(
+                        self.api_url,
+                        json=payload,
+                        timeout=self.timeout
+                    )
+                response.raise_for_status()
+
+                data = response.json()['data']
+                if len(data) != len(texts):
+                    raise ValueError(f"返回 {len(data)} 个向量，期望 {len(texts)} 个")
+                # 按index排序，保证输出与输入一一对应
+                data.sort(key=lambda item: item.get('index', 0))
+                return [item['embedding'] for item in data]
+
+            except Exception as e:
+                if _client_error(e) or attempt == self.max_retries:
+                    metrics.count('embedding_api_failure')
+                    raise
+                metrics.count('embedding_api_retry')
+                delay = 0.5 * (2 ** attempt)
+                print(f"获取嵌入向量失败，{delay:.1f}s 后重试: {e}")
+                time.sleep(delay)
 
-    def _call_api(self, text: str) -> List[float]:
-        """调用NeoLink AI API获取嵌入向量"""
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """计算一个批次，整批失败时逐条重试以定位失败的文本"""
         try:
-            payload = {
-                "model": self.model_name,
-                "input": text,
-                "encoding_format": "float"
-            }
-            
-            response = requests.post(
-                self.api_url,
-                headers=self.headers,
-                json=payload
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            return result['data'][0]['embedding']
-            
+            return self._call_api(texts)
         except Exception as e:
-            print(f"获取嵌入向量失败: {e}")
-            return None
-
-    def compute_embeddings(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
-        """计算文本的嵌入向量"""
-        embeddings = []
-        
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i + batch_size]
-            
-            # 由于API一次只处理一个文本，需要循环处理
-            for text in batch_texts:
-                embedding = self._call_api(text)
-                if embedding:
-                    embeddings.append(embedding)
-        
-        if not embeddings:
+            # 认证失败时逐条请求同样会失败
+            if len(texts) == 1 or _http_status(e) in (401, 403):
+                raise Exception(f"获取嵌入向量失败: {e}")
+            print(f"批量获取嵌入向量失败，改为逐条请求: {e}")
+            return [self._call_api([text])[0] for text in texts]
+
+    def compute_embeddings(self, texts: List[str], batch_size: int = BATCH_SIZE) -> np.ndarray:
+        """计算文本的嵌入向量，返回行数与输入一致的归一化矩阵"""
+        if not texts:
             raise Exception("未能获取任何嵌入向量")
-            
+        if self.cache is None:
+            return self._compute_uncached(texts, batch_size)
+
+        keys = [EmbeddingCache.make_key(self.model_name, text) for text in texts]
+        cached = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        # 只为未命中的文本调用API，同一批次内的重复文本只计算一次
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        metrics.count('embedding_cache_hit', len(keys) - len(missing))
+        metrics.count('embedding_cache_miss', len(missing))
+        if missing:
+            computed = self._compute_uncached(list(missing.values()), batch_size)
+            new_items = dict(zip(missing.keys(), computed))
+            self.cache.put_many(new_items)
+            cached.update(new_items)
+
+        return np.vstack([cached[key] for key in keys])
+
+    def _compute_uncached(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """直接调用API计算嵌入向量，不经过缓存"""
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as executor:
+                results = list(executor.map(self._embed_batch, batches))
+
         # 将所有嵌入向量转换为numpy数组
-        embeddings_array = np.array(embeddings)
-        
+        embeddings_array = np.array(
+            [embedding for batch in results for embedding in batch],
+            dtype=np.float32
+        )
+
         # 进行L2归一化
         norms = np.linalg.norm(embeddings_array, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
         normalized_embeddings = embeddings_array / norms
-        
+
         return normalized_embeddings
 
     def compute_similarity(self, query_embedding: np.ndarray, doc_embeddings: np.ndarray) -> np.ndarray:
         """计算查询向量与文档向量之间的余弦相似度"""
-        return np.dot(query_embedding, doc_embeddings.T)
\ No newline at end of file
+        return np.dot(query_embedding, doc_embeddings.T)
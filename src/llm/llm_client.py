@@ -1,19 +1,53 @@
 # src/llm/llm_client.py
 
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List
+import json
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 import pytz
-from config.config import API_URL, DEFAULT_MODEL, DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE
+from config.config import (
+    API_URL, DEFAULT_MODEL, DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE, HTTP_POOL_SIZE,
+    LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT
+)
+from src.monitoring import metrics
 
 class LLMClient:
     """LLM API客户端"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, api_url: str = API_URL, pool_size: int = HTTP_POOL_SIZE,
+                 timeout: tuple = (LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)):
+        self.api_url = api_url
+        # (连接超时, 读取超时)，避免卡住的LLM服务长期占用线程和SSE连接
+        self.timeout = timeout
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": api_key
         }
+        # 复用长连接，避免每次调用都重新建立TLS连接
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(self.headers)
+
+    def _build_payload(self, prompt: str, max_tokens: int, temperature: float,
+                       model: str, stream: bool = False) -> Dict[str, Any]:
+        data = {
+            "model": model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if stream:
+            data["stream"] = True
+        return data
 
     def generate_response(
         self,
@@ -24,28 +58,53 @@ class LLMClient:
     ) -> Optional[str]:
         """调用LLM API生成回答"""
         try:
-            data = {
-                "model": model,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "temperature": temperature,
-                "max_tokens": max_tokens
-            }
-            
-            response = requests.post(API_URL, headers=self.headers, json=data)
-            response.raise_for_status()
+            data = self._build_payload(prompt, max_tokens, temperature, model)
             
-            result = response.json()
+            with metrics.timer('llm_total'):
+                response = self.session.post(self.api_url, json=data, timeout=self.timeout)
+                response.raise_for_status()
+                result = response.json()
             return result['choices'][0]['message']['content']
             
         except Exception as e:
+            metrics.count('llm_failure')
             print(f"LLM调用失败: {e}")
             return None
 
+    def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        temperature: float = DEFAULT_TEMPERATURE,
+        model: str = DEFAULT_MODEL
+    ) -> Iterator[str]:
+        """以流式方式调用LLM API，逐个产出增量文本"""
+        data = self._build_payload(prompt, max_tokens, temperature, model, stream=True)
+        start = time.perf_counter()
+        first_token = True
+
+        with self.session.post(self.api_url, json=data, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=False):
+                # OpenAI兼容的SSE格式: "data: {...}"，以 "data: [DONE]" 结束
+                if not line or not line.startswith(b'data:'):
+                    continue
+                payload = line[5:].strip()
+                if payload == b'[DONE]':
+                    break
+                chunk = json.loads(payload)
+                choices = chunk.get('choices') or []
+                if not choices:
+                    continue
+                content = (choices[0].get('delta') or {}).get('content')
+                if content:
+                    if first_token:
+                        metrics.observe('llm_first_token', time.perf_counter() - start)
+                        first_token = False
+                    yield content
+        # 只统计完整读取的流，客户端中途断开时不记录
+        metrics.observe('llm_total', time.perf_counter() - start)
+
     def get_beijing_time(self) -> str:
         """获取北京时间"""
         beijing_tz = pytz.timezone('Asia/Shanghai')
@@ -0,0 +1,131 @@
+# src/processors/chunker.py
+
+from typing import Dict, List, Optional
+import re
+from langchain.docstore.document import Document
+from config.config import CHUNK_TARGET_TOKENS, CHUNK_OVERLAP_TOKENS
+
+_CJK = re.compile(r'[㐀-䶿一-鿿豈-﫿]')
+_SENTENCE_END = re.compile(r'(?<=[。！？；.!?;])\s*')
+
+
+def estimate_tokens(text: str) -> int:
+    """不依赖分词器的token估算：汉字每字约1个token，其他字符每4个约1个token"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def split_sentences(text: str, max_tokens: int) -> List[str]:
+    """把超长文本按句子切分为不超过 max_tokens 的片段"""
+    pieces, current = [], ''
+    for sentence in filter(None, _SENTENCE_END.split(text)):
+        if current and estimate_tokens(current + sentence) > max_tokens:
+            pieces.append(current)
+            current = ''
+        # 单个句子仍然超长时按字符硬切
+        while estimate_tokens(sentence) > max_tokens:
+            cut = max(1, len(sentence) * max_tokens // estimate_tokens(sentence))
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:]
+        current += sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+class LayoutChunker:
+    """按版面信息把 Parse Server 的解析块合并为段落级文档块
+
+    - 标题块（is_title 或 block_type 为 title）开始新的章节，章节内容不跨标题合并；
+    - 同一章节内的连续块合并，直到估算 token 数接近 target_tokens；
+    - 相邻文档块之间保留末尾不超过 overlap_tokens 的块作为重叠上下文；
+    - 每个文档块以所属标题开头，使孤立的表格单元、短句也带有章节语义。
+    """
+
+    def __init__(self, target_tokens: int = CHUNK_TARGET_TOKENS,
+                 overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+        self.target_tokens = target_tokens
+        self.overlap_tokens = min(overlap_tokens, target_tokens // 2)
+
+    @staticmethod
+    def _is_title(block: Dict) -> bool:
+        metadata = block['metadata']
+        return bool(metadata.get('is_title')) or metadata.get('block_type') == 'title'
+
+    @staticmethod
+    def _order(block: Dict):
+        metadata = block['metadata']
+        return (metadata.get('page_num') or 0, metadata.get('position') or 0)
+
+    def chunk(self, blocks: List[Dict]) -> List[Document]:
+        """blocks 为 ParseClient.parse_document 的输出（content 已清洗）"""
+        if any(block['metadata'].get('position') is not None for block in blocks):
+            blocks = sorted(blocks, key=self._order)
+
+        documents: List[Document] = []
+        heading: Optional[str] = None
+        section: List[Dict] = []
+        for block in blocks:
+            if self._is_title(block):
+                documents.extend(self._chunk_section(section, heading))
+                heading, section = block['content'], []
+            else:
+                section.append(block)
+        documents.extend(self._chunk_section(section, heading))
+        # 只有标题、没有正文的文件，保留标题本身
+        if not documents and heading:
+            documents.append(self._make_document([], heading, blocks[-1]))
+        return documents
+
+    def _pieces(self, section: List[Dict]):
+        """超长的单个块拆分为多个片段，其余块原样产出"""
+        for block in section:
+            if estimate_tokens(block['content']) <= self.target_tokens:
+                yield block
+                continue
+            for piece in split_sentences(block['content'], self.target_tokens):
+                yield dict(block, content=piece)
+
+    def _chunk_section(self, section: List[Dict], heading: Optional[str]) -> List[Document]:
+        documents = []
+        current: List[Dict] = []
+        tokens = estimate_tokens(heading) if heading else 0
+        base_tokens = tokens
+        has_new = False  # 当前块是否包含重叠部分以外的内容
+        for block in self._pieces(section):
+            block_tokens = estimate_tokens(block['content'])
+            if has_new and tokens + block_tokens > self.target_tokens:
+                documents.append(self._make_document(current, heading, current[0]))
+                current = self._overlap(current)
+                tokens = base_tokens + sum(estimate_tokens(b['content']) for b in current)
+                has_new = False
+            current.append(block)
+            tokens += block_tokens
+            has_new = True
+        if has_new:
+            documents.append(self._make_document(current, heading, current[0]))
+        return documents
+
+    def _overlap(self, blocks: List[Dict]) -> List[Dict]:
+        overlap, tokens = [], 0
+        for block in reversed(blocks):
+            tokens += estimate_tokens(block['content'])
+            if tokens > self.overlap_tokens:
+                break
+            overlap.insert(0, block)
+        # 整个上一块都能作为重叠时不重叠，避免产生内容被下一块完全包含的文档块
+        return overlap if len(overlap) < len(blocks) else []
+
+    @staticmethod
+    def _make_document(blocks: List[Dict], heading: Optional[str], first: Dict) -> Document:
+        body = '\n'.join(block['content'] for block in blocks)
+        content = f"{heading}\n{body}" if heading and body else (heading or body)
+        metadata = dict(first['metadata'])
+        metadata.update({
+            'block_type': 'chunk',
+            'is_title': False,
+            'heading': heading,
+            'block_count': len(blocks),
+            'end_position': blocks[-1]['metadata'].get('position') if blocks else metadata.get('position')
+        })
+        return Document(page_content=content, metadata=metadata)
@@ -1,19 +1,32 @@
+from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from langchain.docstore.document import Document
 from .parse_client import ParseClient
-from config.config import PARSE_SERVER_URL, PARSE_SERVER_TIMEOUT
+from .manifest import FileManifest
+from .chunker import LayoutChunker
+from config.config import (
+    PARSE_SERVER_URL, PARSE_SERVER_TIMEOUT, PARSE_WORKERS, CHUNK_STRATEGY, KNOWLEDGE_BASE_DIR
+)
+from src.monitoring import metrics
 
 class DocumentProcessor:
     """处理文档并提取文本内容的处理器"""
     
-    def __init__(self):
+    def __init__(self, max_workers: int = PARSE_WORKERS, chunk_strategy: str = CHUNK_STRATEGY,
+                 root_dir=KNOWLEDGE_BASE_DIR):
         self.logger = logging.getLogger(__name__)
+        # 知识库根目录，文件相对它的子目录名作为标签
+        self.root_dir = Path(root_dir)
+        self.max_workers = max(1, max_workers)
+        self.chunker = LayoutChunker() if chunk_strategy == 'layout' else None
         # 初始化Parse Client
         self.parse_client = ParseClient(
             server_url=PARSE_SERVER_URL,
-            timeout=PARSE_SERVER_TIMEOUT
+            timeout=PARSE_SERVER_TIMEOUT,
+            pool_size=self.max_workers
         )
 
     def clean_text(self, text: str) -> str:
@@ -23,41 +36,126 @@ class DocumentProcessor:
             
         return " ".join(text.split())
 
+    def file_metadata(self, file_path: str) -> Dict:
+        """文件级元数据：文件类型、文档日期（文件修改时间）和知识库子目录名作为标签"""
+        path = Path(file_path)
+        try:
+            tags = list(path.resolve().relative_to(self.root_dir.resolve()).parent.parts)
+        except ValueError:
+            tags = []
+        return {
+            'file_type': path.suffix.lower().lstrip('.'),
+            'doc_date': datetime.fromtimestamp(path.stat().st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+            'tags': tags
+        }
+
     def load_document(self, file_path: str) -> List[Document]:
-        """加载并解析文档，返回文档块列表"""
+        """加载并解析文档，返回文档块列表；解析失败时记录日志并返回空列表"""
         try:
-            blocks = self.parse_client.parse_document(file_path)
-            if not blocks:
-                return []
-            
-            documents = []
-            for block in blocks:
-                clean_content = self.clean_text(block['content'])
-                if clean_content:
-                    documents.append(
-                        Document(
-                            page_content=clean_content,
-                            metadata=block['metadata']
-                        )
-                    )
-            return documents
-            
+            return self._load(file_path)
         except Exception as e:
             self.logger.error(f"处理文件 {file_path} 时出错: {e}")
             return []
 
-    def process_documents(self, directory: str) -> List[Document]:
+    def _load(self, file_path: str) -> List[Document]:
+        blocks = self.parse_client.parse_document(file_path)
+        if not blocks:
+            return []
+
+        file_metadata = self.file_metadata(file_path)
+        cleaned = []
+        for block in blocks:
+            clean_content = self.clean_text(block['content'])
+            if clean_content:
+                cleaned.append({'content': clean_content, 'metadata': dict(block['metadata'], **file_metadata)})
+
+        if self.chunker is not None:
+            documents = self.chunker.chunk(cleaned)
+            self.logger.info(f"{Path(file_path).name}: {len(cleaned)} 个解析块合并为 {len(documents)} 个文档块")
+            return documents
+        return [
+            Document(page_content=block['content'], metadata=block['metadata'])
+            for block in cleaned
+        ]
+
+    # 扩展支持的文件类型
+    SUPPORTED_EXTENSIONS = {'.doc', '.docx', '.pdf', '.txt', '.html', '.epub',
+                            '.jpg', '.jpeg', '.png'}
+
+    def list_files(self, directory: str) -> List[Path]:
+        """列出目录中所有支持的文件"""
+        return [
+            file_path for file_path in Path(directory).glob('**/*')
+            if file_path.suffix.lower() in self.SUPPORTED_EXTENSIONS
+        ]
+
+    def iter_files(self, file_paths: Iterable,
+                   failures: Optional[Dict[str, str]] = None) -> Iterator[Tuple[str, List[Document]]]:
+        """解析给定文件，按完成顺序产出 (文件路径, 文档块列表)
+
+        max_workers > 1 时使用线程池并发解析，同时在途的文件数受限，
+        调用方可以在全部文件解析完成之前开始处理已产出的结果。
+        单个文件解析失败或超时只会得到空列表，不影响其他文件；
+        提供 failures 时失败的文件路径和原因记录在其中。
+        """
+        file_paths = [str(file_path) for file_path in file_paths]
+        if self.max_workers == 1 or len(file_paths) <= 1:
+            for file_path in file_paths:
+                try:
+                    doc_blocks = self._load_logged(file_path)
+                except Exception as e:
+                    doc_blocks = self._failed(file_path, e, failures)
+                yield file_path, doc_blocks
+            return
+
+        pending = iter(file_paths)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+
+            def submit_next():
+                file_path = next(pending, None)
+                if file_path is not None:
+                    futures[executor.submit(self._load_logged, file_path)] = file_path
+
+            for _ in range(self.max_workers * 2):
+                submit_next()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path = futures.pop(future)
+                    submit_next()
+                    try:
+                        doc_blocks = future.result()
+                    except Exception as e:
+                        doc_blocks = self._failed(file_path, e, failures)
+                    yield file_path, doc_blocks
+
+    def _failed(self, file_path: str, error: Exception, failures: Optional[Dict[str, str]]) -> List[Document]:
+        self.logger.error(f"处理文件 {file_path} 时出错: {error}")
+        metrics.count('parse_file_failed')
+        if failures is not None:
+            failures[file_path] = str(error)
+        return []
+
+    def _load_logged(self, file_path: str) -> List[Document]:
+        with metrics.timer('parse'):
+            doc_blocks = self._load(file_path)
+        if doc_blocks:
+            self.logger.info(f"成功处理文件 {Path(file_path).name}，获取到 {len(doc_blocks)} 个文档块")
+        return doc_blocks
+
+    def iter_documents(self, directory: str,
+                       manifest: Optional[FileManifest] = None) -> Iterator[Tuple[str, List[Document]]]:
+        """逐个文件解析目录中的文档；提供清单时只处理新增或修改过的文件"""
+        file_paths = self.list_files(directory)
+        if manifest is not None:
+            plan = manifest.plan(file_paths)
+            file_paths = plan['new'] + plan['changed']
+        return self.iter_files(file_paths)
+
+    def process_documents(self, directory: str, manifest: Optional[FileManifest] = None) -> List[Document]:
         """处理目录中的所有文档并返回文档块列表"""
         documents = []
-        # 扩展支持的文件类型
-        supported_extensions = {'.doc', '.docx', '.pdf', '.txt', '.html', '.epub', 
-                              '.jpg', '.jpeg', '.png'}
-        
-        for file_path in Path(directory).glob('**/*'):
-            if file_path.suffix.lower() in supported_extensions:
-                doc_blocks = self.load_document(str(file_path))
-                if doc_blocks:
-                    documents.extend(doc_blocks)
-                    self.logger.info(f"成功处理文件 {file_path.name}，获取到 {len(doc_blocks)} 个文档块")
-        
-        return documents
\ No newline at end of file
+        for _, doc_blocks in self.iter_documents(directory, manifest):
+            documents.extend(doc_blocks)
+        return documents
@@ -0,0 +1,120 @@
+# src/processors/local_parser.py
+
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, List, Optional
+import re
+
+
+def read_text(file_path: str) -> str:
+    """按 UTF-8、GB18030 的顺序尝试解码文本文件"""
+    data = Path(file_path).read_bytes()
+    for encoding in ('utf-8-sig', 'gb18030'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace')
+
+
+def _block(file_path: str, content: str, position: int, is_title: bool) -> Dict:
+    """与 ParseClient.parse_document 输出格式相同的解析块"""
+    return {
+        'content': content,
+        'metadata': {
+            'source': file_path,
+            'block_type': 'title' if is_title else 'text',
+            'page_num': 1,
+            'position': position,
+            'is_title': is_title,
+            'confidence': 1.0
+        }
+    }
+
+
+def parse_txt(file_path: str) -> List[Dict]:
+    """以空行切分段落，每段一个解析块；以 "#" 开头的段落视为标题"""
+    text = read_text(file_path).replace('\r\n', '\n')
+    blocks = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        is_title = paragraph.startswith('#')
+        content = paragraph.lstrip('# ') if is_title else paragraph
+        if content:
+            blocks.append(_block(file_path, content, len(blocks), is_title))
+    return blocks
+
+
+class _HTMLBlockParser(HTMLParser):
+    """按块级元素切分 HTML 正文，h1-h6 和 title 视为标题，忽略脚本和样式"""
+
+    BLOCK_TAGS = {'p', 'div', 'li', 'tr', 'td', 'th', 'pre', 'blockquote', 'section', 'article',
+                  'header', 'footer', 'dd', 'dt', 'br', 'table', 'ul', 'ol', 'caption'}
+    TITLE_TAGS = {'title', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+    SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'head'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[tuple] = []
+        self._text: List[str] = []
+        self._title_depth = 0
+        self._skip_depth = 0
+
+    def _flush(self):
+        content = ' '.join(''.join(self._text).split())
+        if content:
+            self.blocks.append((content, self._title_depth > 0))
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        # <head> 中只保留 <title>
+        if tag in self.SKIP_TAGS and tag != 'head':
+            self._skip_depth += 1
+        elif tag in self.TITLE_TAGS:
+            self._flush()
+            self._title_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and tag != 'head':
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.TITLE_TAGS:
+            self._flush()
+            self._title_depth = max(0, self._title_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def parse_html(file_path: str) -> List[Dict]:
+    """用标准库 html.parser 提取 HTML 正文，每个块级元素一个解析块"""
+    parser = _HTMLBlockParser()
+    parser.feed(read_text(file_path))
+    parser.close()
+    return [
+        _block(file_path, content, position, is_title)
+        for position, (content, is_title) in enumerate(parser.blocks)
+    ]
+
+
+# 可以不经过 Parse Server 解析的文件类型
+LOCAL_PARSERS = {
+    '.txt': parse_txt,
+    '.html': parse_html
+}
+
+
+def parse_locally(file_path: str) -> Optional[List[Dict]]:
+    """本地解析文件，不支持的类型返回 None"""
+    parser = LOCAL_PARSERS.get(Path(file_path).suffix.lower())
+    return parser(file_path) if parser is not None else None
@@ -0,0 +1,150 @@
+# src/processors/manifest.py
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+
+
+# 最近计算过的文件哈希: (绝对路径, 大小, mtime_ns) -> 哈希
+_HASH_MEMO_SIZE = 4096
+_hash_memo: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_hash_memo_lock = threading.Lock()
+
+
+def file_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """计算文件内容的SHA-256
+
+    结果按路径、大小和 mtime 记忆，任务查重、解析缓存和清单对同一个未修改的文件只读取一遍。
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    with _hash_memo_lock:
+        cached = _hash_memo.get(key)
+        if cached is not None:
+            _hash_memo.move_to_end(key)
+            return cached
+
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    result = digest.hexdigest()
+
+    # 读取期间被修改的文件不记忆
+    stat = os.stat(file_path)
+    if (stat.st_size, stat.st_mtime_ns) == key[1:]:
+        with _hash_memo_lock:
+            _hash_memo[key] = result
+            while len(_hash_memo) > _HASH_MEMO_SIZE:
+                _hash_memo.popitem(last=False)
+    return result
+
+
+class FileManifest:
+    """已索引文件清单，按路径记录 size / mtime / 内容哈希
+
+    只有 size 或 mtime 变化的文件才会重新计算哈希，哈希也变化时才需要重新索引，
+    因此在没有文件变化时启动几乎不产生额外开销。path 为 None 时清单只保存在内存中。
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else None
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self):
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except Exception as e:
+            self.logger.warning(f"读取文件清单 {self.path} 失败，将重新索引: {e}")
+            self.entries = {}
+
+    def save(self):
+        """原子写入清单文件"""
+        if not self.path:
+            return
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+    def _is_unchanged(self, file_path: str, stat: os.stat_result) -> bool:
+        entry = self.entries.get(file_path)
+        if entry is None:
+            return False
+        if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return True
+        if entry['size'] != stat.st_size:
+            return False
+        # mtime 变化但内容相同（例如被 touch 或复制覆盖），只更新 mtime
+        if file_hash(file_path) == entry['hash']:
+            with self._lock:
+                entry['mtime'] = stat.st_mtime
+            return True
+        return False
+
+    def plan(self, file_paths: Iterable, directory: Optional[str] = None) -> Dict[str, List[str]]:
+        """对比磁盘文件与清单，返回 new / changed / removed / unchanged 文件列表
+
+        directory 给定时，清单中位于该目录下但已不存在的文件记为 removed。
+        """
+        plan = {'new': [], 'changed': [], 'removed': [], 'unchanged': []}
+        seen = set()
+        for file_path in map(str, file_paths):
+            seen.add(file_path)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            if file_path not in self.entries:
+                plan['new'].append(file_path)
+            elif self._is_unchanged(file_path, stat):
+                plan['unchanged'].append(file_path)
+            else:
+                plan['changed'].append(file_path)
+
+        if directory is not None:
+            prefix = str(directory).rstrip(os.sep) + os.sep
+            plan['removed'] = [
+                file_path for file_path in list(self.entries)
+                if file_path.startswith(prefix) and file_path not in seen
+            ]
+        return plan
+
+    @staticmethod
+    def snapshot(file_path: str) -> Optional[Dict]:
+        """在解析之前记录文件的 size / mtime / 哈希，文件不存在时返回 None
+
+        清单记录的是被解析的那个版本：解析期间文件被修改时，下次同步会因哈希不同而重新索引。
+        哈希已被记忆，解析缓存随后对同一文件取哈希时不会再读一遍。
+        """
+        try:
+            stat = os.stat(file_path)
+            return {'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': file_hash(file_path)}
+        except OSError:
+            return None
+
+    def mark_indexed(self, file_path: str, chunks: int, snapshot: Optional[Dict] = None):
+        """记录文件已成功索引，snapshot 为解析前 snapshot() 的结果"""
+        entry = dict(snapshot or self.snapshot(file_path), chunks=chunks)
+        with self._lock:
+            self.entries[str(file_path)] = entry
+
+    def remove(self, file_path: str):
+        with self._lock:
+            self.entries.pop(str(file_path), None)
+
+    def __contains__(self, file_path: str) -> bool:
+        return str(file_path) in self.entries
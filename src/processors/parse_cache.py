@@ -0,0 +1,135 @@
+# src/processors/parse_cache.py
+
+from pathlib import Path
+from typing import Dict, List, Optional
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+
+
+class ParseCache:
+    """按文件内容哈希缓存 Parse Server 的解析结果
+
+    每个文件的解析块以 gzip 压缩的 JSON 保存在 <目录>/<哈希前两位>/<哈希>.json.gz，
+    内容相同、文件名不同的文件共用同一份结果。缓存中不保存 source，
+    命中时换成当前的文件路径。写入先写临时文件再原子替换，损坏的缓存文件视为未命中。
+
+    max_bytes 为缓存目录的容量上限：命中时刷新文件的 mtime，写入后总大小超出上限时
+    按 mtime 删除最久未用的结果，直到降到上限的 90%。None 表示不限。
+    """
+
+    # 解析块格式变化时递增，旧版本的缓存自动失效
+    VERSION = 1
+
+    def __init__(self, directory, max_bytes: Optional[int] = None):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # 启动时统计一次已有缓存的大小，之后随写入和淘汰增减
+        self.total_bytes = sum(size for _, _, size in self._entries()) if max_bytes else 0
+
+    def _entries(self):
+        """(mtime, 路径, 字节数)，遍历时被删除的文件跳过"""
+        if not self.directory.exists():
+            return
+        for subdir in os.scandir(self.directory):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if not entry.name.endswith('.json.gz'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, entry.path, stat.st_size
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json.gz"
+
+    def get(self, key: str, source: str) -> Optional[List[Dict]]:
+        """读取解析块并填入 source，未命中返回 None"""
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            self.logger.warning(f"解析缓存 {path.name} 已损坏，将重新解析: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        if record.get('version') != self.VERSION:
+            return None
+        if self.max_bytes:
+            # mtime 作为最近使用时间，淘汰时保留常用的结果
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return [
+            {'content': block['content'], 'metadata': dict(block['metadata'], source=source)}
+            for block in record['blocks']
+        ]
+
+    def put(self, key: str, blocks: List[Dict]):
+        path = self._path(key)
+        record = {
+            'version': self.VERSION,
+            'blocks': [
+                {
+                    'content': block['content'],
+                    'metadata': {k: v for k, v in block['metadata'].items() if k != 'source'}
+                }
+                for block in blocks
+            ]
+        }
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                    f.write(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+                size = os.path.getsize(tmp_path)
+                with self._lock:
+                    try:
+                        replaced = path.stat().st_size
+                    except FileNotFoundError:
+                        replaced = 0
+                    os.replace(tmp_path, path)
+                    self.total_bytes += size - replaced
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            # 缓存写入失败不影响本次解析结果
+            self.logger.warning(f"写入解析缓存失败: {e}")
+            return
+        if self.max_bytes and self.total_bytes > self.max_bytes:
+            self._prune()
+
+    def _prune(self):
+        """按 mtime 删除最久未用的结果，把缓存缩减到容量的 90%"""
+        with self._lock:
+            if self.total_bytes <= self.max_bytes:
+                return
+            target = int(self.max_bytes * 0.9)
+            entries = sorted(self._entries())
+            # 以实际大小为准，顺便纠正统计误差（例如其他进程写入或删除的文件）
+            self.total_bytes = sum(size for _, _, size in entries)
+            removed = 0
+            for _, path, size in entries:
+                if self.total_bytes <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                self.total_bytes -= size
+                removed += 1
+        if removed:
+            self.logger.info(f"解析缓存超出容量，删除了 {removed} 个最久未用的结果")
@@ -1,14 +1,98 @@
 import logging
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Optional, List, Dict
 from pathlib import Path
+from .local_parser import LOCAL_PARSERS, parse_locally
+from .manifest import file_hash
+from .parse_cache import ParseCache
+from config.config import (
+    PARSE_MAX_RETRIES, PARSE_CIRCUIT_FAILURES, PARSE_CIRCUIT_RESET_SECONDS, PARSE_CACHE_DIR, PARSE_CACHE_MAX_MB,
+    PARSE_LOCAL_MODE
+)
+from src.monitoring import metrics
+
+
+class ParseServerUnavailable(Exception):
+    """Parse Server 熔断期间不再发送请求"""
+
+
+class CircuitBreaker:
+    """连续失败 failure_threshold 次后熔断 reset_seconds 秒
+
+    熔断结束后只放行一个试探请求：成功则恢复，失败则重新计时。
+    """
+
+    def __init__(self, failure_threshold: int = PARSE_CIRCUIT_FAILURES,
+                 reset_seconds: float = PARSE_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> bool:
+        """记录一次失败，返回本次是否触发熔断"""
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._failures < self.failure_threshold:
+                return False
+            opened = self._opened_at is None
+            self._opened_at = time.monotonic()
+            return opened
+
 
 class ParseClient:
-    """Parse Server客户端"""
+    """Parse Server客户端
+
+    - 解析结果按文件内容哈希缓存在磁盘上，重复摄取同一内容的文件不再请求 Parse Server；
+    - 请求失败按指数退避重试，连续失败后熔断，熔断期间直接失败而不是逐个等待超时；
+    - local_mode 为 fallback 时 txt/html 在 Parse Server 不可用时改用本地解析，
+      为 always 时始终本地解析。
+    """
     
-    def __init__(self, server_url: str, timeout: int = 180):
+    def __init__(self, server_url: str, timeout: int = 180, pool_size: int = 4,
+                 max_retries: int = PARSE_MAX_RETRIES, cache_dir=PARSE_CACHE_DIR,
+                 cache_max_mb: Optional[int] = PARSE_CACHE_MAX_MB,
+                 local_mode: str = PARSE_LOCAL_MODE, breaker: Optional[CircuitBreaker] = None):
         self.server_url = server_url.rstrip('/')
         self.timeout = timeout
+        self.max_retries = max_retries
+        self.cache = ParseCache(cache_dir, cache_max_mb * 2 ** 20 if cache_max_mb else None) if cache_dir else None
+        if local_mode not in ('off', 'fallback', 'always'):
+            raise ValueError(f"未知的本地解析模式: {local_mode}")
+        self.local_mode = local_mode
+        self.breaker = breaker or CircuitBreaker()
+
+        # 所有解析线程共享一个带连接池的会话
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         
         # 配置日志
         logging.getLogger('pdfminer').setLevel(logging.WARNING)
@@ -22,59 +106,107 @@ class ParseClient:
             self.logger.addHandler(handler)
             
     def parse_document(self, file_path: str) -> List[Dict]:
-        """使用Parse Server解析文档，返回文档块列表"""
+        """解析文档，返回文档块列表；依次尝试本地解析（always）、解析缓存和Parse Server"""
         self.logger.info(f"开始处理文件: {Path(file_path).name}")
-        
-        try:
-            with open(file_path, 'rb') as f:
-                files = {'file': f}
-                
-                response = requests.post(
-                    f"{self.server_url}/parse/all_doc",
-                    files=files,
-                    timeout=self.timeout
-                )
-                
-                response.raise_for_status()
-                result = response.json()
-                
-                if not isinstance(result, dict) or 'blocks' not in result:
-                    self.logger.error("响应中缺少blocks字段")
-                    return []
-                
-                # 处理并返回有效的文档块
-                blocks = []
-                for block in result['blocks']:
-                    if not block.get('is_image') and block.get('content'):
-                        blocks.append({
-                            'content': block['content'],
-                            'metadata': {
-                                'source': file_path,
-                                'block_type': block.get('type', 'text'),
-                                'page_num': block.get('page_num'),
-                                'position': block.get('position'),
-                                'is_title': block.get('is_title', False),
-                                'confidence': block.get('confidence', 1.0)
-                            }
-                        })
-                
-                self.logger.info(f"Parse Server解析成功，获取到 {len(blocks)} 个文本块")
+        local = self.local_mode != 'off' and Path(file_path).suffix.lower() in LOCAL_PARSERS
+        if local and self.local_mode == 'always':
+            return self._parse_locally(file_path)
+
+        key = file_hash(file_path) if self.cache is not None else None
+        if key is not None:
+            blocks = self.cache.get(key, file_path)
+            if blocks is not None:
+                metrics.count('parse_cache_hit')
+                self.logger.info(f"命中解析缓存，获取到 {len(blocks)} 个文本块")
                 return blocks
-                
-        except requests.Timeout:
-            self.logger.error("Parse Server请求超时")
-            raise
-        except requests.RequestException as e:
-            self.logger.error(f"Parse Server请求失败: {e}")
-            raise
+            metrics.count('parse_cache_miss')
+
+        try:
+            blocks = self._parse_remote(file_path)
         except Exception as e:
-            self.logger.error(f"解析过程出错: {e}")
-            raise
+            if not local:
+                raise
+            self.logger.warning(f"Parse Server不可用，改用本地解析: {e}")
+            # 本地解析的结果不写入缓存，服务恢复后仍由 Parse Server 解析
+            return self._parse_locally(file_path)
+
+        if key is not None:
+            self.cache.put(key, blocks)
+        return blocks
+
+    def _parse_locally(self, file_path: str) -> List[Dict]:
+        metrics.count('parse_local')
+        blocks = parse_locally(file_path)
+        self.logger.info(f"本地解析成功，获取到 {len(blocks)} 个文本块")
+        return blocks
+
+    def _parse_remote(self, file_path: str) -> List[Dict]:
+        """请求Parse Server，失败时按指数退避重试；熔断期间直接抛出 ParseServerUnavailable"""
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                metrics.count('parse_circuit_rejected')
+                raise ParseServerUnavailable("Parse Server连续请求失败，已暂停请求")
+            try:
+                with metrics.timer('parse_server'):
+                    blocks = self._request(file_path)
+            except Exception as e:
+                # 4xx（429除外）说明请求本身有问题，服务是可用的，重试也不会成功
+                status = e.response.status_code if isinstance(e, requests.HTTPError) and e.response is not None else None
+                client_error = status is not None and 400 <= status < 500 and status != 429
+                if client_error:
+                    self.breaker.record_success()
+                elif self.breaker.record_failure():
+                    metrics.count('parse_circuit_open')
+                    self.logger.error(f"Parse Server连续失败，暂停请求 {self.breaker.reset_seconds}s")
+                if client_error or attempt == self.max_retries:
+                    metrics.count('parse_failure')
+                    self.logger.error(f"Parse Server请求失败: {e}")
+                    raise
+                metrics.count('parse_retry')
+                delay = 0.5 * (2 ** attempt)
+                self.logger.warning(f"Parse Server请求失败，{delay:.1f}s 后重试: {e}")
+                time.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return blocks
+
+    def _request(self, file_path: str) -> List[Dict]:
+        with open(file_path, 'rb') as f:
+            response = self.session.post(
+                f"{self.server_url}/parse/all_doc",
+                files={'file': f},
+                timeout=self.timeout
+            )
+
+        response.raise_for_status()
+        result = response.json()
+
+        if not isinstance(result, dict) or 'blocks' not in result:
+            raise ValueError("响应中缺少blocks字段")
+
+        # 处理并返回有效的文档块
+        blocks = []
+        for block in result['blocks']:
+            if not block.get('is_image') and block.get('content'):
+                blocks.append({
+                    'content': block['content'],
+                    'metadata': {
+                        'source': file_path,
+                        'block_type': block.get('type', 'text'),
+                        'page_num': block.get('page_num'),
+                        'position': block.get('position'),
+                        'is_title': block.get('is_title', False),
+                        'confidence': block.get('confidence', 1.0)
+                    }
+                })
+
+        self.logger.info(f"Parse Server解析成功，获取到 {len(blocks)} 个文本块")
+        return blocks
             
     def check_health(self) -> bool:
         """检查Parse Server是否可用"""
         try:
-            response = requests.get(f"{self.server_url}/docs", timeout=5)
+            response = self.session.get(f"{self.server_url}/docs", timeout=5)
             return response.status_code == 200
         except:
-            return False
\ No newline at end of file
+            return False
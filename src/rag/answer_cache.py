@@ -0,0 +1,117 @@
+# src/rag/answer_cache.py
+
+from typing import Dict, Iterable, List, Optional
+import hashlib
+import threading
+import time
+import numpy as np
+
+
+def chunk_key(doc: Dict) -> str:
+    """Stable identifier of a retrieved chunk"""
+    text = f"{doc['metadata']['source']}\0{doc['text']}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class AnswerCache:
+    """Semantic cache of generated answers
+
+    A lookup hits when a cached question is within ``threshold`` cosine
+    similarity of the new one, the entry has not expired, and retrieval
+    returned exactly the same chunks the cached answer was generated from.
+    Questions mentioning time-relative words get a shorter TTL, because the
+    prompt embeds the current Beijing time.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl: float = 600,
+        time_sensitive_ttl: float = 60,
+        time_keywords: Iterable[str] = (),
+        max_entries: int = 1000
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.time_sensitive_ttl = time_sensitive_ttl
+        self.time_keywords = tuple(time_keywords)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: List[Dict] = []
+        self._matrix = None  # stacked query embeddings, rebuilt lazily
+        self.hits = 0
+        self.misses = 0
+
+    def ttl_for(self, query: str) -> float:
+        if any(keyword in query for keyword in self.time_keywords):
+            return self.time_sensitive_ttl
+        return self.ttl
+
+    def _purge_expired(self, now: float):
+        alive = [entry for entry in self._entries if entry['expires_at'] > now]
+        if len(alive) != len(self._entries):
+            self._entries = alive
+            self._matrix = None
+
+    def lookup(self, query_embedding, retrieved_docs: List[Dict]) -> Optional[Dict]:
+        """Return the cached result for a near-duplicate question, or None"""
+        chunk_ids = tuple(chunk_key(doc) for doc in retrieved_docs)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        with self._lock:
+            self._purge_expired(time.time())
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix = np.vstack([entry['embedding'] for entry in self._entries])
+                scores = self._matrix @ query
+                # 从最相似的候选开始检查，来源文档块必须完全一致
+                for position in np.argsort(-scores):
+                    if scores[position] < self.threshold:
+                        break
+                    entry = self._entries[position]
+                    if entry['chunk_ids'] == chunk_ids:
+                        self.hits += 1
+                        return entry['result']
+            self.misses += 1
+            return None
+
+    def store(self, query: str, query_embedding, retrieved_docs: List[Dict], result: Dict):
+        entry = {
+            'embedding': np.asarray(query_embedding, dtype=np.float32),
+            'chunk_ids': tuple(chunk_key(doc) for doc in retrieved_docs),
+            'sources': {doc['metadata']['source'] for doc in retrieved_docs},
+            'expires_at': time.time() + self.ttl_for(query),
+            'result': result
+        }
+        with self._lock:
+            self._entries.append(entry)
+            if len(self._entries) > self.max_entries:
+                self._entries = self._entries[-self.max_entries:]
+            self._matrix = None
+
+    def invalidate_sources(self, sources: Iterable[str]) -> int:
+        """Drop every answer that used a chunk from one of ``sources``"""
+        sources = set(map(str, sources))
+        if not sources:
+            return 0
+        with self._lock:
+            kept = [entry for entry in self._entries if not (entry['sources'] & sources)]
+            removed = len(self._entries) - len(kept)
+            if removed:
+                self._entries = kept
+                self._matrix = None
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._matrix = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
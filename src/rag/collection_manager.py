@@ -0,0 +1,311 @@
+# src/rag/collection_manager.py
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+import re
+import threading
+import time
+
+from src.embeddings.embedding_manager import EmbeddingManager
+from src.embeddings.embedding_cache import EmbeddingCache
+from src.llm.llm_client import LLMClient
+from src.monitoring import metrics
+from src.rag.rag_system import RAGSystem, create_storage
+from src.storage.base_storage import BaseStorage
+from config.config import (
+    COLLECTIONS_DIR, DEFAULT_COLLECTION, COLLECTION_MEMORY_BUDGET_MB, COLLECTION_LOAD_WAIT_SECONDS,
+    KNOWLEDGE_BASE_DIR,
+    MANIFEST_PATH, MEMORY_SNAPSHOT_DIR, MO_TABLE, EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MEMORY_ITEMS, EMBEDDING_CACHE_DISK_ITEMS
+)
+
+# Collection names become part of MatrixOne table names
+_NAME = re.compile(r'^[a-z][a-z0-9_]{0,47}$')
+_DEFAULT_WAIT = object()
+
+
+class CollectionUnavailable(Exception):
+    """The collection is still loading, or its last load failed; retry later"""
+
+    def __init__(self, name: str, state: str, error: Optional[str] = None):
+        super().__init__(f"Collection {name} is {state}" + (f": {error}" if error else ""))
+        self.name = name
+        self.state = state
+        self.error = error
+
+
+class _Collection:
+    """Load state of one collection
+
+    loading -> syncing (storage and indexes are up, queries are served while
+    the knowledge-base directory is synced) -> ready; or failed.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rag: Optional[RAGSystem] = None
+        self.state = 'loading'
+        self.error: Optional[str] = None
+        self.loaded = threading.Event()
+        self.in_use = 0
+        self.started_at = time.time()
+        self.loaded_at: Optional[float] = None
+        self.synced_at: Optional[float] = None
+        self.last_used = self.started_at
+
+    def status(self) -> Dict:
+        return {
+            'name': self.name,
+            'state': self.state,
+            'error': self.error,
+            'started_at': self.started_at,
+            'loaded_at': self.loaded_at,
+            'synced_at': self.synced_at,
+            'load_seconds': round(self.loaded_at - self.started_at, 3) if self.loaded_at else None,
+            'sync_seconds': round(self.synced_at - self.loaded_at, 3) if self.synced_at else None
+        }
+
+
+class CollectionManager:
+    """Named knowledge bases, each with its own storage partition and indexes
+
+    Collection ``name`` keeps its files in ``<base_dir>/<name>/files`` and its
+    chunks in the MatrixOne table ``<MO_TABLE>_<name>`` (on the memory fallback,
+    in its own snapshot under ``<base_dir>/<name>/memory_snapshot``), so a query
+    only scans the collection it targets. The default collection is the
+    original knowledge base, ``KNOWLEDGE_BASE_DIR`` stored in ``MO_TABLE``.
+
+    Collections are opened on first use and share one embedding client (and
+    its cache) and one LLM client. Opening runs on a background thread: the
+    storage connection, schema checks and index loading first, then the sync
+    of the knowledge-base directory, during which queries are already served.
+    ``use`` waits at most ``load_wait`` seconds for a collection that is still
+    loading and raises CollectionUnavailable after that. When the estimated memory of the loaded
+    collections exceeds ``memory_budget_mb``, the least recently used idle
+    ones are closed; only persistent collections are evicted, since they
+    reload from their table or snapshot.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_dir: Path = COLLECTIONS_DIR,
+        memory_budget_mb: float = COLLECTION_MEMORY_BUDGET_MB,
+        storage_factory: Callable[..., BaseStorage] = create_storage,
+        load_wait: Optional[float] = COLLECTION_LOAD_WAIT_SECONDS
+    ):
+        self.api_key = api_key
+        self.base_dir = Path(base_dir)
+        self.memory_budget = memory_budget_mb * 2 ** 20
+        self.storage_factory = storage_factory
+        self.load_wait = load_wait
+        self.embedding_manager = EmbeddingManager(
+            EMBEDDING_MODEL_NAME,
+            cache=EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_ITEMS, EMBEDDING_CACHE_DISK_ITEMS)
+        )
+        self.llm_client = LLMClient(api_key)
+        # name -> loading or loaded collection, least recently used first
+        self._loaded: "OrderedDict[str, _Collection]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def validate(name: Optional[str]) -> str:
+        """Normalize a requested collection name; empty means the default collection"""
+        if name is None or name == '':
+            return DEFAULT_COLLECTION
+        if not isinstance(name, str) or not _NAME.match(name):
+            raise ValueError(f"Invalid collection name: {name!r} "
+                             f"(lowercase letters, digits and underscores, starting with a letter)")
+        return name
+
+    def knowledge_base_dir(self, name: str) -> Path:
+        if name == DEFAULT_COLLECTION:
+            return Path(KNOWLEDGE_BASE_DIR)
+        return self.base_dir / name / 'files'
+
+    def exists(self, name: str) -> bool:
+        return name == DEFAULT_COLLECTION or self.knowledge_base_dir(name).is_dir()
+
+    def create(self, name: str) -> Path:
+        directory = self.knowledge_base_dir(self.validate(name))
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory
+
+    def names(self) -> List[str]:
+        names = {DEFAULT_COLLECTION}
+        if self.base_dir.is_dir():
+            names.update(
+                path.name for path in self.base_dir.iterdir()
+                if _NAME.match(path.name) and (path / 'files').is_dir()
+            )
+        return sorted(names)
+
+    def _open(self, name: str) -> RAGSystem:
+        if name == DEFAULT_COLLECTION:
+            storage = self.storage_factory(MO_TABLE, MEMORY_SNAPSHOT_DIR, MANIFEST_PATH)
+        else:
+            root = self.base_dir / name
+            storage = self.storage_factory(f"{MO_TABLE}_{name}", root / 'memory_snapshot', root / 'manifest.json')
+        directory = self.knowledge_base_dir(name)
+        directory.mkdir(parents=True, exist_ok=True)
+        return RAGSystem(
+            knowledge_base_dir=str(directory),
+            api_key=self.api_key,
+            storage=storage,
+            embedding_manager=self.embedding_manager,
+            llm_client=self.llm_client,
+            sync_knowledge_base=False
+        )
+
+    def _start_load(self, name: str) -> _Collection:
+        """Entry of ``name``, starting a background load if there is none; caller holds the lock"""
+        entry = self._loaded.get(name)
+        if entry is None or entry.state == 'failed':
+            entry = _Collection(name)
+            self._loaded[name] = entry
+            threading.Thread(target=self._load, args=(entry,), name=f"load-{name}", daemon=True).start()
+        self._loaded.move_to_end(name)
+        return entry
+
+    def _load(self, entry: _Collection):
+        print(f"Loading collection {entry.name}")
+        try:
+            rag = self._open(entry.name)
+        except Exception as e:
+            print(f"Failed to load collection {entry.name}: {e}")
+            with self._lock:
+                entry.state, entry.error = 'failed', str(e)
+            entry.loaded.set()
+            return
+
+        with self._lock:
+            entry.rag = rag
+            entry.loaded_at = time.time()
+            entry.state = 'syncing'
+            # Not evictable while its directory is being synced
+            entry.in_use += 1
+        entry.loaded.set()
+        metrics.observe('collection_load', entry.loaded_at - entry.started_at)
+        print(f"Collection {entry.name} serving after {entry.loaded_at - entry.started_at:.2f}s, "
+              f"syncing its knowledge base in the background")
+
+        error = None
+        try:
+            rag.load_knowledge_base(str(self.knowledge_base_dir(entry.name)))
+        except Exception as e:
+            print(f"Failed to sync knowledge base of collection {entry.name}: {e}")
+            error = str(e)
+        with self._lock:
+            entry.error = error
+            entry.synced_at = time.time()
+            entry.state = 'ready'
+        metrics.observe('collection_sync', entry.synced_at - entry.loaded_at)
+        print(f"Collection {entry.name} ready after {entry.synced_at - entry.started_at:.2f}s")
+        self._release(entry)
+
+    def warmup(self, name: Optional[str] = None) -> Dict:
+        """Start loading a collection in the background and return immediately"""
+        name = self.validate(name)
+        with self._lock:
+            return self._start_load(name).status()
+
+    def status(self, name: Optional[str] = None) -> Dict:
+        name = self.validate(name)
+        with self._lock:
+            entry = self._loaded.get(name)
+            return entry.status() if entry is not None else {'name': name, 'state': 'unloaded'}
+
+    def _acquire(self, name: str, wait: Optional[float]) -> _Collection:
+        with self._lock:
+            entry = self._start_load(name)
+            if entry.rag is not None:
+                entry.in_use += 1
+                return entry
+        entry.loaded.wait(wait)
+        with self._lock:
+            if entry.rag is None:
+                metrics.count('collection_unavailable')
+                raise CollectionUnavailable(name, entry.state, entry.error)
+            entry.in_use += 1
+        return entry
+
+    def _release(self, entry: _Collection):
+        with self._lock:
+            entry.in_use -= 1
+            entry.last_used = time.time()
+        self._evict()
+
+    @contextmanager
+    def use(self, name: Optional[str], create: bool = False, wait=_DEFAULT_WAIT) -> Iterator[RAGSystem]:
+        """Borrow the RAG system of a collection, loading it on first use
+
+        Waits up to ``wait`` seconds (default ``load_wait``, None for no limit)
+        for a collection that is still loading. A borrowed collection is never
+        evicted. Raises ValueError for an invalid name, KeyError for a missing
+        collection unless ``create``, and CollectionUnavailable when it is not
+        loaded in time.
+        """
+        name = self.validate(name)
+        if not self.exists(name):
+            if not create:
+                raise KeyError(name)
+            self.create(name)
+        entry = self._acquire(name, self.load_wait if wait is _DEFAULT_WAIT else wait)
+        try:
+            yield entry.rag
+        finally:
+            self._release(entry)
+
+    def _evict(self):
+        victims = []
+        with self._lock:
+            sizes = {
+                name: entry.rag.storage.memory_bytes() if entry.rag is not None else 0
+                for name, entry in self._loaded.items()
+            }
+            total = sum(sizes.values())
+            for name, entry in list(self._loaded.items()):
+                if total <= self.memory_budget:
+                    break
+                if entry.in_use or entry.rag is None or not entry.rag.storage.persistent:
+                    continue
+                del self._loaded[name]
+                total -= sizes[name]
+                victims.append((entry, sizes[name]))
+        for entry, size in victims:
+            print(f"Evicting idle collection {entry.name} (~{size / 2 ** 20:.0f} MB) to stay within "
+                  f"the {self.memory_budget / 2 ** 20:.0f} MB collection memory budget")
+            entry.rag.close()
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            loaded = dict(self._loaded)
+        collections = []
+        for name in self.names():
+            entry = loaded.get(name)
+            if entry is None:
+                collections.append({'name': name, 'state': 'unloaded'})
+                continue
+            info = entry.status()
+            if entry.rag is not None:
+                storage = entry.rag.storage
+                info.update({
+                    'chunks': len(storage.lexical_index) if storage.lexical_index is not None else None,
+                    'memory_mb': round(storage.memory_bytes() / 2 ** 20, 1),
+                    'in_use': entry.in_use,
+                    'last_used': entry.last_used
+                })
+            collections.append(info)
+        return collections
+
+    def close(self):
+        with self._lock:
+            entries = list(self._loaded.values())
+            self._loaded.clear()
+        for entry in entries:
+            if entry.rag is not None:
+                entry.rag.close()
+        if self.embedding_manager.cache is not None:
+            self.embedding_manager.cache.close()
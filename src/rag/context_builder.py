@@ -0,0 +1,133 @@
+# src/rag/context_builder.py
+
+from typing import Dict, List, Optional, Set
+
+from src.processors.chunker import estimate_tokens
+from config.config import (
+    CONTEXT_TOKEN_BUDGET, CONTEXT_DEDUP_THRESHOLD, CONTEXT_MMR_LAMBDA
+)
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    text = ''.join(text.split())
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextAssembler:
+    """Turn retrieved chunks into the context blocks placed in the prompt
+
+    Relevance is ``rerank_score`` when the candidates went through the
+    reranker and the retrieval ``score`` otherwise.
+
+    1. near-duplicates (character 3-gram Jaccard >= ``dedup_threshold``, e.g.
+       the same file uploaded twice as ``x.pdf`` and ``x_1.pdf``) are dropped,
+       keeping the best-scoring copy;
+    2. chunks are picked greedily by MMR (relevance vs. overlap with chunks
+       already picked) until ``token_budget`` or ``max_chunks`` is reached;
+    3. picked chunks that are adjacent in the same source are merged into one
+       block. Adjacency uses ``page_num``/``position`` metadata when present and
+       consecutive chunk ids otherwise, since chunks are stored in parse order.
+
+    With at most a few dozen candidates exact pairwise Jaccard is cheaper than
+    maintaining MinHash signatures.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD,
+        mmr_lambda: float = CONTEXT_MMR_LAMBDA
+    ):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self.mmr_lambda = mmr_lambda
+
+    @staticmethod
+    def _relevance(doc: Dict) -> float:
+        return doc.get('rerank_score', doc['score'])
+
+    def assemble(self, retrieved_docs: List[Dict], max_chunks: Optional[int] = None) -> List[Dict]:
+        if not retrieved_docs:
+            return []
+        candidates = self._deduplicate(sorted(retrieved_docs, key=self._relevance, reverse=True))
+        picked = self._select(candidates, max_chunks or len(candidates))
+        return self._merge_adjacent(picked)
+
+    def _deduplicate(self, docs: List[Dict]) -> List[Dict]:
+        kept = []
+        for doc in docs:
+            doc_shingles = shingles(doc['text'])
+            if any(jaccard(doc_shingles, other) >= self.dedup_threshold for _, other in kept):
+                continue
+            kept.append((doc, doc_shingles))
+        return [dict(doc, _shingles=doc_shingles) for doc, doc_shingles in kept]
+
+    def _select(self, candidates: List[Dict], max_chunks: int) -> List[Dict]:
+        picked = []
+        budget = self.token_budget
+        remaining = list(candidates)
+        while remaining and len(picked) < max_chunks:
+            def mmr(doc):
+                redundancy = max((jaccard(doc['_shingles'], p['_shingles']) for p in picked), default=0.0)
+                return self.mmr_lambda * self._relevance(doc) - (1 - self.mmr_lambda) * redundancy
+
+            best = max(remaining, key=mmr)
+            remaining.remove(best)
+            tokens = estimate_tokens(best['text'])
+            if tokens > budget:
+                # 超出预算的块跳过，继续尝试更短的候选
+                continue
+            budget -= tokens
+            picked.append(best)
+        return picked
+
+    @staticmethod
+    def _position(doc: Dict):
+        metadata = doc['metadata']
+        if metadata.get('position') is not None:
+            return (metadata.get('page_num') or 0, metadata['position'])
+        return (0, metadata.get('chunk_id'))
+
+    @classmethod
+    def _adjacent(cls, previous: Dict, current: Dict) -> bool:
+        (prev_page, prev_pos), (page, pos) = cls._position(previous), cls._position(current)
+        if not isinstance(prev_pos, int) or not isinstance(pos, int):
+            return False
+        return pos == prev_pos + 1 and page in (prev_page, prev_page + 1)
+
+    def _merge_adjacent(self, picked: List[Dict]) -> List[Dict]:
+        by_source: Dict[str, List[Dict]] = {}
+        for doc in picked:
+            by_source.setdefault(doc['metadata']['source'], []).append(doc)
+
+        blocks = []
+        for source_docs in by_source.values():
+            source_docs.sort(key=self._position)
+            run = [source_docs[0]]
+            for doc in source_docs[1:]:
+                if self._adjacent(run[-1], doc):
+                    run.append(doc)
+                else:
+                    blocks.append(self._combine(run))
+                    run = [doc]
+            blocks.append(self._combine(run))
+        blocks.sort(key=self._relevance, reverse=True)
+        return blocks
+
+    @staticmethod
+    def _combine(run: List[Dict]) -> Dict:
+        best = max(run, key=ContextAssembler._relevance)
+        block = {key: value for key, value in best.items() if key != '_shingles'}
+        block['metadata'] = dict(best['metadata'])
+        if len(run) > 1:
+            block['text'] = '\n'.join(doc['text'] for doc in run)
+            block['metadata']['chunk_ids'] = [doc['metadata'].get('chunk_id') for doc in run]
+        return block
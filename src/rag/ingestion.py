@@ -0,0 +1,242 @@
+# src/rag/ingestion.py
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import queue
+import threading
+import time
+
+from langchain.docstore.document import Document
+from config.config import INGEST_BATCH_SIZE, INGEST_QUEUE_SIZE
+from src.monitoring import metrics
+from src.storage.metadata import chunk_metadata
+
+_DONE = object()
+
+
+class StageStats:
+    """Item counts and busy time of one pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.batches = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'items': self.items,
+            'batches': self.batches,
+            'failed': self.failed,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'items_per_second': round(self.items / self.busy_seconds, 1) if self.busy_seconds else None
+        }
+
+
+class IngestionPipeline:
+    """Parse -> embed -> store pipeline with overlapping stages
+
+    每个阶段运行在独立线程中，阶段之间通过有界队列连接，
+    因此解析下一个文件、计算嵌入和写入存储可以同时进行。
+    """
+
+    def __init__(
+        self,
+        embedding_manager,
+        storage,
+        batch_size: int = INGEST_BATCH_SIZE,
+        queue_size: int = INGEST_QUEUE_SIZE
+    ):
+        self.embedding_manager = embedding_manager
+        self.storage = storage
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+    def _put(self, q: queue.Queue, item, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _parse_stage(self, files: Iterable[Tuple[str, List[Document]]], out_q: queue.Queue,
+                     stats: StageStats, stop: threading.Event, errors: list, done: threading.Event):
+        batch = []
+        try:
+            iterator = iter(files)
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    _, documents = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    stats.busy_seconds += time.perf_counter() - start
+                stats.batches += 1
+                stats.items += len(documents)
+
+                for doc in documents:
+                    batch.append(doc)
+                    if len(batch) >= self.batch_size:
+                        self._put(out_q, batch, stop)
+                        batch = []
+            if batch:
+                self._put(out_q, batch, stop)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            done.set()
+            self._put(out_q, _DONE, threading.Event())
+
+    def _embed_stage(self, in_q: queue.Queue, out_q: queue.Queue, stats: StageStats,
+                     stop: threading.Event, failed_files: set, done: threading.Event,
+                     throttle: Optional[Callable[[], None]]):
+        while True:
+            batch = in_q.get()
+            if batch is _DONE:
+                break
+            if stop.is_set():
+                continue
+            if throttle:
+                throttle()
+            start = time.perf_counter()
+            try:
+                embeddings = self.embedding_manager.compute_embeddings(
+                    [doc.page_content for doc in batch]
+                )
+            except Exception as e:
+                print(f"Failed to embed batch of {len(batch)} chunks: {e}")
+                stats.failed += len(batch)
+                failed_files.update(doc.metadata['source'] for doc in batch)
+                metrics.count('ingest_embed_failed_chunks', len(batch))
+                continue
+            finally:
+                elapsed = time.perf_counter() - start
+                stats.busy_seconds += elapsed
+                metrics.observe('ingest_embed_batch', elapsed)
+            stats.batches += 1
+            stats.items += len(batch)
+            self._put(out_q, (batch, embeddings), stop)
+        done.set()
+        self._put(out_q, _DONE, threading.Event())
+
+    def _store_stage(self, in_q: queue.Queue, stats: StageStats, failed_files: set,
+                     throttle: Optional[Callable[[], None]],
+                     report: Callable[[int], None]) -> int:
+        stored = 0
+        while True:
+            item = in_q.get()
+            if item is _DONE:
+                break
+            batch, embeddings = item
+            if throttle:
+                throttle()
+            start = time.perf_counter()
+            try:
+                stored += self.storage.store_documents([
+                    {
+                        'file_path': doc.metadata['source'],
+                        'chunk_content': doc.page_content,
+                        'embedding': embedding.tolist(),
+                        'metadata': chunk_metadata(doc.metadata)
+                    }
+                    for doc, embedding in zip(batch, embeddings)
+                ])
+            except Exception as e:
+                # 写入失败的文件不记入清单，下次同步时重新摄取
+                print(f"Failed to store batch of {len(batch)} chunks: {e}")
+                stats.failed += len(batch)
+                failed_files.update(doc.metadata['source'] for doc in batch)
+                metrics.count('ingest_store_failed_chunks', len(batch))
+                continue
+            finally:
+                elapsed = time.perf_counter() - start
+                stats.busy_seconds += elapsed
+                metrics.observe('ingest_store_batch', elapsed)
+            stats.batches += 1
+            stats.items += len(batch)
+            report(stored)
+        return stored
+
+    def run(
+        self,
+        files: Iterable[Tuple[str, List[Document]]],
+        progress: Optional[Callable[[Dict], None]] = None,
+        throttle: Optional[Callable[[], None]] = None
+    ) -> Dict:
+        """Ingest ``(file_path, documents)`` pairs and return per-stage statistics
+
+        ``progress`` is called after every stored batch with a snapshot of the
+        running counters; ``throttle`` is called before every embed and store
+        batch and may block to yield resources to interactive traffic.
+        """
+        parse_stats = StageStats('parse')
+        embed_stats = StageStats('embed')
+        store_stats = StageStats('store')
+        parse_q = queue.Queue(maxsize=self.queue_size)
+        store_q = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+        failed_files = set()
+        parse_done = threading.Event()
+        embed_done = threading.Event()
+
+        def report(stored: int):
+            if progress is None:
+                return
+            if not parse_done.is_set():
+                stage = 'parsing'
+            elif not embed_done.is_set():
+                stage = 'embedding'
+            else:
+                stage = 'storing'
+            progress({
+                'stage': stage,
+                'files': parse_stats.batches,
+                'chunks': parse_stats.items,
+                'embedded': embed_stats.items,
+                'stored': stored,
+                'elapsed_seconds': round(time.perf_counter() - wall_start, 3)
+            })
+
+        wall_start = time.perf_counter()
+        workers = [
+            threading.Thread(target=self._parse_stage,
+                             args=(files, parse_q, parse_stats, stop, errors, parse_done), daemon=True),
+            threading.Thread(target=self._embed_stage,
+                             args=(parse_q, store_q, embed_stats, stop, failed_files, embed_done, throttle),
+                             daemon=True)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            stored = self._store_stage(store_q, store_stats, failed_files, throttle, report)
+        except Exception:
+            stop.set()
+            # 排空队列，让上游线程能够放入结束标记并退出
+            while store_q.get() is not _DONE:
+                pass
+            raise
+        finally:
+            for worker in workers:
+                worker.join()
+        if errors:
+            raise errors[0]
+
+        wall_seconds = time.perf_counter() - wall_start
+        metrics.observe('ingest_total', wall_seconds)
+        metrics.count('ingested_chunks', stored)
+        return {
+            'files': parse_stats.batches,
+            'chunks': parse_stats.items,
+            'stored': stored,
+            'failed_files': sorted(failed_files),
+            'wall_seconds': round(wall_seconds, 3),
+            'chunks_per_second': round(parse_stats.items / wall_seconds, 1) if wall_seconds else None,
+            'stages': {
+                stats.name: stats.to_dict()
+                for stats in (parse_stats, embed_stats, store_stats)
+            }
+        }
@@ -0,0 +1,251 @@
+# src/rag/job_queue.py
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+from src.processors.manifest import file_hash
+from config.config import DEFAULT_COLLECTION
+
+
+class PriorityGate:
+    """Lets background ingestion yield to interactive requests
+
+    聊天请求在 interactive() 中执行；摄取任务在每个批次前调用 wait_idle()，
+    有聊天请求进行时最多等待 max_wait 秒，避免后台任务被无限期饿死。
+    """
+
+    def __init__(self, max_wait: float = 5.0):
+        self.max_wait = max_wait
+        self._active = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def interactive(self):
+        with self._cond:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                if not self._active:
+                    self._cond.notify_all()
+
+    def wait_idle(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._active == 0, timeout=self.max_wait)
+
+
+class JobQueue:
+    """Background ingestion jobs with a persistent SQLite job table
+
+    上传接口提交任务后立即返回任务ID，由有界的工作线程池执行解析、嵌入和写入。
+    进程重启后，未完成的任务会被重新排队。同一集合内内容相同的上传会合并到已有任务。
+    """
+
+    ACTIVE_STATUSES = ('queued', 'running', 'completed')
+
+    def __init__(self, collections, db_path: Optional[Path] = None, workers: int = 1,
+                 gate: Optional[PriorityGate] = None):
+        # CollectionManager；任务执行时按任务所属集合借用对应的 RAG 系统
+        self.collections = collections
+        self.gate = gate or PriorityGate()
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._progress: Dict[str, Dict] = {}
+
+        if db_path is not None:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path) if db_path else ':memory:', check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(f"""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                file_hash TEXT,
+                collection TEXT NOT NULL DEFAULT '{DEFAULT_COLLECTION}',
+                status TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                stats TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # 旧版本的任务表没有集合列，原有任务都属于默认集合
+        columns = {row['name'] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if 'collection' not in columns:
+            self._db.execute(
+                f"ALTER TABLE jobs ADD COLUMN collection TEXT NOT NULL DEFAULT '{DEFAULT_COLLECTION}'"
+            )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_hash ON jobs(file_hash)")
+        self._db.commit()
+
+        # 重启后恢复未完成的任务
+        self._execute("UPDATE jobs SET status = 'queued', stage = 'queued' WHERE status = 'running'")
+        for row in self._query("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at"):
+            self._queue.put(row['id'])
+
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"ingest-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock:
+            self._db.execute(sql, params)
+            self._db.commit()
+
+    def _query(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _update(self, job_id: str, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{key} = ?" for key in fields)
+        self._execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def submit(self, file_path: str, collection: str = DEFAULT_COLLECTION) -> Tuple[Dict, bool]:
+        """Queue ``file_path`` for ingestion into ``collection``; returns ``(job, coalesced)``
+
+        coalesced 为 True 时表示同一集合中已有内容相同的文件在排队、处理中或已完成，
+        返回的是已有任务，调用方可以丢弃新上传的副本。
+        """
+        content_hash = file_hash(file_path)
+        # 查重与插入在同一把锁内完成，并发上传的相同文件只会生成一个任务
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM jobs WHERE file_hash = ? AND collection = ? AND status IN "
+                f"({', '.join('?' * len(self.ACTIVE_STATUSES))}) ORDER BY created_at DESC",
+                (content_hash, collection, *self.ACTIVE_STATUSES)
+            ).fetchall()
+            for row in rows:
+                if row['file_path'] != str(file_path) and os.path.exists(row['file_path']):
+                    return self._to_dict(row), True
+
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            self._db.execute(
+                "INSERT INTO jobs (id, file_path, file_hash, collection, status, stage, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', 'queued', ?, ?)",
+                (job_id, str(file_path), content_hash, collection, now, now)
+            )
+            self._db.commit()
+        self._queue.put(job_id)
+        return self.get(job_id), False
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._to_dict(rows[0]) if rows else None
+
+    def _to_dict(self, row) -> Dict:
+        job = {
+            'id': row['id'],
+            'file_path': row['file_path'],
+            'filename': os.path.basename(row['file_path']),
+            'collection': row['collection'],
+            'status': row['status'],
+            'stage': row['stage'],
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        }
+        stats = json.loads(row['stats']) if row['stats'] else {}
+        # 运行中的任务使用内存中的实时进度
+        stats = self._progress.get(row['id'], stats)
+        job.update({
+            'files': stats.get('files', 0),
+            'chunks': stats.get('chunks', 0),
+            'embedded': stats.get('embedded', 0),
+            'stored': stats.get('stored', 0),
+            'elapsed_seconds': stats.get('elapsed_seconds'),
+            'chunks_per_second': stats.get('chunks_per_second')
+        })
+        if row['status'] == 'running' and stats.get('elapsed_seconds'):
+            job['chunks_per_second'] = round(stats.get('embedded', 0) / stats['elapsed_seconds'], 1)
+        return job
+
+    def _worker(self):
+        self._lower_priority()
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                break
+            try:
+                self._run(job_id)
+            except Exception as e:
+                print(f"Ingestion job {job_id} crashed: {e}")
+
+    @staticmethod
+    def _lower_priority():
+        """Best effort: raise the nice value of this worker thread (Linux only)"""
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+
+    def _run(self, job_id: str):
+        job = self.get(job_id)
+        if job is None or job['status'] != 'queued':
+            return
+        if not os.path.exists(job['file_path']):
+            self._update(job_id, status='failed', stage='done', error='文件不存在')
+            return
+
+        self._update(job_id, status='running', stage='parsing')
+
+        def progress(snapshot: Dict):
+            self._progress[job_id] = snapshot
+
+        try:
+            # 摄取任务一直等到集合加载完成
+            with self.collections.use(job['collection'], create=True, wait=None) as rag:
+                stats = rag.index_files(
+                    [job['file_path']],
+                    progress=progress,
+                    throttle=self.gate.wait_idle
+                )
+        except Exception as e:
+            self._progress.pop(job_id, None)
+            self._update(job_id, status='failed', stage='done', error=str(e))
+            return
+
+        self._progress.pop(job_id, None)
+        summary = {
+            'files': stats['files'],
+            'chunks': stats['chunks'],
+            'embedded': stats['stages']['embed']['items'],
+            'stored': stats['stored'],
+            'elapsed_seconds': stats['wall_seconds'],
+            'chunks_per_second': stats['chunks_per_second'],
+            'stages': stats['stages']
+        }
+        if stats['parse_failures'] or stats['failed_files'] or not stats['chunks']:
+            if stats['parse_failures']:
+                error = f"文件解析失败: {next(iter(stats['parse_failures'].values()))}"
+            elif stats['failed_files']:
+                error = '部分文档块嵌入或写入失败'
+            else:
+                error = '未能从文件中解析出内容'
+            self._update(job_id, status='failed', stage='done', error=error,
+                         stats=json.dumps(summary))
+        else:
+            self._update(job_id, status='completed', stage='done', stats=json.dumps(summary))
+
+    def shutdown(self):
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        with self._lock:
+            self._db.close()
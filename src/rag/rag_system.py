@@ -1,15 +1,45 @@
 # src/rag/rag_system.py
 
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import os
 
 from src.processors.document_processor import DocumentProcessor
 from src.embeddings.embedding_manager import EmbeddingManager
+from src.embeddings.embedding_cache import EmbeddingCache
 from src.llm.llm_client import LLMClient
 from src.storage.mo_manager import MOManager
 from src.storage.base_storage import BaseStorage, MemoryStorage
-from config.config import EMBEDDING_MODEL_NAME
+from src.rag.ingestion import IngestionPipeline
+from src.rag.answer_cache import AnswerCache
+from src.rag.context_builder import ContextAssembler
+from src.rag.reranker import Reranker
+from src.processors.chunker import estimate_tokens
+from src.processors.manifest import FileManifest
+from src.monitoring import metrics
+from config.config import (
+    EMBEDDING_MODEL_NAME, KNOWLEDGE_BASE_DIR, MANIFEST_PATH, MO_TABLE, MEMORY_SNAPSHOT_DIR, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_ITEMS, EMBEDDING_CACHE_DISK_ITEMS,
+    ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_TIME_SENSITIVE_TTL,
+    ANSWER_CACHE_TIME_KEYWORDS, ANSWER_CACHE_SIZE, RETRIEVAL_MODE, HYBRID_CANDIDATES, HYBRID_THRESHOLD_BYPASS_RANK, RRF_K,
+    CONTEXT_OVERFETCH, BATCH_LLM_CONCURRENCY, RERANK_ENABLED, RERANK_CANDIDATES
+)
+
+def create_storage(
+    table: str = MO_TABLE,
+    snapshot_dir: Optional[Path] = MEMORY_SNAPSHOT_DIR,
+    manifest_path: Optional[Path] = MANIFEST_PATH
+) -> BaseStorage:
+    """Try to initialize MatrixOne storage, fallback to memory storage if failed"""
+    try:
+        storage = MOManager(table=table, manifest_path=manifest_path)
+        print(f"INFO: Using MatrixOne table {table} for vector storage")
+        return storage
+    except Exception as e:
+        print(f"WARNING: Failed to initialize MatrixOne storage, falling back to memory storage: {e}")
+        return MemoryStorage(snapshot_dir=snapshot_dir)
+
 
 class RAGSystem:
     """检索增强生成系统 - 支持存储降级"""
@@ -18,64 +48,334 @@ class RAGSystem:
         self,
         knowledge_base_dir: str,
         api_key: str,
-        embedding_model_name: str = EMBEDDING_MODEL_NAME
+        embedding_model_name: str = EMBEDDING_MODEL_NAME,
+        storage: Optional[BaseStorage] = None,
+        embedding_manager: Optional[EmbeddingManager] = None,
+        llm_client: Optional[LLMClient] = None,
+        sync_knowledge_base: bool = True
     ):
-        self.doc_processor = DocumentProcessor()
-        self.embedding_manager = EmbeddingManager(embedding_model_name)
-        self.llm_client = LLMClient(api_key)
-        
-        # Try to initialize MatrixOne storage, fallback to memory storage if failed
-        try:
-            self.storage = MOManager()
-            print("INFO: Using MatrixOne for vector storage")
-        except Exception as e:
-            print(f"WARNING: Failed to initialize MatrixOne storage, falling back to memory storage: {e}")
-            self.storage = MemoryStorage()
+        self.doc_processor = DocumentProcessor(root_dir=knowledge_base_dir or KNOWLEDGE_BASE_DIR)
+        # 多个知识库集合共用同一个嵌入客户端（含嵌入缓存）和LLM客户端
+        self.embedding_manager = embedding_manager or EmbeddingManager(
+            embedding_model_name,
+            cache=EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_ITEMS, EMBEDDING_CACHE_DISK_ITEMS)
+        )
+        self.llm_client = llm_client or LLMClient(api_key)
+        self.storage = storage if storage is not None else create_storage()
+
+        self.ingestion_pipeline = IngestionPipeline(self.embedding_manager, self.storage)
+        self.answer_cache = AnswerCache(
+            threshold=ANSWER_CACHE_THRESHOLD,
+            ttl=ANSWER_CACHE_TTL,
+            time_sensitive_ttl=ANSWER_CACHE_TIME_SENSITIVE_TTL,
+            time_keywords=ANSWER_CACHE_TIME_KEYWORDS,
+            max_entries=ANSWER_CACHE_SIZE
+        )
+        self.context_assembler = ContextAssembler()
+        self.reranker = Reranker() if RERANK_ENABLED else None
+        # The manifest is only trusted across restarts when the storage itself persists,
+        # so each persistent backend keeps its own manifest file
+        self.manifest = FileManifest(self.storage.manifest_path if self.storage.persistent else None)
         
-        if knowledge_base_dir:
+        # sync_knowledge_base=False 时由调用方在后台调用 load_knowledge_base
+        if knowledge_base_dir and sync_knowledge_base:
             self.load_knowledge_base(knowledge_base_dir)
 
-    def load_knowledge_base(self, directory: str):
-        documents = self.doc_processor.process_documents(directory)
+    def load_knowledge_base(self, directory: str) -> Dict:
+        """Incrementally index ``directory``: only new or changed files are processed"""
+        plan = self.manifest.plan(self.doc_processor.list_files(directory), directory)
+
+        # Changed and removed files: drop their stale chunks and the answers built on them
+        self.answer_cache.invalidate_sources(plan['changed'] + plan['removed'])
+        for file_path in plan['changed'] + plan['removed']:
+            if self.storage.delete_document(file_path):
+                self.manifest.remove(file_path)
+
+        to_index = plan['new'] + plan['changed']
+        if not to_index:
+            if plan['removed']:
+                self.manifest.save()
+            print(f"Knowledge base is up to date ({len(plan['unchanged'])} files unchanged, "
+                  f"{len(plan['removed'])} removed)")
+            return {'files': 0, 'chunks': 0, 'stored': 0, 'plan': plan}
+
+        print(f"Indexing {len(plan['new'])} new and {len(plan['changed'])} changed files, "
+              f"{len(plan['unchanged'])} unchanged")
+        stats = self.index_files(to_index)
+        stats['plan'] = plan
+        return stats
+
+    def index_files(
+        self,
+        file_paths: List[str],
+        progress: Optional[Callable[[Dict], None]] = None,
+        throttle: Optional[Callable[[], None]] = None
+    ) -> Dict:
+        """Parse, embed and store the given files and record them in the manifest"""
+        parsed, parse_failures = {}, {}
+        # Taken before parsing so the manifest describes the version that was indexed
+        snapshots = {str(file_path): self.manifest.snapshot(file_path) for file_path in file_paths}
+
+        def record(files):
+            for file_path, documents in files:
+                parsed[file_path] = len(documents)
+                yield file_path, documents
+
+        stats = self.ingestion_pipeline.run(
+            record(self.doc_processor.iter_files(file_paths, parse_failures)),
+            progress=progress,
+            throttle=throttle
+        )
+        self.answer_cache.invalidate_sources(file_paths)
+        stats['parse_failures'] = parse_failures
+
+        # Files that failed to parse, embed or store stay out of the manifest and are retried next time;
+        # files that parsed to zero chunks (images, empty files) are recorded so they are not re-parsed
+        failed = set(stats['failed_files']) | set(parse_failures)
+        for file_path, chunks in parsed.items():
+            if file_path not in failed and snapshots.get(file_path):
+                self.manifest.mark_indexed(file_path, chunks, snapshots[file_path])
+        self.manifest.save()
         
-        if documents:
-            print(f"Processing {len(documents)} document chunks...")
-            for doc in documents:
-                embedding = self.embedding_manager.compute_embeddings([doc.page_content])[0]
-                
-                stored = self.storage.store_document(
-                    file_path=doc.metadata['source'],
-                    chunk_content=doc.page_content,
-                    embedding=embedding.tolist()
-                )
-                if stored:
-                    print(f"Stored new document chunk from: {doc.metadata['source']}")
+        if stats['chunks']:
+            print(f"Processed {stats['chunks']} document chunks from {stats['files']} files, "
+                  f"stored {stats['stored']} new chunks in {stats['wall_seconds']}s")
+            for name, stage in stats['stages'].items():
+                print(f"  {name}: {stage['items']} items, {stage['items_per_second']} items/s")
         else:
             print("Warning: No documents loaded")
+        if parse_failures:
+            print(f"Warning: {len(parse_failures)} files failed to parse and will be retried on the next sync")
+        return stats
+
+    def _embed_query(self, query: str):
+        with metrics.timer('embed_query'):
+            return self.embedding_manager.compute_embeddings([query])[0]
+
+    def _retrieve_context(self, query: str, query_embedding, top_k: int,
+                          filters: Optional[Dict] = None) -> List[Dict]:
+        """Over-fetch and rerank, then dedupe, MMR-select and merge chunks into prompt context blocks"""
+        retrieved_docs = self._retrieve(query, query_embedding, top_k * CONTEXT_OVERFETCH, 0.5, filters)
+        return self._assemble_context(retrieved_docs, top_k)
+
+    def _candidates(self, top_k: int) -> int:
+        """How many chunks to fetch from storage for a final ``top_k``"""
+        return max(top_k, RERANK_CANDIDATES) if self.reranker else top_k
+
+    def _rerank(self, query: str, docs: List[Dict], top_k: int) -> List[Dict]:
+        if self.reranker is None:
+            return docs[:top_k]
+        with metrics.timer('rerank'):
+            return self.reranker.rerank(query, docs, top_k, self.storage.get_chunk_metadata,
+                                       self.storage.lexical_index)
 
-    def retrieve(self, query: str, top_k: int = 5, threshold: float = 0.5) -> List[Dict]:
-        query_embedding = self.embedding_manager.compute_embeddings([query])[0]
-        results = self.storage.retrieve_similar(query_embedding.tolist(), top_k)
-        # 过滤低于阈值的结果
-        filtered_results = [doc for doc in results if doc['score'] >= threshold]
-        return filtered_results
+    def _retrieve(self, query: str, query_embedding, top_k: int, threshold: float,
+                  filters: Optional[Dict] = None) -> List[Dict]:
+        """Fetch ``_candidates(top_k)`` chunks and keep the ``top_k`` best after reranking"""
+        docs = self._search(query, query_embedding, self._candidates(top_k), threshold, filters)
+        return self._rerank(query, docs, top_k)
+
+    def _assemble_context(self, retrieved_docs: List[Dict], top_k: int) -> List[Dict]:
+        with metrics.timer('assemble_context'):
+            context_docs = self.context_assembler.assemble(retrieved_docs, max_chunks=top_k)
+        metrics.count('context_tokens_retrieved', sum(estimate_tokens(doc['text']) for doc in retrieved_docs))
+        metrics.count('context_tokens_used', sum(estimate_tokens(doc['text']) for doc in context_docs))
+        return context_docs
+
+    def _format_prompt(self, query: str, retrieved_docs: List[Dict]) -> str:
+        with metrics.timer('format_prompt'):
+            return self.llm_client.format_prompt(query, retrieved_docs)
+
+    def _search(self, query: str, query_embedding, top_k: int, threshold: float,
+                filters: Optional[Dict] = None) -> List[Dict]:
+        """``filters`` restricts retrieval by source, file type, date range or tags,
+        see ``src.storage.metadata.MetadataFilter``"""
+        with metrics.timer('retrieve'):
+            if RETRIEVAL_MODE == 'hybrid':
+                results = self.storage.retrieve_hybrid(
+                    query, query_embedding.tolist(), top_k,
+                    n_candidates=HYBRID_CANDIDATES, rrf_k=RRF_K, filters=filters
+                )
+            else:
+                results = self.storage.retrieve_similar(query_embedding.tolist(), top_k, filters)
+        return self._apply_threshold(results, threshold)
+
+    @staticmethod
+    def _apply_threshold(results: List[Dict], threshold: float) -> List[Dict]:
+        # 过滤低于阈值的结果；BM25排名靠前的关键词强命中不受向量相似度阈值限制
+        return [
+            doc for doc in results
+            if doc['score'] >= threshold
+            or (doc.get('lexical_rank') is not None and doc['lexical_rank'] < HYBRID_THRESHOLD_BYPASS_RANK)
+        ]
+
+    def _search_batch(self, queries: List[str], query_embeddings, top_k: int, threshold: float,
+                      filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """``_search`` for many queries with one batched pass over the storage"""
+        with metrics.timer('retrieve_batch'):
+            if RETRIEVAL_MODE == 'hybrid':
+                results = self.storage.retrieve_hybrid_batch(
+                    queries, query_embeddings.tolist(), top_k,
+                    n_candidates=HYBRID_CANDIDATES, rrf_k=RRF_K, filters=filters
+                )
+            else:
+                results = self.storage.retrieve_similar_batch(query_embeddings.tolist(), top_k, filters)
+        return [self._apply_threshold(docs, threshold) for docs in results]
+
+    def _embed_queries(self, queries: List[str]):
+        with metrics.timer('embed_query_batch'):
+            return self.embedding_manager.compute_embeddings(list(queries))
+
+    def retrieve(self, query: str, top_k: int = 5, threshold: float = 0.5,
+                 filters: Optional[Dict] = None) -> List[Dict]:
+        query_embedding = self._embed_query(query)
+        return self._retrieve(query, query_embedding, top_k, threshold, filters)
+
+    def retrieve_batch(self, queries: List[str], top_k: int = 5, threshold: float = 0.5,
+                       filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """Retrieve for many queries: one batched embedding call and one storage pass"""
+        if not queries:
+            return []
+        query_embeddings = self._embed_queries(queries)
+        retrieved = self._search_batch(queries, query_embeddings, self._candidates(top_k), threshold, filters)
+        return [self._rerank(query, docs, top_k) for query, docs in zip(queries, retrieved)]
+
+    def _cached_answer(self, query: str, query_embedding, retrieved_docs: List[Dict]) -> Optional[Dict]:
+        cached = self.answer_cache.lookup(query_embedding, retrieved_docs)
+        if cached is None:
+            metrics.count('answer_cache_miss')
+            return None
+        metrics.count('answer_cache_hit')
+        return dict(cached, query=query, retrieved_documents=retrieved_docs, cached=True)
+
+    def _cache_answer(self, query: str, query_embedding, retrieved_docs: List[Dict], result: Dict):
+        if result['answer']:
+            self.answer_cache.store(query, query_embedding, retrieved_docs, result)
 
     def answer_question(
         self,
         query: str,
         top_k: int = 5,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        filters: Optional[Dict] = None
     ) -> Dict:
-        retrieved_docs = self.retrieve(query, top_k=top_k)
-        prompt = self.llm_client.format_prompt(query, retrieved_docs)
+        query_embedding = self._embed_query(query)
+        retrieved_docs = self._retrieve_context(query, query_embedding, top_k, filters)
+        cached = self._cached_answer(query, query_embedding, retrieved_docs)
+        if cached:
+            return cached
+
+        prompt = self._format_prompt(query, retrieved_docs)
         answer = self.llm_client.generate_response(prompt, max_tokens=max_tokens)
         
-        return {
+        result = {
             'query': query,
             'answer': answer,
             'retrieved_documents': retrieved_docs,
             'prompt': prompt
         }
+        self._cache_answer(query, query_embedding, retrieved_docs, result)
+        return result
+
+    def answer_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        max_tokens: int = 1000,
+        filters: Optional[Dict] = None,
+        concurrency: int = BATCH_LLM_CONCURRENCY
+    ) -> List[Dict]:
+        """Answer many questions, e.g. for evaluation or cache pre-warming
+
+        Embedding and retrieval run once for the whole batch; LLM calls run on
+        at most ``concurrency`` threads, and identical questions are generated
+        once. Results are in the order of ``queries``; a failed generation
+        gives ``answer`` None for that question only.
+        """
+        if not queries:
+            return []
+        query_embeddings = self._embed_queries(queries)
+        n_context = top_k * CONTEXT_OVERFETCH
+        retrieved = self._search_batch(queries, query_embeddings, self._candidates(n_context), 0.5, filters)
+
+        results: List[Optional[Dict]] = [None] * len(queries)
+        pending: Dict[str, List[int]] = {}
+        contexts = []
+        for i, (query, query_embedding, docs) in enumerate(zip(queries, query_embeddings, retrieved)):
+            context_docs = self._assemble_context(self._rerank(query, docs, n_context), top_k)
+            contexts.append(context_docs)
+            cached = self._cached_answer(query, query_embedding, context_docs)
+            if cached:
+                results[i] = cached
+            else:
+                pending.setdefault(query, []).append(i)
+
+        def generate(query: str) -> Dict:
+            first = pending[query][0]
+            prompt = self._format_prompt(query, contexts[first])
+            return {
+                'query': query,
+                'answer': self.llm_client.generate_response(prompt, max_tokens=max_tokens),
+                'retrieved_documents': contexts[first],
+                'prompt': prompt
+            }
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(pending))),
+                                    thread_name_prefix='rag-batch') as executor:
+                # 复制上下文，使生成阶段的耗时记录到当前trace
+                futures = {
+                    query: executor.submit(contextvars.copy_context().run, generate, query)
+                    for query in pending
+                }
+                for query, future in futures.items():
+                    result = future.result()
+                    first = pending[query][0]
+                    self._cache_answer(query, query_embeddings[first], contexts[first], result)
+                    for i in pending[query]:
+                        results[i] = dict(result)
+        metrics.count('batch_queries', len(queries))
+        return results
+
+    def answer_question_stream(
+        self,
+        query: str,
+        top_k: int = 5,
+        max_tokens: int = 1000,
+        filters: Optional[Dict] = None
+    ) -> Iterator[Dict]:
+        """Stream an answer as events: first the retrieved sources, then answer tokens"""
+        query_embedding = self._embed_query(query)
+        retrieved_docs = self._retrieve_context(query, query_embedding, top_k, filters)
+        yield {'type': 'sources', 'retrieved_documents': retrieved_docs}
+
+        cached = self._cached_answer(query, query_embedding, retrieved_docs)
+        if cached:
+            yield {'type': 'token', 'content': cached['answer']}
+            yield {'type': 'done'}
+            return
+
+        prompt = self._format_prompt(query, retrieved_docs)
+        deltas = []
+        try:
+            for delta in self.llm_client.generate_stream(prompt, max_tokens=max_tokens):
+                deltas.append(delta)
+                yield {'type': 'token', 'content': delta}
+        except Exception as e:
+            print(f"LLM streaming failed: {e}")
+            yield {'type': 'error', 'error': str(e)}
+            return
+        self._cache_answer(query, query_embedding, retrieved_docs, {
+            'query': query,
+            'answer': ''.join(deltas),
+            'retrieved_documents': retrieved_docs,
+            'prompt': prompt
+        })
+        yield {'type': 'done'}
+
+    def close(self):
+        """Release the storage connections, e.g. when a collection is evicted"""
+        self.storage.close()
 
     def __del__(self):
         """确保正确关闭数据库连接"""
@@ -89,6 +389,9 @@ class RAGSystem:
             storage_deleted = self.storage.delete_document(file_path)
             if not storage_deleted:
                 raise Exception("Failed to delete from storage")
+            self.answer_cache.invalidate_sources([file_path])
+            self.manifest.remove(file_path)
+            self.manifest.save()
 
             # 2. Delete physical file
             if os.path.exists(file_path):
@@ -0,0 +1,161 @@
+# src/rag/reranker.py
+
+from datetime import datetime
+from fnmatch import fnmatch
+from typing import Callable, Dict, List, Optional
+import os
+import time
+
+from src.monitoring import metrics
+from src.storage.lexical_index import LexicalIndex, tokenize
+from src.storage.metadata import DATE_FORMAT
+from config.config import (
+    RERANK_WEIGHTS, RERANK_RECENCY_HALF_LIFE_DAYS, RERANK_SOURCE_PRIORS,
+    RERANK_SCORE_BUDGET_MS, RERANK_METADATA_BUDGET_MS
+)
+
+
+class Reranker:
+    """Re-score over-fetched candidates with cheap CPU-only features
+
+    ``rerank_score = score + lexical * coverage of the query terms by the chunk
+    + title * coverage by its heading (the chunk itself when it is a title)
+    + recency * 0.5 ** (age_days / half_life) + prior of the first source glob that matches``
+
+    Each stage has a latency budget so reranking never dominates query time:
+
+    - the metadata lookup (heading, is_title, doc_date) is skipped while its
+      moving-average latency is over budget, and re-probed every
+      ``probe_every`` queries;
+    - the number of candidates scored is capped from the measured per-candidate
+      cost; candidates past the cap or the deadline keep their retrieval order
+      behind the reranked ones, scored by ``score`` alone.
+    """
+
+    def __init__(
+        self,
+        weights: Dict[str, float] = RERANK_WEIGHTS,
+        source_priors: Dict[str, float] = RERANK_SOURCE_PRIORS,
+        recency_half_life_days: float = RERANK_RECENCY_HALF_LIFE_DAYS,
+        score_budget_ms: float = RERANK_SCORE_BUDGET_MS,
+        metadata_budget_ms: float = RERANK_METADATA_BUDGET_MS,
+        probe_every: int = 100
+    ):
+        self.weights = dict(weights)
+        self.source_priors = dict(source_priors)
+        self.recency_half_life_days = recency_half_life_days
+        self.score_budget = score_budget_ms / 1000
+        self.metadata_budget = metadata_budget_ms / 1000
+        self.probe_every = probe_every
+        # Moving averages of the measured stage costs (seconds); races between
+        # threads only lose an update
+        self._seconds_per_candidate = 0.0
+        self._metadata_seconds = 0.0
+        self._metadata_skipped = 0
+
+    @staticmethod
+    def _average(previous: float, value: float, alpha: float = 0.2) -> float:
+        return value if previous == 0.0 else (1 - alpha) * previous + alpha * value
+
+    def _affordable(self, n: int) -> int:
+        if self._seconds_per_candidate <= 0.0:
+            return n
+        return max(1, min(n, int(self.score_budget / self._seconds_per_candidate)))
+
+    def _lookup_metadata(self, lookup: Optional[Callable[[List], Dict]], docs: List[Dict]) -> Dict:
+        if lookup is None or not docs:
+            return {}
+        if self._metadata_seconds > self.metadata_budget:
+            self._metadata_skipped += 1
+            if self._metadata_skipped % self.probe_every:
+                metrics.count('rerank_metadata_skipped')
+                return {}
+        start = time.perf_counter()
+        try:
+            return lookup([doc['metadata']['chunk_id'] for doc in docs])
+        finally:
+            elapsed = time.perf_counter() - start
+            self._metadata_seconds = self._average(self._metadata_seconds, elapsed)
+            metrics.observe('rerank_metadata', elapsed)
+
+    def _source_prior(self, source: str) -> float:
+        name = os.path.basename(source)
+        for pattern, prior in self.source_priors.items():
+            if fnmatch(source, pattern) or fnmatch(name, pattern):
+                return prior
+        return 0.0
+
+    def _recency(self, doc_date: Optional[str], now: datetime) -> float:
+        if not doc_date or not self.recency_half_life_days:
+            return 0.0
+        try:
+            age_days = (now - datetime.strptime(doc_date, DATE_FORMAT)).total_seconds() / 86400
+        except ValueError:
+            return 0.0
+        return 0.5 ** (max(age_days, 0.0) / self.recency_half_life_days)
+
+    @staticmethod
+    def _coverage(query_terms: set, text: Optional[str]) -> float:
+        if not query_terms or not text:
+            return 0.0
+        return len(query_terms.intersection(tokenize(text))) / len(query_terms)
+
+    def rerank(self, query: str, docs: List[Dict], top_k: int,
+               metadata_lookup: Optional[Callable[[List], Dict]] = None,
+               lexical_index: Optional[LexicalIndex] = None) -> List[Dict]:
+        """Best ``top_k`` of ``docs`` (in retrieval order) by ``rerank_score``
+
+        ``metadata_lookup`` maps chunk ids to their persisted metadata, see
+        ``BaseStorage.get_chunk_metadata``; without it only lexical overlap
+        and source priors apply. With ``lexical_index`` the overlap is read from
+        the BM25 term counts instead of tokenizing every candidate.
+        """
+        if not docs:
+            return []
+        limit = self._affordable(len(docs))
+        head = docs[:limit]
+        metadata = self._lookup_metadata(metadata_lookup, head)
+
+        start = time.perf_counter()
+        deadline = start + self.score_budget
+        query_terms = set(tokenize(query))
+        indexed = lexical_index.coverage(query_terms, [doc['metadata']['chunk_id'] for doc in head]) \
+            if lexical_index is not None else {}
+        now = datetime.now()
+        # Headings, dates and sources repeat across the chunks of a file
+        headings, dates, priors = {}, {}, {}
+        weights = self.weights
+        scored = []
+        for doc in head:
+            chunk_id, source = doc['metadata']['chunk_id'], doc['metadata']['source']
+            chunk_metadata = metadata.get(chunk_id) or {}
+            lexical = indexed[chunk_id] if chunk_id in indexed else self._coverage(query_terms, doc['text'])
+            heading, doc_date = chunk_metadata.get('heading'), chunk_metadata.get('doc_date')
+            if heading:
+                if heading not in headings:
+                    headings[heading] = self._coverage(query_terms, heading)
+                title = headings[heading]
+            else:
+                title = lexical if chunk_metadata.get('is_title') else 0.0
+            if doc_date not in dates:
+                dates[doc_date] = self._recency(doc_date, now)
+            if source not in priors:
+                priors[source] = self._source_prior(source)
+            rerank_score = (
+                doc['score']
+                + weights.get('lexical', 0.0) * lexical
+                + weights.get('title', 0.0) * title
+                + weights.get('recency', 0.0) * dates[doc_date]
+                + priors[source]
+            )
+            scored.append(dict(doc, rerank_score=rerank_score))
+            if time.perf_counter() > deadline:
+                break
+        elapsed = time.perf_counter() - start
+        self._seconds_per_candidate = self._average(self._seconds_per_candidate, elapsed / len(scored))
+        if len(scored) < len(docs):
+            metrics.count('rerank_truncated', len(docs) - len(scored))
+
+        scored.sort(key=lambda doc: doc['rerank_score'], reverse=True)
+        rest = [dict(doc, rerank_score=doc['score']) for doc in docs[len(scored):top_k]]
+        return (scored + rest)[:top_k]
@@ -1,20 +1,58 @@
 # src/storage/base_storage.py
 
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from pathlib import Path
+from typing import List, Dict, Optional
+import threading
+import time
 import numpy as np
+from .vector_index import VectorIndex
+from .lexical_index import LexicalIndex
+from .snapshot import SnapshotStore
+from .metadata import MetadataFilter, MetadataIndex, content_hash
 
 class BaseStorage(ABC):
     """Storage interface for vector database"""
+
+    # Whether stored chunks survive a process restart
+    persistent = False
+    # Where RAGSystem keeps the indexed-file manifest of a persistent backend
+    manifest_path: Optional[Path] = None
+    # In-process BM25 index over chunk text, maintained by backends that support hybrid search
+    lexical_index: Optional[LexicalIndex] = None
     
     @abstractmethod
-    def store_document(self, file_path: str, chunk_content: str, embedding: List[float]) -> bool:
-        """Store a document chunk and its embedding"""
+    def store_document(self, file_path: str, chunk_content: str, embedding: List[float],
+                       metadata: Optional[Dict] = None) -> bool:
+        """Store a document chunk and its embedding
+
+        ``metadata`` holds the persisted fields listed in ``metadata.PERSISTED_FIELDS``.
+        """
         pass
+
+    def store_documents(self, documents: List[Dict]) -> int:
+        """Store many chunks at once; each item has file_path, chunk_content, embedding
+        and optionally metadata.
+
+        Returns the number of newly stored chunks and raises when the write fails,
+        so the caller can keep the files out of the manifest. Backends override
+        this with a bulk write.
+        """
+        stored = 0
+        for doc in documents:
+            if self.store_document(doc['file_path'], doc['chunk_content'], doc['embedding'],
+                                   doc.get('metadata')):
+                stored += 1
+        return stored
         
     @abstractmethod
-    def retrieve_similar(self, query_embedding: List[float], top_k: int = 5) -> List[Dict]:
-        """Retrieve similar documents"""
+    def retrieve_similar(self, query_embedding: List[float], top_k: int = 5,
+                         filters: Optional[MetadataFilter] = None) -> List[Dict]:
+        """Retrieve similar documents among those matching ``filters``
+
+        ``filters`` is a MetadataFilter or its dict form; matching chunks are
+        selected before any vector is scored.
+        """
         pass
 
     @abstractmethod
@@ -22,66 +60,360 @@ class BaseStorage(ABC):
         """Delete all chunks and embeddings for a given file path"""
         pass
 
+    def score_candidates(self, query_embedding: List[float], chunk_ids: List,
+                         filters: Optional[MetadataFilter] = None) -> List[Dict]:
+        """Dense-score only the given chunks that match ``filters``; used by hybrid retrieval"""
+        raise NotImplementedError
+
+    def memory_bytes(self) -> int:
+        """Estimated process memory held by this backend; used to budget loaded collections"""
+        return self.lexical_index.memory_bytes() if self.lexical_index is not None else 0
+
+    def close(self):
+        """Release connections and file handles; the storage is not used afterwards"""
+
+    def lexical_ready(self) -> bool:
+        """Whether hybrid search can use the BM25 index; otherwise retrieval is dense only"""
+        return self.lexical_index is not None and len(self.lexical_index) > 0
+
+    def get_chunk_metadata(self, chunk_ids: List) -> Dict:
+        """chunk_id -> persisted metadata (heading, is_title, doc_date, ...) for reranking;
+        backends that cannot look it up cheaply return an empty dict"""
+        return {}
+
+    def retrieve_similar_batch(self, query_embeddings: List[List[float]], top_k: int = 5,
+                               filters: Optional[MetadataFilter] = None) -> List[List[Dict]]:
+        """``retrieve_similar`` for many queries; backends override this with one pass over the corpus"""
+        return [self.retrieve_similar(query_embedding, top_k, filters) for query_embedding in query_embeddings]
+
+    def score_candidates_batch(self, query_embeddings: List[List[float]], chunk_ids: List[List],
+                               filters: Optional[MetadataFilter] = None) -> List[List[Dict]]:
+        """``score_candidates`` for many queries, each with its own candidate ids"""
+        return [
+            self.score_candidates(query_embedding, ids, filters) if ids else []
+            for query_embedding, ids in zip(query_embeddings, chunk_ids)
+        ]
+
+    def retrieve_hybrid(
+        self,
+        query: str,
+        query_embedding: List[float],
+        top_k: int = 5,
+        n_candidates: int = 200,
+        rrf_k: int = 60,
+        filters: Optional[MetadataFilter] = None
+    ) -> List[Dict]:
+        """Fuse BM25 and dense rankings with reciprocal rank fusion
+
+        The BM25 candidates are dense-scored and unioned with the global dense
+        top_k before fusion, so paraphrases that share no terms with the query
+        still compete. RRF sums the rank in each list a chunk belongs to: the
+        BM25 candidates and the dense top_k. Each result keeps its cosine ``score`` and adds
+        ``lexical_score``, ``lexical_rank`` (None outside the BM25 candidates)
+        and ``rrf_score``.
+        """
+        return self.retrieve_hybrid_batch([query], [query_embedding], top_k, n_candidates, rrf_k, filters)[0]
+
+    def retrieve_hybrid_batch(
+        self,
+        queries: List[str],
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        n_candidates: int = 200,
+        rrf_k: int = 60,
+        filters: Optional[MetadataFilter] = None
+    ) -> List[List[Dict]]:
+        """``retrieve_hybrid`` for many queries with batched dense scoring"""
+        filters = MetadataFilter.from_dict(filters)
+        if not self.lexical_ready():
+            return self.retrieve_similar_batch(query_embeddings, top_k, filters)
+
+        lexicals = self.lexical_index.search_batch(queries, n_candidates)
+        docs_per_query = self.score_candidates_batch(
+            query_embeddings, [[chunk_id for chunk_id, _ in lexical] for lexical in lexicals], filters
+        )
+        dense = self.retrieve_similar_batch(query_embeddings, top_k, filters)
+        for i, dense_docs in enumerate(dense):
+            seen = {doc['metadata']['chunk_id'] for doc in docs_per_query[i]}
+            docs_per_query[i] = docs_per_query[i] + [
+                doc for doc in dense_docs if doc['metadata']['chunk_id'] not in seen
+            ]
+        return [
+            self._fuse(lexical, docs, top_k, rrf_k)
+            for lexical, docs in zip(lexicals, docs_per_query)
+        ]
+
+    @staticmethod
+    def _fuse(lexical: List, docs: List[Dict], top_k: int, rrf_k: int) -> List[Dict]:
+        lexical_rank = {chunk_id: rank for rank, (chunk_id, _) in enumerate(lexical)}
+        lexical_score = dict(lexical)
+        docs.sort(key=lambda doc: doc['score'], reverse=True)
+        for dense_rank, doc in enumerate(docs):
+            chunk_id = doc['metadata']['chunk_id']
+            # Lexical candidates below the dense top_k are scored but not in the dense list
+            rrf = 1.0 / (rrf_k + dense_rank + 1) if dense_rank < top_k else 0.0
+            if chunk_id in lexical_rank:
+                rrf += 1.0 / (rrf_k + lexical_rank[chunk_id] + 1)
+            doc['lexical_score'] = float(lexical_score.get(chunk_id, 0.0))
+            doc['lexical_rank'] = lexical_rank.get(chunk_id)
+            doc['rrf_score'] = rrf
+        docs.sort(key=lambda doc: doc['rrf_score'], reverse=True)
+        return docs[:top_k]
+
 class MemoryStorage(BaseStorage):
-    """In-memory storage implementation for fallback"""
+    """In-memory storage implementation for fallback
+
+    With ``snapshot_dir`` every stored chunk is also appended to an on-disk
+    snapshot, and startup memory-maps it instead of re-ingesting the corpus.
+    """
     
-    def __init__(self):
-        self.documents = []
+    def __init__(self, snapshot_dir: Optional[Path] = None):
+        # id -> {'file_path', 'content', 'metadata'}; embeddings live in the vector index
+        self.documents = {}
+        self.index = VectorIndex()
+        self.lexical_index = LexicalIndex()
+        self.metadata_index = MetadataIndex()
+        # file_path -> content hashes of its chunks; makes duplicate checks O(1)
+        self._file_hashes: Dict[str, set] = {}
+        # Serializes writers so index ids, snapshot rows, documents and the
+        # lexical / metadata indexes always describe the same set of chunks
+        self._write_lock = threading.Lock()
+        # Cleared while the BM25 index of a loaded snapshot is built in the background
+        self._lexical_built = threading.Event()
+        self._lexical_built.set()
+        self._closed = False
+        self.snapshot = None
+        if snapshot_dir is not None:
+            self.snapshot = SnapshotStore(snapshot_dir)
+            self.persistent = True
+            self.manifest_path = Path(snapshot_dir) / "manifest.json"
+            self._load_snapshot()
         print("INFO: Using in-memory storage as fallback")
+
+    def _load_snapshot(self):
+        try:
+            vectors, documents, file_ids = self.snapshot.load()
+            if vectors is not None and self.snapshot.needs_compaction():
+                live_ids = sorted(documents)
+                self.snapshot.rewrite(
+                    vectors[live_ids],
+                    [(documents[doc_id]['file_path'], documents[doc_id]['content'], documents[doc_id]['metadata'])
+                     for doc_id in live_ids]
+                )
+                vectors, documents, file_ids = self.snapshot.load()
+            if vectors is not None:
+                self.index.attach(vectors, file_ids)
+            self.documents = documents
+            for doc in documents.values():
+                self._file_hashes.setdefault(doc['file_path'], set()).add(content_hash(doc['content']))
+            for doc_id, doc in documents.items():
+                self.metadata_index.add(doc_id, doc['file_path'], doc['metadata'])
+            print(f"INFO: Loaded {len(documents)} chunks from snapshot {self.snapshot.directory}")
+            if documents:
+                # Tokenizing every chunk dominates warm start; dense retrieval serves until it is done
+                self._lexical_built.clear()
+                threading.Thread(target=self._build_lexical_index, args=(list(documents.items()),),
+                                 name='lexical-index', daemon=True).start()
+        except Exception as e:
+            print(f"WARNING: Failed to load memory snapshot, documents will be re-ingested: {e}")
+            self._disable_snapshot()
+
+    def _build_lexical_index(self, items: List, batch_size: int = 1000):
+        """Index the snapshot's chunks into BM25, then drop any deleted meanwhile"""
+        start = time.perf_counter()
+        try:
+            for i in range(0, len(items), batch_size):
+                if self._closed:
+                    return
+                self.lexical_index.add_many(
+                    (doc_id, doc['content'], doc['file_path']) for doc_id, doc in items[i:i + batch_size]
+                )
+            # Ids are never reused, so anything no longer in documents was deleted during the build
+            with self._write_lock:
+                for doc_id in self.lexical_index.doc_ids() - set(self.documents):
+                    self.lexical_index.remove(doc_id)
+            print(f"INFO: Built lexical index for {len(items)} snapshot chunks "
+                  f"in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            print(f"WARNING: Failed to build lexical index, hybrid search is dense only: {e}")
+        finally:
+            self._lexical_built.set()
+
+    def lexical_ready(self) -> bool:
+        return self._lexical_built.is_set() and super().lexical_ready()
+
+    def close(self):
+        self._closed = True
+
+    def _disable_snapshot(self):
+        self.snapshot = None
+        self.persistent = False
+        self.manifest_path = None
+
+    def _append_snapshot(self, embeddings, doc_ids: List[int], file_path: str,
+                         contents: List[str], metadatas: List[Dict]):
+        if self.snapshot is None:
+            return
+        try:
+            self.snapshot.append(
+                VectorIndex.normalize(embeddings),
+                [(doc_id, file_path, content, metadata)
+                 for doc_id, content, metadata in zip(doc_ids, contents, metadatas)]
+            )
+        except Exception as e:
+            print(f"WARNING: Failed to append to memory snapshot, persistence disabled: {e}")
+            self._disable_snapshot()
         
-    def store_document(self, file_path: str, chunk_content: str, embedding: List[float]) -> bool:
-        # Check for duplicates
-        for doc in self.documents:
-            if doc['file_path'] == file_path and doc['content'] == chunk_content:
+    def store_document(self, file_path: str, chunk_content: str, embedding: List[float],
+                       metadata: Optional[Dict] = None) -> bool:
+        metadata = metadata or {}
+        with self._write_lock:
+            hashes = self._file_hashes.setdefault(file_path, set())
+            chunk_hash = content_hash(chunk_content)
+            if chunk_hash in hashes:
                 return False
-                
-        self.documents.append({
-            'file_path': file_path,
-            'content': chunk_content,
-            'embedding': embedding
-        })
+            hashes.add(chunk_hash)
+            doc_id = self.index.add([embedding], file_path)[0]
+            self._append_snapshot([embedding], [doc_id], file_path, [chunk_content], [metadata])
+            self._add_document(doc_id, file_path, chunk_content, metadata)
         return True
+
+    def _add_document(self, doc_id: int, file_path: str, content: str, metadata: Dict):
+        self.documents[doc_id] = {
+            'file_path': file_path,
+            'content': content,
+            'metadata': metadata
+        }
+        self.lexical_index.add(doc_id, content, file_path)
+        self.metadata_index.add(doc_id, file_path, metadata)
+
+    def store_documents(self, documents: List[Dict]) -> int:
+        # Group chunks by file so each file is one append into the index
+        by_file = {}
+        for doc in documents:
+            by_file.setdefault(doc['file_path'], []).append(doc)
+
+        stored = 0
+        for file_path, file_docs in by_file.items():
+            with self._write_lock:
+                hashes = self._file_hashes.setdefault(file_path, set())
+                new_docs = []
+                for doc in file_docs:
+                    chunk_hash = content_hash(doc['chunk_content'])
+                    if chunk_hash not in hashes:
+                        hashes.add(chunk_hash)
+                        new_docs.append(doc)
+                file_docs = new_docs
+                if not file_docs:
+                    continue
+                embeddings = [doc['embedding'] for doc in file_docs]
+                metadatas = [doc.get('metadata') or {} for doc in file_docs]
+                doc_ids = self.index.add(embeddings, file_path)
+                self._append_snapshot(embeddings, doc_ids, file_path,
+                                      [doc['chunk_content'] for doc in file_docs], metadatas)
+                for doc_id, doc, metadata in zip(doc_ids, file_docs, metadatas):
+                    self._add_document(doc_id, file_path, doc['chunk_content'], metadata)
+            stored += len(doc_ids)
+        return stored
         
-    def cosine_similarity(self, a: np.ndarray, b: np.ndarray) -> float:
-        """Calculate cosine similarity between two vectors"""
-        norm_a = np.linalg.norm(a)
-        norm_b = np.linalg.norm(b)
-        if norm_a == 0 or norm_b == 0:
-            return 0
-        return np.dot(a, b) / (norm_a * norm_b)
-        
-    def retrieve_similar(self, query_embedding: List[float], top_k: int = 5) -> List[Dict]:
+    def retrieve_similar(self, query_embedding: List[float], top_k: int = 5,
+                         filters: Optional[MetadataFilter] = None) -> List[Dict]:
         if not self.documents:
             return []
+
+        filters = MetadataFilter.from_dict(filters)
+        if filters:
+            # Score only the matching chunks instead of searching the whole index
+            candidates = self.metadata_index.candidates(filters, self.documents)
+            scores, doc_ids = self.index.score_ids(query_embedding, sorted(candidates))
+            keep = VectorIndex._top_k(scores, top_k)
+            return self._to_results(scores[keep], doc_ids[keep])
             
-        query_embedding = np.array(query_embedding)
-        
-        # Calculate cosine similarities
-        similarities = []
-        for doc in self.documents:
-            doc_embedding = np.array(doc['embedding'])
-            similarity = self.cosine_similarity(query_embedding, doc_embedding)
-            similarities.append((similarity, doc))
-        
-        # Sort by similarity (highest first)
-        similarities.sort(key=lambda x: x[0], reverse=True)
-        
-        # Return top_k results
+        scores, doc_ids = self.index.search(query_embedding, top_k)
+        return self._to_results(scores, doc_ids)
+
+    def score_candidates(self, query_embedding: List[float], chunk_ids: List,
+                         filters: Optional[MetadataFilter] = None) -> List[Dict]:
+        filters = MetadataFilter.from_dict(filters)
+        if filters:
+            candidates = self.metadata_index.candidates(filters, self.documents)
+            chunk_ids = [chunk_id for chunk_id in chunk_ids if chunk_id in candidates]
+        scores, doc_ids = self.index.score_ids(query_embedding, chunk_ids)
+        return self._to_results(scores, doc_ids)
+
+    def memory_bytes(self) -> int:
+        return self.index.nbytes + super().memory_bytes()
+
+    def get_chunk_metadata(self, chunk_ids: List) -> Dict:
+        documents = self.documents
+        return {
+            chunk_id: documents[chunk_id]['metadata']
+            for chunk_id in chunk_ids if chunk_id in documents
+        }
+
+    def retrieve_similar_batch(self, query_embeddings: List[List[float]], top_k: int = 5,
+                               filters: Optional[MetadataFilter] = None) -> List[List[Dict]]:
+        if not self.documents or not len(query_embeddings):
+            return [[] for _ in query_embeddings]
+
+        filters = MetadataFilter.from_dict(filters)
+        if filters:
+            candidates = self.metadata_index.candidates(filters, self.documents)
+            scores, doc_ids = self.index.score_ids_batch(query_embeddings, sorted(candidates))
+            results = []
+            for row_scores in scores:
+                keep = VectorIndex._top_k(row_scores, top_k)
+                results.append(self._to_results(row_scores[keep], doc_ids[keep]))
+            return results
+
+        return [
+            self._to_results(scores, doc_ids)
+            for scores, doc_ids in self.index.search_batch(query_embeddings, top_k)
+        ]
+
+    def score_candidates_batch(self, query_embeddings: List[List[float]], chunk_ids: List[List],
+                               filters: Optional[MetadataFilter] = None) -> List[List[Dict]]:
+        """Score the union of all candidates with one matrix product, then split per query"""
+        union = sorted({chunk_id for ids in chunk_ids for chunk_id in ids})
+        filters = MetadataFilter.from_dict(filters)
+        if filters:
+            candidates = self.metadata_index.candidates(filters, self.documents)
+            union = [chunk_id for chunk_id in union if chunk_id in candidates]
+        scores, doc_ids = self.index.score_ids_batch(query_embeddings, union)
+        column = {doc_id: i for i, doc_id in enumerate(doc_ids.tolist())}
+
+        results = []
+        for row_scores, ids in zip(scores, chunk_ids):
+            columns = np.asarray([column[chunk_id] for chunk_id in ids if chunk_id in column], dtype=np.int64)
+            results.append(self._to_results(row_scores[columns], doc_ids[columns]))
+        return results
+
+    def _to_results(self, scores, doc_ids) -> List[Dict]:
         results = []
-        for similarity, doc in similarities[:top_k]:
+        for similarity, doc_id in zip(scores.tolist(), doc_ids.tolist()):
+            doc = self.documents.get(doc_id)
+            if doc is None:  # deleted concurrently
+                continue
             results.append({
                 'text': doc['content'],
-                'metadata': {'source': doc['file_path']},
+                'metadata': {'source': doc['file_path'], 'chunk_id': doc_id},
                 'score': float(similarity)
             })
-        
         return results
 
     def delete_document(self, file_path: str) -> bool:
         """Delete all chunks related to the specified file"""
         try:
-            # Filter out all documents from the specified file
-            self.documents = [doc for doc in self.documents if doc['file_path'] != file_path]
+            with self._write_lock:
+                doc_ids = self.index.delete_file(file_path)
+                self._file_hashes.pop(file_path, None)
+                if self.snapshot is not None:
+                    self.snapshot.delete_file(file_path, len(doc_ids))
+                for doc_id in doc_ids:
+                    doc = self.documents.pop(doc_id, None)
+                    if doc is not None:
+                        self.metadata_index.remove(doc_id, file_path, doc['metadata'])
+                self.lexical_index.remove_source(file_path)
             return True
         except Exception as e:
             print(f"Failed to delete document from memory storage: {e}")
@@ -0,0 +1,94 @@
+# src/storage/connection_pool.py
+
+from contextlib import contextmanager
+from typing import Callable, List
+import threading
+import time
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections
+
+    Connections are created lazily up to ``max_size``; callers beyond that
+    block until a connection is returned or a slot is freed. A connection
+    that raised a connection-level error is closed instead of being put
+    back, and a waiter then opens a replacement.
+    """
+
+    def __init__(self, factory: Callable, max_size: int = 8, timeout: float = 30.0,
+                 broken_errors: tuple = ()):
+        self.factory = factory
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.broken_errors = broken_errors
+        # Idle connections (most recently used last) and the count of open ones,
+        # both guarded by _cond; waiters are woken when either changes
+        self._idle: List = []
+        self._created = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.max_size:
+                    self._created += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No database connection available within {self.timeout}s")
+                self._cond.wait(remaining)
+        try:
+            return self.factory()
+        except Exception:
+            self._forget()
+            raise
+
+    def _forget(self):
+        """Free the slot of a connection that is gone and let a waiter create a new one"""
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def _discard(self, conn):
+        self._forget()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except self.broken_errors:
+            self._discard(conn)
+            raise
+        except BaseException:
+            self._release(conn)
+            raise
+        else:
+            self._release(conn)
+
+    def _release(self, conn):
+        with self._cond:
+            if not self._closed:
+                self._idle.append(conn)
+                self._cond.notify()
+                return
+        self._discard(conn)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    @property
+    def size(self) -> int:
+        return self._created
@@ -0,0 +1,208 @@
+# src/storage/lexical_index.py
+
+from collections import Counter, defaultdict
+from typing import Dict, Hashable, Iterable, List, Tuple
+import math
+import re
+import threading
+import numpy as np
+
+# 连续的汉字串按字符二元组切分；英文、数字及主机名、错误码等按整体保留
+_CJK_RUN = re.compile(r'[㐀-䶿一-鿿豈-﫿]+')
+_WORD = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.:/\-]*[A-Za-z0-9]|[A-Za-z0-9]')
+_WORD_PARTS = re.compile(r'[._:/\-]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Chinese-aware tokenizer for BM25
+
+    - CJK runs become overlapping character bigrams (single characters for
+      one-character runs), which matches personnel names and terms without
+      a dictionary;
+    - ASCII tokens such as ``db-01.prod``, ``ORA-00600`` or ``Gi0/1`` are kept
+      whole (lower-cased) and additionally split on ``. _ : / -``.
+    """
+    tokens = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    for word in _WORD.findall(text):
+        word = word.lower()
+        tokens.append(word)
+        parts = [part for part in _WORD_PARTS.split(word) if part]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class LexicalIndex:
+    """Incremental in-memory inverted index with BM25 scoring"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Hashable, int]] = defaultdict(dict)
+        self._doc_terms: Dict[Hashable, Counter] = {}
+        self._doc_lengths: Dict[Hashable, int] = {}
+        self._source_docs: Dict[str, set] = defaultdict(set)
+        self._doc_source: Dict[Hashable, str] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._doc_lengths
+
+    def doc_ids(self) -> set:
+        with self._lock:
+            return set(self._doc_lengths)
+
+    # Rough heap cost per indexed token: the posting entry, the per-document
+    # term counter and the chunk text kept alongside by the storage backends
+    BYTES_PER_TOKEN = 200
+
+    def memory_bytes(self) -> int:
+        """Estimated memory footprint, O(1) from the running token total"""
+        return self._total_length * self.BYTES_PER_TOKEN
+
+    def add(self, doc_id: Hashable, text: str, source: str = None):
+        terms = Counter(tokenize(text))
+        with self._lock:
+            if doc_id in self._doc_lengths:
+                self._remove(doc_id)
+            for term, tf in terms.items():
+                self._postings[term][doc_id] = tf
+            self._doc_terms[doc_id] = terms
+            length = sum(terms.values())
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+            if source is not None:
+                self._source_docs[source].add(doc_id)
+                self._doc_source[doc_id] = source
+
+    def add_many(self, items: Iterable[Tuple[Hashable, str, str]]):
+        for doc_id, text, source in items:
+            self.add(doc_id, text, source)
+
+    def _remove(self, doc_id: Hashable):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        source = self._doc_source.pop(doc_id, None)
+        if source is not None:
+            self._source_docs[source].discard(doc_id)
+            if not self._source_docs[source]:
+                del self._source_docs[source]
+
+    def remove(self, doc_id: Hashable):
+        with self._lock:
+            self._remove(doc_id)
+
+    def remove_source(self, source: str) -> int:
+        """Remove every document added with ``source``"""
+        with self._lock:
+            doc_ids = list(self._source_docs.get(source, ()))
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+            return len(doc_ids)
+
+    def coverage(self, terms: Iterable[str], doc_ids: Iterable[Hashable]) -> Dict[Hashable, float]:
+        """IDF-weighted fraction of ``terms`` occurring in each indexed document
+
+        Read from the stored term counts instead of re-tokenizing the text; a
+        rare host name or error code outweighs common words. Unindexed ids are
+        left out.
+        """
+        terms = set(terms)
+        with self._lock:
+            n_docs = len(self._doc_lengths)
+            weights = {}
+            for term in terms:
+                # Terms found in no document cannot tell candidates apart
+                df = len(self._postings.get(term, ()))
+                if df:
+                    weights[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            total = sum(weights.values())
+            if not total:
+                return {}
+            return {
+                doc_id: sum(weight for term, weight in weights.items() if term in doc_terms) / total
+                for doc_id, doc_terms in ((doc_id, self._doc_terms.get(doc_id)) for doc_id in doc_ids)
+                if doc_terms is not None
+            }
+
+    def search(self, query: str, top_k: int = 100) -> List[Tuple[Hashable, float]]:
+        """Return ``(doc_id, bm25_score)`` pairs, best first"""
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._doc_lengths)
+            if not n_docs or not terms:
+                return []
+            avg_length = self._total_length / n_docs
+            scores: Dict[Hashable, float] = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k]
+
+    def search_batch(self, queries: List[str], top_k: int = 100) -> List[List[Tuple[Hashable, float]]]:
+        """``search`` for many queries
+
+        Every distinct term of the batch is scored once into NumPy arrays over
+        a dense document numbering; each query then only sums the arrays of
+        its terms. Templated questions share most terms, so this is far
+        cheaper than walking the posting dicts once per query.
+        """
+        term_sets = [set(tokenize(query)) for query in queries]
+        with self._lock:
+            n_docs = len(self._doc_lengths)
+            if not n_docs:
+                return [[] for _ in queries]
+            avg_length = self._total_length / n_docs
+            doc_ids = list(self._doc_lengths)
+            position = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+            lengths = np.fromiter(self._doc_lengths.values(), dtype=np.float64, count=n_docs)
+            norms = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+
+            term_scores = {}
+            for term in set().union(*term_sets):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                rows = np.fromiter((position[doc_id] for doc_id in postings), dtype=np.int64, count=len(postings))
+                tfs = np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                term_scores[term] = (rows, idf * tfs * (self.k1 + 1) / (tfs + norms[rows]))
+
+        results = []
+        for terms in term_sets:
+            parts = [term_scores[term] for term in terms if term in term_scores]
+            if not parts:
+                results.append([])
+                continue
+            docs, inverse = np.unique(np.concatenate([rows for rows, _ in parts]), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate([part for _, part in parts]))
+            if scores.size > top_k:
+                order = np.argpartition(-scores, top_k - 1)[:top_k]
+                order = order[np.argsort(-scores[order], kind='stable')]
+            else:
+                order = np.argsort(-scores, kind='stable')
+            results.append([(doc_ids[docs[i]], float(scores[i])) for i in order])
+        return results
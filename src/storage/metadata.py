@@ -0,0 +1,191 @@
+# src/storage/metadata.py
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import hashlib
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Chunk metadata persisted by the storage backends, in addition to file_path
+PERSISTED_FIELDS = ('file_type', 'block_type', 'page_num', 'position', 'is_title', 'heading', 'doc_date', 'tags')
+
+
+def content_hash(content: str) -> str:
+    """Dedup key of a chunk within its file: SHA-1 hex digest of the text"""
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def chunk_metadata(metadata: Dict) -> Dict:
+    """Pick the persisted fields out of a parsed document's metadata"""
+    persisted = {field: metadata.get(field) for field in PERSISTED_FIELDS}
+    persisted['is_title'] = bool(persisted['is_title'])
+    persisted['tags'] = sorted({str(tag) for tag in persisted['tags'] or []})
+    return persisted
+
+
+def _parse_date(value, end: bool = False) -> Optional[str]:
+    """Normalize an ISO date/datetime to DATE_FORMAT; a bare date used as an
+    upper bound covers the whole day"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value)
+        parsed = datetime.fromisoformat(text)
+        if end and len(text) == 10:
+            parsed += timedelta(days=1, seconds=-1)
+    return parsed.strftime(DATE_FORMAT)
+
+
+def _as_list(value) -> Optional[List[str]]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = [value]
+    return [str(item) for item in value]
+
+
+class MetadataFilter:
+    """Restricts retrieval to chunks matching every given condition
+
+    - ``sources``: file paths (any of);
+    - ``file_types``: extensions without the dot, e.g. ``["pdf", "docx"]`` (any of);
+    - ``date_from`` / ``date_to``: inclusive bounds on the document date, ISO strings;
+    - ``tags``: chunks carrying at least one of the tags.
+    """
+
+    def __init__(
+        self,
+        sources: Optional[Iterable[str]] = None,
+        file_types: Optional[Iterable[str]] = None,
+        date_from=None,
+        date_to=None,
+        tags: Optional[Iterable[str]] = None
+    ):
+        self.sources = _as_list(sources)
+        self.file_types = [t.lower().lstrip('.') for t in _as_list(file_types)] if file_types is not None else None
+        self.date_from = _parse_date(date_from)
+        self.date_to = _parse_date(date_to, end=True)
+        self.tags = _as_list(tags)
+
+    @classmethod
+    def from_dict(cls, filters) -> Optional['MetadataFilter']:
+        """Accept None, a MetadataFilter or a request dict; empty filters become None"""
+        if filters is None or isinstance(filters, MetadataFilter):
+            return filters or None
+        unknown = set(filters) - {'sources', 'file_types', 'date_from', 'date_to', 'tags'}
+        if unknown:
+            raise ValueError(f"Unknown filter fields: {', '.join(sorted(unknown))}")
+        return cls(**filters) or None
+
+    def __bool__(self) -> bool:
+        return any(value is not None for value in
+                   (self.sources, self.file_types, self.date_from, self.date_to, self.tags))
+
+    def matches(self, file_path: str, metadata: Dict) -> bool:
+        if self.sources is not None and file_path not in self.sources:
+            return False
+        if self.file_types is not None and metadata.get('file_type') not in self.file_types:
+            return False
+        doc_date = metadata.get('doc_date')
+        if self.date_from is not None and (doc_date is None or doc_date < self.date_from):
+            return False
+        if self.date_to is not None and (doc_date is None or doc_date > self.date_to):
+            return False
+        if self.tags is not None and not set(self.tags) & set(metadata.get('tags') or []):
+            return False
+        return True
+
+    def to_sql(self, tags_table: str) -> Tuple[List[str], List]:
+        """SQL conditions (to be AND-ed) and their parameters"""
+        clauses, params = [], []
+
+        def any_of(column, values):
+            if not values:
+                clauses.append('1 = 0')
+                return
+            clauses.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+            params.extend(values)
+
+        if self.sources is not None:
+            any_of('file_path', self.sources)
+        if self.file_types is not None:
+            any_of('file_type', self.file_types)
+        if self.date_from is not None:
+            clauses.append('doc_date >= %s')
+            params.append(self.date_from)
+        if self.date_to is not None:
+            clauses.append('doc_date <= %s')
+            params.append(self.date_to)
+        if self.tags is not None:
+            if self.tags:
+                placeholders = ', '.join(['%s'] * len(self.tags))
+                clauses.append(f"id IN (SELECT chunk_id FROM {tags_table} WHERE tag IN ({placeholders}))")
+                params.extend(self.tags)
+            else:
+                clauses.append('1 = 0')
+        return clauses, params
+
+
+class MetadataIndex:
+    """Posting lists from source, file type and tag to chunk ids for MemoryStorage
+
+    Equality conditions are answered by intersecting posting sets; the date
+    range is then checked only on the surviving ids.
+    """
+
+    FIELDS = ('source', 'file_type', 'tag')
+
+    def __init__(self):
+        self._postings: Dict[Tuple[str, str], Set[int]] = {}
+
+    def _keys(self, file_path: str, metadata: Dict) -> List[Tuple[str, str]]:
+        keys = [('source', file_path)]
+        if metadata.get('file_type'):
+            keys.append(('file_type', metadata['file_type']))
+        keys.extend(('tag', tag) for tag in metadata.get('tags') or [])
+        return keys
+
+    def add(self, doc_id: int, file_path: str, metadata: Dict):
+        for key in self._keys(file_path, metadata):
+            self._postings.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id: int, file_path: str, metadata: Dict):
+        for key in self._keys(file_path, metadata):
+            ids = self._postings.get(key)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self._postings[key]
+
+    def _any_of(self, field: str, values: List[str]) -> Set[int]:
+        ids = set()
+        for value in values:
+            ids |= self._postings.get((field, value), set())
+        return ids
+
+    def candidates(self, filters: MetadataFilter, documents: Dict[int, Dict]) -> Set[int]:
+        """Ids of the chunks in ``documents`` that match ``filters``"""
+        sets = []
+        if filters.sources is not None:
+            sets.append(self._any_of('source', filters.sources))
+        if filters.file_types is not None:
+            sets.append(self._any_of('file_type', filters.file_types))
+        if filters.tags is not None:
+            sets.append(self._any_of('tag', filters.tags))
+
+        if sets:
+            sets.sort(key=len)
+            ids = set(sets[0])
+            for other in sets[1:]:
+                ids &= other
+        else:
+            ids = set(documents)
+        if filters.date_from is None and filters.date_to is None:
+            return ids
+        return {
+            doc_id for doc_id in ids
+            if doc_id in documents
+            and filters.matches(documents[doc_id]['file_path'], documents[doc_id].get('metadata') or {})
+        }
@@ -1,28 +1,101 @@
 # src/storage/mo_manager.py
 
 import pymysql
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
 from typing import List, Dict, Optional
 import numpy as np
 from config.config import (
-    MO_HOST, MO_PORT, MO_USER, MO_PASSWORD, 
-    MO_DATABASE, MO_TABLE, VECTOR_DIMENSION
+    MANIFEST_PATH, MO_HOST, MO_PORT, MO_USER, MO_PASSWORD, 
+    MO_DATABASE, MO_TABLE, VECTOR_DIMENSION,
+    MO_SEARCH_MODE, MO_DISTANCE_METRIC, MO_IVF_LISTS, MO_IVF_PROBE, MO_POOL_SIZE,
+    MO_LEXICAL_REFRESH_SECONDS
 )
 from .base_storage import BaseStorage
+from .connection_pool import ConnectionPool
+from .lexical_index import LexicalIndex
+from .metadata import DATE_FORMAT, MetadataFilter, content_hash
+from .vector_index import VectorIndex
 
 class MOManager(BaseStorage):
     """MatrixOne database manager for vector storage"""
+
+    persistent = True
     
-    def __init__(self):
+    # distance function and score conversion for each supported metric
+    DISTANCE_FUNCTIONS = {
+        'l2': 'l2_distance',
+        'cosine': 'cosine_distance'
+    }
+
+    # Chunk metadata columns; added to existing tables on startup
+    METADATA_COLUMNS = {
+        'file_type': 'VARCHAR(32)',
+        'block_type': 'VARCHAR(32)',
+        'page_num': 'INT',
+        'block_position': 'INT',
+        'is_title': 'BOOL',
+        'heading': 'VARCHAR(512)',
+        'doc_date': 'DATETIME'
+    }
+    # Duplicate check and upsert key: a chunk is identified by its file and text hash
+    UNIQUE_INDEXES = {
+        'uk_file_hash': 'file_path, content_hash'
+    }
+    # Secondary indexes used to prune candidates before vector scoring
+    SECONDARY_INDEXES = {
+        'idx_file_path': 'file_path',
+        'idx_file_type': 'file_type',
+        'idx_doc_date': 'doc_date',
+        'idx_created_at': 'created_at'
+    }
+    # Server errors meaning a vector function or statement form is not available:
+    # syntax error, unknown function, "not supported yet" and MatrixOne's "not supported"
+    UNSUPPORTED_ERROR_CODES = {1064, 1305, 1235, 20105}
+
+    def __init__(
+        self,
+        table: str = MO_TABLE,
+        manifest_path: Optional[Path] = MANIFEST_PATH,
+        search_mode: str = MO_SEARCH_MODE,
+        metric: str = MO_DISTANCE_METRIC,
+        ivf_lists: int = MO_IVF_LISTS,
+        ivf_probe: int = MO_IVF_PROBE,
+        pool_size: int = MO_POOL_SIZE,
+        lexical_refresh_seconds: Optional[float] = MO_LEXICAL_REFRESH_SECONDS
+    ):
+        if metric not in self.DISTANCE_FUNCTIONS:
+            raise ValueError(f"Unsupported distance metric: {metric}")
+        # Each knowledge-base collection has its own table (and tags table)
+        self.table = table
+        self.manifest_path = manifest_path
         self.conn = None
-        self.cursor = None
+        self.pool = None
+        self.pool_size = pool_size
         self.is_connected = False
+        self.search_mode = search_mode
+        self.metric = metric
+        self.ivf_lists = ivf_lists
+        self.ivf_probe = ivf_probe
+        self.lexical_index = LexicalIndex()
+        # The BM25 index lives in this process; rows written or deleted by other
+        # processes are picked up at most every lexical_refresh_seconds
+        self.lexical_refresh_seconds = lexical_refresh_seconds
+        self._lexical_watermark = 0
+        self._lexical_refreshed_at = time.monotonic()
+        self._lexical_refresh_lock = threading.Lock()
         self.connect()
         self.init_database()
+        self._load_lexical_index()
 
     def connect(self):
         """Connect to MatrixOne database"""
         if not self.is_connected:
             try:
+                # Bootstrap connection used for DDL before the database exists
                 self.conn = pymysql.connect(
                     host=MO_HOST,
                     port=MO_PORT,
@@ -30,110 +103,649 @@ class MOManager(BaseStorage):
                     password=MO_PASSWORD,
                     autocommit=True
                 )
-                self.cursor = self.conn.cursor()
+                self.pool = ConnectionPool(
+                    self._new_connection,
+                    max_size=self.pool_size,
+                    broken_errors=(pymysql.err.OperationalError, pymysql.err.InterfaceError)
+                )
                 self.is_connected = True
             except Exception as e:
                 raise Exception(f"Failed to connect to MatrixOne: {e}")
 
+    def _new_connection(self):
+        """Open a pooled connection bound to MO_DATABASE"""
+        conn = pymysql.connect(
+            host=MO_HOST,
+            port=MO_PORT,
+            user=MO_USER,
+            password=MO_PASSWORD,
+            database=MO_DATABASE,
+            autocommit=True
+        )
+        # Session variable, so it must be set on every connection
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SET @probe_limit = {int(self.ivf_probe)}")
+        except Exception as e:
+            print(f"Warning: Failed to set IVF probe limit: {e}")
+        return conn
+
+    @contextmanager
+    def _cursor(self):
+        """Borrow a cursor on a pooled connection for the duration of the block"""
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+
     def init_database(self):
         """Initialize database and table"""
         try:
-            self.cursor.execute(f"CREATE DATABASE IF NOT EXISTS {MO_DATABASE}")
-            self.cursor.execute(f"USE {MO_DATABASE}")
-            
-            create_table_sql = f"""
-            CREATE TABLE IF NOT EXISTS {MO_TABLE} (
-                id BIGINT AUTO_INCREMENT PRIMARY KEY,
-                file_path VARCHAR(512),
-                chunk_content TEXT,
-                embedding VECF32({VECTOR_DIMENSION}),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-            self.cursor.execute(create_table_sql)
-            
-            # Simplified index creation
-            try:
-                self.cursor.execute("SET GLOBAL experimental_ivf_index = 1")
-                index_sql = f"""
-                CREATE INDEX idx_embedding 
-                ON {MO_TABLE}(embedding)
+            with self.conn.cursor() as cursor:
+                cursor.execute(f"CREATE DATABASE IF NOT EXISTS {MO_DATABASE}")
+                cursor.execute(f"USE {MO_DATABASE}")
+                
+                metadata_columns = ''.join(
+                    f"{column} {column_type},\n                    "
+                    for column, column_type in self.METADATA_COLUMNS.items()
+                )
+                create_table_sql = f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    file_path VARCHAR(512),
+                    chunk_content TEXT,
+                    embedding VECF32({VECTOR_DIMENSION}),
+                    content_hash CHAR(40),
+                    {metadata_columns}created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
                 """
-                self.cursor.execute(index_sql)
-            except Exception as e:
-                print(f"Warning: Vector index creation failed: {e}")
+                cursor.execute(create_table_sql)
+                self._migrate_schema(cursor)
+
+                # One row per (tag, chunk); the primary key doubles as the tag index
+                cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self._tags_table()} (
+                    tag VARCHAR(128),
+                    chunk_id BIGINT,
+                    PRIMARY KEY (tag, chunk_id)
+                )
+                """)
+                
+                # IVF index; MatrixOne only uses it for l2_distance ordering
+                try:
+                    cursor.execute("SET GLOBAL experimental_ivf_index = 1")
+                    index_sql = f"""
+                    CREATE INDEX idx_embedding USING ivfflat
+                    ON {self.table}(embedding)
+                    LISTS = {int(self.ivf_lists)} OP_TYPE "vector_l2_ops"
+                    """
+                    cursor.execute(index_sql)
+                except Exception as e:
+                    print(f"Warning: Vector index creation failed: {e}")
             
         except Exception as e:
             raise Exception(f"Failed to initialize database: {e}")
+        finally:
+            # DDL is done; queries go through the pool from here on
+            self.conn.close()
+            self.conn = None
+
+    def _tags_table(self) -> str:
+        return f"{self.table}_tags"
+
+    def _migrate_schema(self, cursor):
+        """Add columns and indexes missing from an older table"""
+        cursor.execute(f"SHOW COLUMNS FROM {self.table}")
+        existing = {row[0].lower() for row in cursor.fetchall()}
+        columns = dict({'content_hash': 'CHAR(40)'}, **self.METADATA_COLUMNS)
+        for column, column_type in columns.items():
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE {self.table} ADD COLUMN {column} {column_type}")
+                print(f"Added column {column} to {self.table}")
+        self._backfill_content_hashes(cursor)
+
+        cursor.execute(f"SHOW INDEX FROM {self.table}")
+        # Key_name is the third column of SHOW INDEX
+        indexes = {row[2].lower() for row in cursor.fetchall()}
+        wanted = [('UNIQUE INDEX', name, columns) for name, columns in self.UNIQUE_INDEXES.items()]
+        wanted += [('INDEX', name, columns) for name, columns in self.SECONDARY_INDEXES.items()]
+        for kind, index_name, index_columns in wanted:
+            if index_name in indexes:
+                continue
+            try:
+                cursor.execute(f"CREATE {kind} {index_name} ON {self.table}({index_columns})")
+            except Exception as e:
+                print(f"Warning: Failed to create index {index_name}: {e}")
+
+    def _backfill_content_hashes(self, cursor, batch_size: int = 1000):
+        """Hash the chunks stored before the content_hash column existed"""
+        cursor.execute(f"SELECT id, chunk_content FROM {self.table} WHERE content_hash IS NULL")
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        update_sql = f"UPDATE {self.table} SET content_hash = %s WHERE id = %s"
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(update_sql, [
+                (content_hash(content), chunk_id) for chunk_id, content in rows[start:start + batch_size]
+            ])
+        print(f"Backfilled content hashes for {len(rows)} chunks")
+
+    def _metadata_values(self, metadata: Optional[Dict]) -> tuple:
+        """Column values for METADATA_COLUMNS, in order"""
+        metadata = metadata or {}
+        heading = metadata.get('heading')
+        return (
+            metadata.get('file_type'),
+            metadata.get('block_type'),
+            metadata.get('page_num'),
+            metadata.get('position'),
+            bool(metadata.get('is_title')),
+            heading[:512] if heading else None,
+            metadata.get('doc_date')
+        )
 
-    def store_document(self, file_path: str, chunk_content: str, embedding: List[float]) -> bool:
+    def _insert_sql(self) -> str:
+        columns = ['file_path', 'chunk_content', 'embedding', 'content_hash'] + list(self.METADATA_COLUMNS)
+        placeholders = ', '.join(['%s'] * len(columns))
+        return f"INSERT INTO {self.table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+    def _store_tags(self, cursor, chunk_tags: List[tuple]):
+        """Insert ``(tag, chunk_id)`` rows"""
+        if chunk_tags:
+            cursor.executemany(f"INSERT INTO {self._tags_table()} (tag, chunk_id) VALUES (%s, %s)", chunk_tags)
+
+    def _filter_clauses(self, filters: Optional[MetadataFilter]):
+        filters = MetadataFilter.from_dict(filters)
+        if not filters:
+            return [], []
+        return filters.to_sql(self._tags_table())
+
+    def _load_lexical_index(self, fetch_size: int = 5000):
+        """Build the in-process BM25 index from the chunks already in the table"""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(f"SELECT id, chunk_content, file_path FROM {self.table}")
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    self.lexical_index.add_many(rows)
+                    self._lexical_watermark = max(self._lexical_watermark, max(row[0] for row in rows))
+            print(f"Loaded {len(self.lexical_index)} chunks into the lexical index")
+        except Exception as e:
+            print(f"Warning: Failed to build lexical index: {e}")
+
+    def _refresh_lexical_index(self):
+        """Sync the BM25 index with rows inserted or deleted by other processes
+
+        Rows above the last seen id are added; when the row count still differs
+        from the index, the live ids are listed and deleted rows dropped. Runs at
+        most every ``lexical_refresh_seconds``, by one thread at a time.
+        """
+        if self.lexical_refresh_seconds is None:
+            return
+        if time.monotonic() - self._lexical_refreshed_at < self.lexical_refresh_seconds:
+            return
+        if not self._lexical_refresh_lock.acquire(blocking=False):
+            return
         try:
+            self._lexical_refreshed_at = time.monotonic()
+            with self._cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*), COALESCE(MAX(id), 0) FROM {self.table}")
+                count, max_id = cursor.fetchone()
+                if max_id > self._lexical_watermark:
+                    cursor.execute(
+                        f"SELECT id, chunk_content, file_path FROM {self.table} WHERE id > %s",
+                        (self._lexical_watermark,)
+                    )
+                    # Rows this process inserted are already indexed
+                    self.lexical_index.add_many(
+                        row for row in cursor.fetchall() if row[0] not in self.lexical_index
+                    )
+                    self._lexical_watermark = max_id
+                if count != len(self.lexical_index):
+                    cursor.execute(f"SELECT id FROM {self.table}")
+                    live = {row[0] for row in cursor.fetchall()}
+                    for chunk_id in self.lexical_index.doc_ids() - live:
+                        self.lexical_index.remove(chunk_id)
+        except Exception as e:
+            print(f"Warning: Failed to refresh lexical index: {e}")
+        finally:
+            self._lexical_refresh_lock.release()
+
+    def retrieve_hybrid_batch(self, *args, **kwargs) -> List[List[Dict]]:
+        self._refresh_lexical_index()
+        return super().retrieve_hybrid_batch(*args, **kwargs)
+
+    def store_document(self, file_path: str, chunk_content: str, embedding: List[float],
+                       metadata: Optional[Dict] = None) -> bool:
+        try:
+            chunk_hash = content_hash(chunk_content)
             check_sql = f"""
-            SELECT id FROM {MO_TABLE} 
-            WHERE file_path = %s AND chunk_content = %s
-            """
-            self.cursor.execute(check_sql, (file_path, chunk_content))
-            if self.cursor.fetchone():
-                return False
-            
-            insert_sql = f"""
-            INSERT INTO {MO_TABLE} (file_path, chunk_content, embedding) 
-            VALUES (%s, %s, %s)
+            SELECT id FROM {self.table} 
+            WHERE file_path = %s AND content_hash = %s
             """
-            self.cursor.execute(insert_sql, (file_path, chunk_content, str(embedding)))
+            with self._cursor() as cursor:
+                cursor.execute(check_sql, (file_path, chunk_hash))
+                if cursor.fetchone():
+                    return False
+                try:
+                    cursor.execute(
+                        self._insert_sql(),
+                        (file_path, chunk_content, self._encode_embedding(embedding), chunk_hash)
+                        + self._metadata_values(metadata)
+                    )
+                except pymysql.err.IntegrityError:
+                    # Stored concurrently by another writer; the unique index kept one copy
+                    return False
+                chunk_id = cursor.lastrowid
+                self._store_tags(cursor, [(tag, chunk_id) for tag in (metadata or {}).get('tags') or []])
+                self.lexical_index.add(chunk_id, chunk_content, file_path)
             return True
         except Exception as e:
             print(f"Failed to store document: {e}")
             return False
 
-    def retrieve_similar(self, query_embedding: List[float], top_k: int = 5) -> List[Dict]:
-        """Retrieve similar documents using cosine similarity"""
+    def store_documents(self, documents: List[Dict]) -> int:
+        """Bulk insert chunks with one duplicate lookup and one executemany"""
+        if not documents:
+            return 0
         try:
-            # 首先获取所有必要的数据
-            query_sql = f"""
-            SELECT 
-                file_path, 
-                chunk_content,
-                embedding  
-            FROM {MO_TABLE}
+            file_paths = sorted({doc['file_path'] for doc in documents})
+            placeholders = ', '.join(['%s'] * len(file_paths))
+            # Index-only lookup on (file_path, content_hash); chunk text is never compared
+            check_sql = f"""
+            SELECT file_path, content_hash FROM {self.table}
+            WHERE file_path IN ({placeholders})
             """
-            self.cursor.execute(query_sql)
-            
-            # 计算余弦相似度并排序
-            results = []
-            query_embedding = np.array(query_embedding)
-            query_norm = np.linalg.norm(query_embedding)
-            
-            for file_path, content, embedding_str in self.cursor.fetchall():
-                # 将字符串形式的embedding转换回向量
-                doc_embedding = np.array(eval(embedding_str))
-                doc_norm = np.linalg.norm(doc_embedding)
-                
-                if query_norm == 0 or doc_norm == 0:
-                    similarity = 0
-                else:
-                    similarity = np.dot(query_embedding, doc_embedding) / (query_norm * doc_norm)
-                
-                results.append({
+            conflict = False
+            with self._cursor() as cursor:
+                cursor.execute(check_sql, file_paths)
+                existing = set(cursor.fetchall())
+
+                rows = []
+                new_docs = {}
+                for doc in documents:
+                    key = (doc['file_path'], content_hash(doc['chunk_content']))
+                    if key in existing:
+                        continue
+                    existing.add(key)
+                    rows.append((doc['file_path'], doc['chunk_content'], self._encode_embedding(doc['embedding']),
+                                 key[1]) + self._metadata_values(doc.get('metadata')))
+                    new_docs[key] = doc
+
+                if rows:
+                    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {self.table}")
+                    last_id = cursor.fetchone()[0]
+                    # pymysql splits a large executemany into several multi-row INSERTs; one
+                    # transaction keeps a conflict in a later statement from leaving the earlier
+                    # ones committed without their tags
+                    conn = cursor.connection
+                    conn.begin()
+                    try:
+                        cursor.executemany(self._insert_sql(), rows)
+                        lexical_rows = self._index_new_rows(cursor, last_id, file_paths, new_docs)
+                        conn.commit()
+                    except pymysql.err.IntegrityError:
+                        conn.rollback()
+                        conflict = True
+                    except BaseException:
+                        conn.rollback()
+                        raise
+                    else:
+                        self.lexical_index.add_many(lexical_rows)
+            if conflict:
+                # Another writer stored some of these chunks meanwhile; insert one by one
+                return sum(
+                    self.store_document(doc['file_path'], doc['chunk_content'],
+                                        doc['embedding'], doc.get('metadata'))
+                    for doc in new_docs.values()
+                )
+            return len(rows)
+        except Exception as e:
+            print(f"Failed to store documents: {e}")
+            raise
+
+    def _index_new_rows(self, cursor, last_id: int, file_paths: List[str], new_docs: Dict) -> List[tuple]:
+        """Write the tag rows of the rows just inserted and return their lexical index entries"""
+        placeholders = ', '.join(['%s'] * len(file_paths))
+        # AUTO_INCREMENT ids are monotonic, so new rows are the ones above last_id
+        cursor.execute(
+            f"SELECT id, file_path, content_hash FROM {self.table} "
+            f"WHERE id > %s AND file_path IN ({placeholders})",
+            [last_id] + file_paths
+        )
+        new_rows = []
+        chunk_tags = []
+        for chunk_id, file_path, chunk_hash in cursor.fetchall():
+            doc = new_docs.get((file_path, chunk_hash))
+            if doc is None:
+                continue
+            new_rows.append((chunk_id, doc['chunk_content'], file_path))
+            chunk_tags.extend((tag, chunk_id) for tag in (doc.get('metadata') or {}).get('tags') or [])
+        self._store_tags(cursor, chunk_tags)
+        return new_rows
+
+    @staticmethod
+    def _encode_embedding(embedding) -> str:
+        """Serialize a vector to MatrixOne's vecf32 text literal
+
+        9 significant digits round-trip float32 exactly and keep the literal
+        about 40% shorter than Python's shortest float64 repr.
+        """
+        return '[' + ','.join(map('{:.9g}'.format, np.asarray(embedding, dtype=np.float32).tolist())) + ']'
+
+    @staticmethod
+    def _decode_embedding(value) -> np.ndarray:
+        """Decode a vecf32 column value without eval()"""
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            raw = bytes(value)
+            # 二进制形式: 直接按float32零拷贝解析
+            if len(raw) == VECTOR_DIMENSION * 4:
+                return np.frombuffer(raw, dtype=np.float32)
+            value = raw.decode('utf-8')
+        return np.fromstring(value.strip().strip('[]'), dtype=np.float32, sep=',')
+
+    def _score(self, distance: float) -> float:
+        """Convert a database distance to a cosine similarity score"""
+        if self.metric == 'l2':
+            # 对于归一化向量: ||a-b||^2 = 2 - 2cos
+            return 1.0 - float(distance) ** 2 / 2.0
+        return 1.0 - float(distance)
+
+    def _retrieve_in_database(self, query_embedding: List[float], top_k: int,
+                              where: str = "", params: tuple = ()) -> List[Dict]:
+        """ORDER BY distance LIMIT k inside MatrixOne, using the IVF index"""
+        distance_fn = self.DISTANCE_FUNCTIONS[self.metric]
+        query_sql = f"""
+        SELECT 
+            id,
+            file_path,
+            chunk_content,
+            {distance_fn}(embedding, %s) AS distance
+        FROM {self.table}
+        {where}
+        ORDER BY distance ASC
+        LIMIT %s
+        """
+        with self._cursor() as cursor:
+            cursor.execute(query_sql, (self._encode_embedding(query_embedding),) + tuple(params) + (int(top_k),))
+            rows = cursor.fetchall()
+        return [
+            {
+                'text': content,
+                'metadata': {'source': file_path, 'chunk_id': chunk_id},
+                'score': self._score(distance)
+            }
+            for chunk_id, file_path, content, distance in rows
+        ]
+
+    def _retrieve_in_client(self, query_embedding: List[float], top_k: int,
+                            fetch_size: int = 5000, where: str = "",
+                            params: tuple = ()) -> List[Dict]:
+        """Fallback: stream rows and score them with one matmul per batch"""
+        return self._retrieve_in_client_batch([query_embedding], top_k, fetch_size, where, params)[0]
+
+    def _retrieve_in_client_batch(self, query_embeddings: List[List[float]], top_k: int,
+                                  fetch_size: int = 5000, where: str = "",
+                                  params: tuple = ()) -> List[List[Dict]]:
+        """Stream the rows once and score every query against each fetched batch"""
+        query_sql = f"""
+        SELECT 
+            id,
+            file_path, 
+            chunk_content,
+            embedding  
+        FROM {self.table}
+        {where}
+        """
+        queries = VectorIndex.normalize(np.asarray(query_embeddings, dtype=np.float32))
+
+        best_scores = [np.empty(0, dtype=np.float32) for _ in range(len(queries))]
+        best_rows = [[] for _ in range(len(queries))]
+        with self._cursor() as cursor:
+            cursor.execute(query_sql, params)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                matrix = np.vstack([self._decode_embedding(row[3]) for row in rows])
+                norms = np.linalg.norm(matrix, axis=1)
+                norms[norms == 0] = 1.0
+                batch_scores = (queries @ matrix.T) / norms
+                batch_rows = [row[:3] for row in rows]
+
+                # 合并当前批次与历史top_k，避免保留全部结果
+                for i, row_scores in enumerate(batch_scores):
+                    scores = np.concatenate([best_scores[i], row_scores])
+                    candidates = best_rows[i] + batch_rows
+                    keep = VectorIndex._top_k(scores, top_k)
+                    best_scores[i] = scores[keep]
+                    best_rows[i] = [candidates[j] for j in keep]
+
+        return [
+            [
+                {
                     'text': content,
-                    'metadata': {'source': file_path},
-                    'score': float(similarity)
-                })
-            
-            # 按相似度排序并返回top_k个结果
-            results.sort(key=lambda x: x['score'], reverse=True)
-            return results[:top_k]
-            
+                    'metadata': {'source': file_path, 'chunk_id': chunk_id},
+                    'score': float(score)
+                }
+                for (chunk_id, file_path, content), score in zip(rows, scores.tolist())
+            ]
+            for rows, scores in zip(best_rows, best_scores)
+        ]
+
+    def _union_batch(self, branches: List[tuple], group_size: int = 32) -> List[List[Dict]]:
+        """Run per-query SELECTs as UNION ALL statements of up to ``group_size`` branches
+
+        Each branch is ``(sql, args)`` selecting id, file_path, chunk_content
+        and distance; results come back grouped by branch, best first.
+        """
+        results = [[] for _ in branches]
+        with self._cursor() as cursor:
+            for start in range(0, len(branches), group_size):
+                group = branches[start:start + group_size]
+                sql = "\nUNION ALL\n".join(
+                    f"(SELECT %s AS query_no, ranked.* FROM ({branch_sql}) AS ranked)"
+                    for branch_sql, _ in group
+                )
+                args = []
+                for offset, (_, branch_args) in enumerate(group):
+                    args.append(start + offset)
+                    args.extend(branch_args)
+                cursor.execute(sql, args)
+                for query_no, chunk_id, file_path, content, distance in cursor.fetchall():
+                    results[query_no].append({
+                        'text': content,
+                        'metadata': {'source': file_path, 'chunk_id': chunk_id},
+                        'score': self._score(distance)
+                    })
+        for docs in results:
+            docs.sort(key=lambda doc: doc['score'], reverse=True)
+        return results
+
+    @classmethod
+    def _unsupported(cls, error: Exception) -> bool:
+        """Whether ``error`` says the server lacks the SQL used for in-database search
+
+        Only these errors switch to client search; pool timeouts, dropped
+        connections and lock waits are transient and are re-raised.
+        """
+        if not isinstance(error, (pymysql.err.ProgrammingError, pymysql.err.OperationalError,
+                                  pymysql.err.InternalError, pymysql.err.NotSupportedError)):
+            return False
+        code = error.args[0] if error.args and isinstance(error.args[0], int) else None
+        return code in cls.UNSUPPORTED_ERROR_CODES or 'not supported' in str(error).lower()
+
+    def score_candidates(self, query_embedding: List[float], chunk_ids: List,
+                         filters: Optional[MetadataFilter] = None) -> List[Dict]:
+        """Dense-score only the lexical candidates with a primary-key lookup"""
+        if not chunk_ids:
+            return []
+        placeholders = ', '.join(['%s'] * len(chunk_ids))
+        clauses, filter_params = self._filter_clauses(filters)
+        where = ' AND '.join([f"id IN ({placeholders})"] + clauses)
+        where = f"WHERE {where}"
+        params = list(chunk_ids) + filter_params
+        if self.search_mode == 'database':
+            distance_fn = self.DISTANCE_FUNCTIONS[self.metric]
+            query_sql = f"""
+            SELECT id, file_path, chunk_content, {distance_fn}(embedding, %s) AS distance
+            FROM {self.table}
+            {where}
+            """
+            try:
+                with self._cursor() as cursor:
+                    cursor.execute(query_sql, [self._encode_embedding(query_embedding)] + params)
+                    rows = cursor.fetchall()
+                return [
+                    {
+                        'text': content,
+                        'metadata': {'source': file_path, 'chunk_id': chunk_id},
+                        'score': self._score(distance)
+                    }
+                    for chunk_id, file_path, content, distance in rows
+                ]
+            except Exception as e:
+                if not self._unsupported(e):
+                    raise
+                print(f"Warning: In-database candidate scoring is not supported, falling back to client search: {e}")
+                self.search_mode = 'client'
+        try:
+            return self._retrieve_in_client(query_embedding, len(chunk_ids), where=where,
+                                            params=tuple(params))
+        except Exception as e:
+            print(f"Failed to score candidate documents: {e}")
+            return []
+
+    def get_chunk_metadata(self, chunk_ids: List) -> Dict:
+        """One primary-key lookup for the metadata columns used by the reranker"""
+        if not chunk_ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(chunk_ids))
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(
+                    f"SELECT id, file_type, is_title, heading, doc_date FROM {self.table} WHERE id IN ({placeholders})",
+                    list(chunk_ids)
+                )
+                rows = cursor.fetchall()
+        except Exception as e:
+            print(f"Failed to look up chunk metadata: {e}")
+            return {}
+        return {
+            chunk_id: {
+                'file_type': file_type,
+                'is_title': bool(is_title),
+                'heading': heading,
+                'doc_date': doc_date.strftime(DATE_FORMAT) if isinstance(doc_date, datetime) else doc_date
+            }
+            for chunk_id, file_type, is_title, heading, doc_date in rows
+        }
+
+    def retrieve_similar(self, query_embedding: List[float], top_k: int = 5,
+                         filters: Optional[MetadataFilter] = None) -> List[Dict]:
+        """Retrieve similar documents using cosine similarity
+
+        Filter conditions go into the WHERE clause, so the indexed metadata
+        columns prune rows before any distance is computed.
+        """
+        clauses, params = self._filter_clauses(filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        if self.search_mode == 'database':
+            try:
+                return self._retrieve_in_database(query_embedding, top_k, where, tuple(params))
+            except Exception as e:
+                # 向量函数不可用时降级为客户端检索，后续请求不再重试；其他错误是暂时的，直接抛出
+                if not self._unsupported(e):
+                    raise
+                print(f"Warning: In-database vector search is not supported, falling back to client search: {e}")
+                self.search_mode = 'client'
+        try:
+            return self._retrieve_in_client(query_embedding, top_k, where=where, params=tuple(params))
         except Exception as e:
             print(f"Failed to retrieve similar documents: {e}")
             return []
 
+    def retrieve_similar_batch(self, query_embeddings: List[List[float]], top_k: int = 5,
+                               filters: Optional[MetadataFilter] = None) -> List[List[Dict]]:
+        """Batched retrieve_similar: one UNION ALL round trip per group of queries
+        in database mode, a single table scan for all queries in client mode"""
+        if not len(query_embeddings):
+            return []
+        clauses, params = self._filter_clauses(filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        if self.search_mode == 'database':
+            distance_fn = self.DISTANCE_FUNCTIONS[self.metric]
+            branch_sql = f"""
+            SELECT id, file_path, chunk_content, {distance_fn}(embedding, %s) AS distance
+            FROM {self.table}
+            {where}
+            ORDER BY distance ASC
+            LIMIT %s
+            """
+            try:
+                return self._union_batch([
+                    (branch_sql, [self._encode_embedding(query_embedding)] + list(params) + [int(top_k)])
+                    for query_embedding in query_embeddings
+                ])
+            except Exception as e:
+                # UNION 语句不可用时逐条检索
+                if not self._unsupported(e):
+                    raise
+                print(f"Warning: Batched in-database search failed, searching queries one by one: {e}")
+                return super().retrieve_similar_batch(query_embeddings, top_k, filters)
+        try:
+            return self._retrieve_in_client_batch(query_embeddings, top_k, where=where, params=tuple(params))
+        except Exception as e:
+            print(f"Failed to retrieve similar documents: {e}")
+            return [[] for _ in query_embeddings]
+
+    def score_candidates_batch(self, query_embeddings: List[List[float]], chunk_ids: List[List],
+                               filters: Optional[MetadataFilter] = None) -> List[List[Dict]]:
+        """Score each query's candidates in one round trip per group of queries"""
+        clauses, filter_params = self._filter_clauses(filters)
+        if self.search_mode == 'database':
+            distance_fn = self.DISTANCE_FUNCTIONS[self.metric]
+            branches = []
+            for query_embedding, ids in zip(query_embeddings, chunk_ids):
+                # 没有候选的查询用空条件占位，保持结果与查询一一对应
+                ids = list(ids) or [None]
+                where = ' AND '.join([f"id IN ({', '.join(['%s'] * len(ids))})"] + clauses)
+                branches.append((
+                    f"SELECT id, file_path, chunk_content, {distance_fn}(embedding, %s) AS distance "
+                    f"FROM {self.table} WHERE {where}",
+                    [self._encode_embedding(query_embedding)] + ids + filter_params
+                ))
+            try:
+                return self._union_batch(branches)
+            except Exception as e:
+                if not self._unsupported(e):
+                    raise
+                print(f"Warning: Batched candidate scoring failed, scoring queries one by one: {e}")
+                return super().score_candidates_batch(query_embeddings, chunk_ids, filters)
+
+        # Client mode: fetch the union of all candidates once and score it for every query
+        union = sorted({chunk_id for ids in chunk_ids for chunk_id in ids})
+        if not union:
+            return [[] for _ in query_embeddings]
+        where = ' AND '.join([f"id IN ({', '.join(['%s'] * len(union))})"] + clauses)
+        try:
+            ranked = self._retrieve_in_client_batch(query_embeddings, len(union), where=f"WHERE {where}",
+                                                    params=tuple(union + filter_params))
+        except Exception as e:
+            print(f"Failed to score candidate documents: {e}")
+            return [[] for _ in query_embeddings]
+        results = []
+        for docs, ids in zip(ranked, chunk_ids):
+            ids = set(ids)
+            results.append([doc for doc in docs if doc['metadata']['chunk_id'] in ids])
+        return results
+
     def close(self):
         try:
             if self.is_connected:
-                if self.cursor:
-                    self.cursor.close()
-                    self.cursor = None
+                if self.pool:
+                    self.pool.close()
                 if self.conn:
                     self.conn.close()
                     self.conn = None
@@ -150,11 +762,18 @@ class MOManager(BaseStorage):
     def delete_document(self, file_path: str) -> bool:
         """Delete all chunks and embeddings for a given file from MatrixOne"""
         try:
+            delete_tags_sql = f"""
+            DELETE FROM {self._tags_table()}
+            WHERE chunk_id IN (SELECT id FROM {self.table} WHERE file_path = %s)
+            """
             delete_sql = f"""
-            DELETE FROM {MO_TABLE} 
+            DELETE FROM {self.table} 
             WHERE file_path = %s
             """
-            self.cursor.execute(delete_sql, (file_path,))
+            with self._cursor() as cursor:
+                cursor.execute(delete_tags_sql, (file_path,))
+                cursor.execute(delete_sql, (file_path,))
+            self.lexical_index.remove_source(file_path)
             return True
         except Exception as e:
             print(f"Failed to delete document from MatrixOne: {e}")
@@ -0,0 +1,191 @@
+# src/storage/snapshot.py
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+import threading
+import numpy as np
+
+
+class SnapshotStore:
+    """Append-only on-disk snapshot of MemoryStorage
+
+    A snapshot generation consists of
+
+    - ``vectors-<gen>.f32``: raw L2-normalized float32 rows, row number == chunk id;
+    - ``chunks-<gen>.jsonl``: one ``[id, file_path, content, metadata]`` line per
+      row, plus ``{"deleted": file_path}`` tombstone lines;
+    - ``meta.json``: generation, dimension and the committed row count / sidecar
+      length, replaced atomically after every append.
+
+    Bytes past the committed lengths (a torn append) are truncated on load.
+    A full rewrite writes a new generation and then swaps ``meta.json``, so a
+    crash at any point leaves either the old or the new snapshot intact.
+    """
+
+    META_FILE = 'meta.json'
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.dimension: Optional[int] = None
+        self.rows = 0
+        self.chunks_bytes = 0
+        self.deleted_rows = 0
+
+    def _vectors_path(self, generation: int) -> Path:
+        return self.directory / f"vectors-{generation}.f32"
+
+    def _chunks_path(self, generation: int) -> Path:
+        return self.directory / f"chunks-{generation}.jsonl"
+
+    def _write_meta(self):
+        meta = {
+            'version': 1,
+            'generation': self.generation,
+            'dimension': self.dimension,
+            'rows': self.rows,
+            'chunks_bytes': self.chunks_bytes
+        }
+        meta_path = self.directory / self.META_FILE
+        tmp_path = meta_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, meta_path)
+
+    def load(self) -> Tuple[Optional[np.ndarray], Dict[int, Dict], Dict[str, List[int]]]:
+        """Open the committed snapshot
+
+        Returns ``(vectors, documents, file_ids)`` where ``vectors`` is a
+        copy-on-write ``np.memmap`` over every row (deleted ones included) or
+        None when there is no snapshot, ``documents`` maps live ids to
+        ``{'file_path', 'content', 'metadata'}`` and ``file_ids`` maps files to live ids.
+        Lines written before metadata was persisted load with empty metadata.
+        """
+        meta_path = self.directory / self.META_FILE
+        if not meta_path.exists():
+            return None, {}, {}
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.generation = meta['generation']
+        self.dimension = meta['dimension']
+        self.rows = meta['rows']
+        self.chunks_bytes = meta['chunks_bytes']
+
+        vectors_path = self._vectors_path(self.generation)
+        chunks_path = self._chunks_path(self.generation)
+        # 丢弃未提交的尾部数据
+        for path, size in ((vectors_path, self.rows * (self.dimension or 0) * 4),
+                           (chunks_path, self.chunks_bytes)):
+            if not path.exists():
+                path.touch()
+            if path.stat().st_size > size:
+                os.truncate(path, size)
+
+        documents: Dict[int, Dict] = {}
+        file_ids: Dict[str, List[int]] = {}
+        with open(chunks_path, 'rb') as f:
+            for line in f:
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    for doc_id in file_ids.pop(record['deleted'], []):
+                        documents.pop(doc_id, None)
+                    continue
+                doc_id, file_path, content = record[:3]
+                metadata = record[3] if len(record) > 3 else {}
+                documents[doc_id] = {'file_path': file_path, 'content': content, 'metadata': metadata}
+                file_ids.setdefault(file_path, []).append(doc_id)
+        self.deleted_rows = self.rows - len(documents)
+
+        if not self.rows:
+            return None, documents, file_ids
+        vectors = np.memmap(vectors_path, dtype=np.float32, mode='c',
+                            shape=(self.rows, self.dimension))
+        return vectors, documents, file_ids
+
+    def append(self, vectors: np.ndarray, records: List[Tuple[int, str, str, Dict]]):
+        """Append normalized rows and their ``(id, file_path, content, metadata)`` records
+
+        Ids must continue the row numbering of the snapshot.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(records):
+            return
+        with self._lock:
+            if records[0][0] != self.rows:
+                raise ValueError(f"Snapshot expects id {self.rows}, got {records[0][0]}")
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+            lines = b''.join(
+                json.dumps(list(record), ensure_ascii=False).encode('utf-8') + b'\n'
+                for record in records
+            )
+            # Data files reach disk before meta.json counts their rows
+            with open(self._vectors_path(self.generation), 'ab') as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._append_chunks(lines)
+            self.rows += len(records)
+            self._write_meta()
+
+    def delete_file(self, file_path: str, removed: int):
+        """Record a tombstone for every chunk of ``file_path``"""
+        if not removed:
+            return
+        with self._lock:
+            line = json.dumps({'deleted': file_path}, ensure_ascii=False).encode('utf-8') + b'\n'
+            self._append_chunks(line)
+            self.deleted_rows += removed
+            self._write_meta()
+
+    def _append_chunks(self, data: bytes):
+        with open(self._chunks_path(self.generation), 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.chunks_bytes += len(data)
+
+    def needs_compaction(self) -> bool:
+        return self.deleted_rows > 1024 and self.deleted_rows > self.rows // 3
+
+    def rewrite(self, vectors: np.ndarray, documents: List[Tuple[str, str, Dict]]):
+        """Write ``vectors`` and their ``(file_path, content, metadata)`` rows as a new generation
+
+        Ids are renumbered 0..n-1 in the given order.
+        """
+        with self._lock:
+            old_generation = self.generation
+            generation = old_generation + 1
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            with open(self._vectors_path(generation), 'wb') as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            chunks_bytes = 0
+            with open(self._chunks_path(generation), 'wb') as f:
+                for doc_id, (file_path, content, metadata) in enumerate(documents):
+                    line = json.dumps([doc_id, file_path, content, metadata], ensure_ascii=False).encode('utf-8') + b'\n'
+                    f.write(line)
+                    chunks_bytes += len(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.generation = generation
+            self.rows = len(documents)
+            self.chunks_bytes = chunks_bytes
+            self.deleted_rows = 0
+            if vectors.ndim == 2 and vectors.shape[0]:
+                self.dimension = vectors.shape[1]
+            self._write_meta()
+
+            for path in (self._vectors_path(old_generation), self._chunks_path(old_generation)):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,237 @@
+# src/storage/vector_codec.py
+
+from typing import Dict, Type
+import numpy as np
+
+
+class VectorCodec:
+    """Encodes L2-normalized float32 vectors into fixed-width code rows
+
+    Subclasses define the code dtype and width. ``scores`` computes inner
+    products against a query directly on the codes, block by block, so the
+    full float32 matrix is never materialized. ``scores_batch`` does the same
+    for many queries with one matrix-matrix product per block.
+    """
+
+    name = 'base'
+    lossy = True
+    dtype = np.float32
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+    @property
+    def code_size(self) -> int:
+        """Width of one code row, in elements of ``dtype``"""
+        return self.dimension
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.code_size * np.dtype(self.dtype).itemsize
+
+    @property
+    def is_trained(self) -> bool:
+        return True
+
+    def train(self, sample: np.ndarray):
+        pass
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def _block_scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        return self.decode(codes) @ query
+
+    def scores(self, codes: np.ndarray, query: np.ndarray, block: int = 16384) -> np.ndarray:
+        """Approximate inner products of every code row with ``query``"""
+        if codes.shape[0] <= block:
+            return self._block_scores(codes, query)
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], block):
+            out[start:start + block] = self._block_scores(codes[start:start + block], query)
+        return out
+
+    def _block_scores_batch(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        return queries @ self.decode(codes).T
+
+    def scores_batch(self, codes: np.ndarray, queries: np.ndarray, block: int = 16384) -> np.ndarray:
+        """Inner products of every query (rows of ``queries``) with every code row; shape (q, n)"""
+        if codes.shape[0] <= block:
+            return self._block_scores_batch(codes, queries)
+        out = np.empty((queries.shape[0], codes.shape[0]), dtype=np.float32)
+        for start in range(0, codes.shape[0], block):
+            out[:, start:start + block] = self._block_scores_batch(codes[start:start + block], queries)
+        return out
+
+
+class Float32Codec(VectorCodec):
+    """No compression; 4 bytes per value"""
+
+    name = 'float32'
+    lossy = False
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.asarray(vectors, dtype=np.float32)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes
+
+    def scores(self, codes: np.ndarray, query: np.ndarray, block: int = 16384) -> np.ndarray:
+        return codes @ query
+
+    def scores_batch(self, codes: np.ndarray, queries: np.ndarray, block: int = 16384) -> np.ndarray:
+        return queries @ codes.T
+
+
+class Float16Codec(VectorCodec):
+    """Half precision; 2 bytes per value, negligible recall loss on normalized vectors"""
+
+    name = 'float16'
+    dtype = np.float16
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.asarray(vectors, dtype=np.float16)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32)
+
+
+class Int8Codec(VectorCodec):
+    """Symmetric scalar quantization with a per-vector scale
+
+    每行存储 dimension 个 int8 量化值，末尾 4 字节为该向量的 float32 缩放系数，
+    因此无需训练，也不受数据分布漂移影响。
+    """
+
+    name = 'int8'
+    dtype = np.int8
+
+    @property
+    def code_size(self) -> int:
+        return self.dimension + 4
+
+    def _scales(self, codes: np.ndarray) -> np.ndarray:
+        return np.ascontiguousarray(codes[:, self.dimension:]).view(np.float32).ravel()
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.empty((vectors.shape[0], self.code_size), dtype=np.int8)
+        codes[:, :self.dimension] = np.clip(np.rint(vectors / scales[:, None]), -127, 127)
+        codes[:, self.dimension:] = scales.astype(np.float32).view(np.int8).reshape(-1, 4)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes[:, :self.dimension].astype(np.float32) * self._scales(codes)[:, None]
+
+    def _block_scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        return (codes[:, :self.dimension].astype(np.float32) @ query) * self._scales(codes)
+
+    def _block_scores_batch(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        return (queries @ codes[:, :self.dimension].astype(np.float32).T) * self._scales(codes)
+
+
+class PQCodec(VectorCodec):
+    """Product quantization: ``n_subspaces`` bytes per vector
+
+    向量被切分为 n_subspaces 段，每段用 256 个聚类中心之一的编号表示。
+    检索时先计算查询向量与各段中心的内积查找表，再按编码查表求和。
+    """
+
+    name = 'pq'
+    dtype = np.uint8
+
+    def __init__(self, dimension: int, n_subspaces: int = 64, n_centroids: int = 256):
+        super().__init__(dimension)
+        if dimension % n_subspaces:
+            raise ValueError(f"Dimension {dimension} is not divisible by {n_subspaces} subspaces")
+        self.n_subspaces = n_subspaces
+        self.n_centroids = n_centroids
+        self.sub_dim = dimension // n_subspaces
+        self.centroids = None            # (n_subspaces, n_centroids, sub_dim) float32
+
+    @property
+    def code_size(self) -> int:
+        return self.n_subspaces
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """(n, dim) -> (n_subspaces, n, sub_dim)"""
+        return vectors.reshape(vectors.shape[0], self.n_subspaces, self.sub_dim).transpose(1, 0, 2)
+
+    def train(self, sample: np.ndarray, iterations: int = 10, seed: int = 0):
+        sample = np.asarray(sample, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        k = min(self.n_centroids, sample.shape[0])
+        centroids = np.zeros((self.n_subspaces, self.n_centroids, self.sub_dim), dtype=np.float32)
+        for sub, part in enumerate(self._split(sample)):
+            part = np.ascontiguousarray(part)
+            centers = part[rng.choice(part.shape[0], k, replace=False)].copy()
+            for _ in range(iterations):
+                labels = self._nearest(part, centers)
+                counts = np.bincount(labels, minlength=k)
+                sums = np.stack([
+                    np.bincount(labels, weights=part[:, d], minlength=k) for d in range(self.sub_dim)
+                ], axis=1).astype(np.float32)
+                empty = counts == 0
+                # 空簇重新随机选点
+                if empty.any():
+                    sums[empty] = part[rng.choice(part.shape[0], int(empty.sum()))]
+                    counts[empty] = 1
+                centers = (sums / counts[:, None]).astype(np.float32)
+            centroids[sub, :k] = centers
+            # 样本不足 256 时，多余的中心复制已有中心，编码时不会被选中
+            if k < self.n_centroids:
+                centroids[sub, k:] = centers[0]
+        self.centroids = centroids
+
+    @staticmethod
+    def _nearest(part: np.ndarray, centers: np.ndarray) -> np.ndarray:
+        # argmin ||x - c||^2 = argmax (2 x·c - ||c||^2)
+        return np.argmax(part @ (2 * centers.T) - (centers ** 2).sum(axis=1), axis=1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            raise RuntimeError("PQCodec must be trained before encoding")
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((vectors.shape[0], self.n_subspaces), dtype=np.uint8)
+        for sub, part in enumerate(self._split(vectors)):
+            codes[:, sub] = self._nearest(part, self.centroids[sub])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.centroids[sub][codes[:, sub]] for sub in range(self.n_subspaces)]
+        return np.concatenate(parts, axis=1)
+
+    def _block_scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        table = np.einsum('skd,sd->sk', self.centroids, query.reshape(self.n_subspaces, self.sub_dim))
+        return table[np.arange(self.n_subspaces), codes].sum(axis=1)
+
+    def _block_scores_batch(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        # 每个查询一张查找表: (q, n_subspaces, n_centroids)
+        tables = np.einsum('skd,qsd->qsk', self.centroids,
+                           queries.reshape(queries.shape[0], self.n_subspaces, self.sub_dim))
+        out = np.zeros((queries.shape[0], codes.shape[0]), dtype=np.float32)
+        for sub in range(self.n_subspaces):
+            out += tables[:, sub, codes[:, sub]]
+        return out
+
+
+CODECS: Dict[str, Type[VectorCodec]] = {
+    codec.name: codec for codec in (Float32Codec, Float16Codec, Int8Codec, PQCodec)
+}
+
+
+def make_codec(name: str, dimension: int, **kwargs) -> VectorCodec:
+    if name not in CODECS:
+        raise ValueError(f"Unsupported vector codec: {name}")
+    if name == 'pq':
+        return PQCodec(dimension, **kwargs)
+    return CODECS[name](dimension)
@@ -0,0 +1,495 @@
+# src/storage/vector_index.py
+
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import threading
+import numpy as np
+from config.config import (
+    ANN_MIN_SIZE, IVF_LISTS, IVF_PROBES, VECTOR_CODEC, VECTOR_RERANK, PQ_SUBSPACES, CODEC_TRAIN_SIZE
+)
+from .vector_codec import Float32Codec, VectorCodec, make_codec
+
+
+class ReadWriteLock:
+    """Many concurrent readers or one writer
+
+    Writers are preferred: once a writer is waiting, new readers queue behind
+    it, so a steady query load cannot starve ingestion. Read sections must not
+    nest, or a waiting writer would deadlock them.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class VectorIndex:
+    """In-process vector index backed by a contiguous matrix of encoded rows
+
+    Rows are L2-normalized on insert so that cosine similarity is a single
+    matrix-vector product. Above ``ann_min_size`` live rows the index switches
+    to an IVF (inverted file) approximate search written in NumPy.
+
+    ``codec`` selects the row encoding (float32, float16, int8 or pq). With a
+    lossy codec and ``rerank > 0`` the index also keeps float32 originals and
+    re-scores the best ``top_k * rerank`` candidates exactly. Codecs that need
+    training (pq) store float32 rows until ``codec_train_size`` rows exist.
+    """
+
+    def __init__(
+        self,
+        dimension: Optional[int] = None,
+        ann_min_size: int = ANN_MIN_SIZE,
+        n_lists: int = IVF_LISTS,
+        n_probe: int = IVF_PROBES,
+        initial_capacity: int = 1024,
+        codec: str = VECTOR_CODEC,
+        rerank: int = VECTOR_RERANK,
+        codec_train_size: int = CODEC_TRAIN_SIZE
+    ):
+        self.dimension = dimension
+        self.ann_min_size = ann_min_size
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self._initial_capacity = initial_capacity
+        self.codec_name = codec
+        self.rerank = rerank
+        self.codec_train_size = codec_train_size
+
+        # Codec state
+        self.codec: Optional[VectorCodec] = None           # encoding of _matrix rows
+        self._pending_codec: Optional[VectorCodec] = None  # target codec awaiting training
+        self._originals = None           # (capacity, dim) float32, kept for re-ranking
+
+        self._matrix = None              # (capacity, code_size) codec.dtype
+        self._ids = None                 # (capacity,) int64, row -> id
+        self._alive = None               # (capacity,) bool tombstones
+        self._size = 0                   # number of used rows
+        self._deleted = 0                # number of tombstoned rows
+        self._next_id = 0
+        self._id_to_row: Dict[int, int] = {}
+        self._file_ids: Dict[str, List[int]] = {}
+
+        # IVF state
+        self._centroids = None           # (n_lists, dim) float32
+        self._assignments = None         # (capacity,) int32, row -> list
+        self._lists: List[np.ndarray] = []
+        self._trained_size = 0
+
+        # Searches run concurrently; mutations are exclusive
+        self.lock = ReadWriteLock()
+
+    def __len__(self) -> int:
+        return self._size - self._deleted
+
+    @property
+    def is_approximate(self) -> bool:
+        return self._centroids is not None
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by vector rows (codes plus re-ranking originals)"""
+        total = self._matrix.nbytes if self._matrix is not None else 0
+        if self._originals is not None:
+            total += self._originals.nbytes
+        return total
+
+    def _allocate(self, dimension: int, capacity: int):
+        self.dimension = dimension
+        kwargs = {'n_subspaces': PQ_SUBSPACES} if self.codec_name == 'pq' else {}
+        codec = make_codec(self.codec_name, dimension, **kwargs)
+        if codec.is_trained:
+            self.codec = codec
+        else:
+            self.codec = Float32Codec(dimension)
+            self._pending_codec = codec
+        if codec.lossy and self.rerank > 0:
+            self._originals = np.zeros((capacity, dimension), dtype=np.float32)
+        self._matrix = np.zeros((capacity, self.codec.code_size), dtype=self.codec.dtype)
+        self._ids = np.full(capacity, -1, dtype=np.int64)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._assignments = np.full(capacity, -1, dtype=np.int32)
+
+    def _ensure_capacity(self, extra: int):
+        needed = self._size + extra
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        # 按倍数扩容，保证追加操作的均摊复杂度为 O(1)
+        new_capacity = max(needed, capacity * 2)
+        matrix = np.zeros((new_capacity, self._matrix.shape[1]), dtype=self._matrix.dtype)
+        matrix[:self._size] = self._matrix[:self._size]
+        if self._originals is not None:
+            originals = np.zeros((new_capacity, self.dimension), dtype=np.float32)
+            originals[:self._size] = self._originals[:self._size]
+            self._originals = originals
+        ids = np.full(new_capacity, -1, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        assignments = np.full(new_capacity, -1, dtype=np.int32)
+        assignments[:self._size] = self._assignments[:self._size]
+        self._matrix, self._ids, self._alive, self._assignments = matrix, ids, alive, assignments
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows, leaving zero vectors untouched"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add(self, vectors, file_path: str) -> List[int]:
+        """Append vectors belonging to ``file_path`` and return their ids"""
+        with self.lock.write():
+            return self._add(vectors, file_path)
+
+    def _add(self, vectors, file_path: str) -> List[int]:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if vectors.shape[0] == 0:
+            return []
+        if self._matrix is None:
+            self._allocate(vectors.shape[1], max(self._initial_capacity, vectors.shape[0]))
+        elif vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected dimension {self.dimension}, got {vectors.shape[1]}")
+
+        count = vectors.shape[0]
+        self._ensure_capacity(count)
+        start, end = self._size, self._size + count
+        new_ids = np.arange(self._next_id, self._next_id + count, dtype=np.int64)
+
+        normalized = self.normalize(vectors)
+        self._matrix[start:end] = self.codec.encode(normalized)
+        if self._originals is not None:
+            self._originals[start:end] = normalized
+        self._ids[start:end] = new_ids
+        self._alive[start:end] = True
+        self._size = end
+        self._next_id += count
+
+        id_list = new_ids.tolist()
+        for offset, doc_id in enumerate(id_list):
+            self._id_to_row[doc_id] = start + offset
+        self._file_ids.setdefault(file_path, []).extend(id_list)
+
+        self._maybe_train_codec()
+        if self._centroids is not None:
+            self._assign_rows(start, end)
+        self._maybe_train()
+        return id_list
+
+    def _maybe_train_codec(self, sample_size: int = 65536, chunk: int = 65536, seed: int = 0):
+        """Train the pending codec and re-encode all rows once enough data exists"""
+        if self._pending_codec is None or len(self) < self.codec_train_size:
+            return
+        live_rows = np.flatnonzero(self._alive[:self._size])
+        if live_rows.size > sample_size:
+            live_rows = np.random.default_rng(seed).choice(live_rows, sample_size, replace=False)
+        codec = self._pending_codec
+        codec.train(self.codec.decode(self._matrix[live_rows]))
+
+        matrix = np.zeros((self._matrix.shape[0], codec.code_size), dtype=codec.dtype)
+        for offset in range(0, self._size, chunk):
+            stop = min(offset + chunk, self._size)
+            matrix[offset:stop] = codec.encode(self.codec.decode(self._matrix[offset:stop]))
+        self._matrix = matrix
+        self.codec = codec
+        self._pending_codec = None
+
+    def attach(self, vectors: np.ndarray, file_ids: Dict[str, List[int]]):
+        """Adopt pre-normalized rows whose ids are their row numbers
+
+        Rows not listed in ``file_ids`` are treated as deleted. With the float32
+        codec ``vectors`` (typically an ``np.memmap``) becomes the index matrix
+        without a copy; the first later ``add`` moves it into a growable array.
+        """
+        with self.lock.write():
+            count, dimension = vectors.shape
+            self._allocate(dimension, 0)
+            if self.codec.lossy:
+                self._matrix = np.zeros((count, self.codec.code_size), dtype=self.codec.dtype)
+                for offset in range(0, count, 65536):
+                    self._matrix[offset:offset + 65536] = self.codec.encode(vectors[offset:offset + 65536])
+            else:
+                self._matrix = vectors
+            if self._originals is not None:
+                self._originals = vectors
+            self._ids = np.arange(count, dtype=np.int64)
+            self._alive = np.zeros(count, dtype=bool)
+            self._assignments = np.full(count, -1, dtype=np.int32)
+            self._file_ids = {file_path: list(ids) for file_path, ids in file_ids.items()}
+            live = [doc_id for ids in self._file_ids.values() for doc_id in ids]
+            self._alive[live] = True
+            self._id_to_row = {doc_id: doc_id for doc_id in live}
+            self._size = count
+            self._deleted = count - len(live)
+            self._next_id = count
+            self._centroids = None
+            self._lists = []
+            self._trained_size = 0
+            self._maybe_train_codec()
+            self._maybe_train()
+
+    def delete_file(self, file_path: str) -> List[int]:
+        """Tombstone every row of ``file_path`` and return the removed ids"""
+        with self.lock.write():
+            return self._delete_file(file_path)
+
+    def _delete_file(self, file_path: str) -> List[int]:
+        doc_ids = self._file_ids.pop(file_path, [])
+        if not doc_ids:
+            return []
+        rows = [self._id_to_row.pop(doc_id) for doc_id in doc_ids]
+        self._alive[rows] = False
+        self._deleted += len(rows)
+
+        # 删除比例过高时压缩矩阵，避免检索时扫描大量无效行
+        if self._deleted > 1024 and self._deleted > self._size // 3:
+            self._compact()
+        return doc_ids
+
+    def compact(self):
+        """Drop tombstoned rows and rebuild row mappings"""
+        with self.lock.write():
+            self._compact()
+
+    def _compact(self):
+        if self._matrix is None:
+            return
+        keep = np.flatnonzero(self._alive[:self._size])
+        count = keep.size
+        self._matrix[:count] = self._matrix[keep]
+        if self._originals is not None:
+            self._originals[:count] = self._originals[keep]
+        self._ids[:count] = self._ids[keep]
+        self._assignments[:count] = self._assignments[keep]
+        self._alive[:count] = True
+        self._alive[count:] = False
+        self._ids[count:] = -1
+        self._size = count
+        self._deleted = 0
+        self._id_to_row = {int(doc_id): row for row, doc_id in enumerate(self._ids[:count])}
+        if self._centroids is not None:
+            self._rebuild_lists()
+
+    def _maybe_train(self):
+        live = len(self)
+        if live < self.ann_min_size:
+            return
+        # 数据量翻倍后重新训练聚类中心
+        if self._centroids is None or live >= 2 * self._trained_size:
+            self._train()
+
+    def train(self, iterations: int = 10, sample_size: int = 65536, seed: int = 0):
+        """Train IVF centroids with spherical k-means on a sample of live rows"""
+        with self.lock.write():
+            self._train(iterations, sample_size, seed)
+
+    def _train(self, iterations: int = 10, sample_size: int = 65536, seed: int = 0):
+        live_rows = np.flatnonzero(self._alive[:self._size])
+        if live_rows.size == 0:
+            return
+        n_lists = self.n_lists or int(np.sqrt(live_rows.size))
+        n_lists = max(1, min(n_lists, live_rows.size))
+
+        rng = np.random.default_rng(seed)
+        sample_rows = live_rows
+        if live_rows.size > sample_size:
+            sample_rows = rng.choice(live_rows, sample_size, replace=False)
+        sample = self.codec.decode(self._matrix[sample_rows])
+        centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            empty = counts == 0
+            # 空簇重新随机选点，防止中心退化
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()))]
+            centroids = self.normalize(sums)
+
+        self._centroids = centroids
+        self._trained_size = live_rows.size
+        self._assign_rows(0, self._size, rebuild=True)
+
+    def _assign_rows(self, start: int, end: int, rebuild: bool = False, chunk: int = 65536):
+        for offset in range(start, end, chunk):
+            stop = min(offset + chunk, end)
+            scores = self.codec.decode(self._matrix[offset:stop]) @ self._centroids.T
+            self._assignments[offset:stop] = np.argmax(scores, axis=1)
+        if rebuild:
+            self._rebuild_lists()
+        else:
+            new_rows = np.arange(start, end)
+            labels = self._assignments[start:end]
+            for list_id in np.unique(labels):
+                rows = new_rows[labels == list_id]
+                self._lists[list_id] = np.concatenate([self._lists[list_id], rows])
+
+    def _rebuild_lists(self):
+        labels = self._assignments[:self._size]
+        order = np.argsort(labels, kind='stable')
+        bounds = np.searchsorted(labels[order], np.arange(self._centroids.shape[0] + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(self._centroids.shape[0])]
+
+    def _candidate_rows(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        n_probe = min(n_probe, self._centroids.shape[0])
+        centroid_scores = self._centroids @ query
+        probes = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        return np.concatenate([self._lists[i] for i in probes])
+
+    def score_ids(self, query_embedding, doc_ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Cosine scores of the query against the given ids only; unknown ids are skipped"""
+        scores, ids = self.score_ids_batch([query_embedding], doc_ids)
+        return scores[0], ids
+
+    def score_ids_batch(self, query_embeddings, doc_ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Scores of every query against the given ids: ``(scores (q, m), ids (m,))``"""
+        queries = self._normalize_queries(query_embeddings)
+        with self.lock.read():
+            pairs = [(doc_id, self._id_to_row[doc_id]) for doc_id in doc_ids if doc_id in self._id_to_row]
+            if not pairs:
+                return np.empty((len(queries), 0), dtype=np.float32), np.empty(0, dtype=np.int64)
+            ids, rows = zip(*pairs)
+            rows = list(rows)
+            if self._originals is not None:
+                scores = queries @ self._originals[rows].T
+            else:
+                scores = self.codec.scores_batch(self._matrix[rows], queries)
+        return scores, np.asarray(ids, dtype=np.int64)
+
+    def _normalize_queries(self, query_embeddings) -> np.ndarray:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        return self.normalize(queries.reshape(queries.shape[0], -1))
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """Return positions of the top_k scores, highest first"""
+        if scores.size <= top_k:
+            return np.argsort(-scores, kind='stable')
+        part = np.argpartition(-scores, top_k - 1)[:top_k]
+        return part[np.argsort(-scores[part], kind='stable')]
+
+    def search(
+        self,
+        query_embedding,
+        top_k: int = 5,
+        exact: Optional[bool] = None,
+        n_probe: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(scores, ids)`` of the top_k most similar rows"""
+        with self.lock.read():
+            return self._search(query_embedding, top_k, exact, n_probe)
+
+    def search_batch(
+        self,
+        query_embeddings,
+        top_k: int = 5,
+        exact: Optional[bool] = None,
+        n_probe: Optional[int] = None,
+        max_block_elements: int = 1 << 25
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """``search`` for many queries; exact search scores them with one
+        matrix-matrix product per block of queries
+
+        Queries are processed in blocks so that the (queries, rows) score
+        matrix stays below ``max_block_elements`` float32 values. IVF search
+        probes different lists per query and falls back to one search each.
+        """
+        queries = self._normalize_queries(query_embeddings)
+        with self.lock.read():
+            if exact is None:
+                exact = self._centroids is None
+            if not exact or len(self) == 0 or top_k <= 0:
+                return [self._search(query, top_k, exact, n_probe) for query in queries]
+
+            rerank = self._originals is not None and self.codec.lossy
+            k = top_k * self.rerank if rerank else top_k
+            codes = self._matrix[:self._size]
+            block = max(1, max_block_elements // self._size)
+            results = []
+            for start in range(0, len(queries), block):
+                block_queries = queries[start:start + block]
+                scores = self.codec.scores_batch(codes, block_queries)
+                if self._deleted:
+                    scores[:, ~self._alive[:self._size]] = -np.inf
+                for query, row_scores in zip(block_queries, scores):
+                    order = self._top_k(row_scores, k)
+                    order = order[np.isfinite(row_scores[order])]
+                    if not rerank:
+                        results.append((row_scores[order], self._ids[order]))
+                        continue
+                    exact_scores = self._originals[order] @ query
+                    best = self._top_k(exact_scores, top_k)
+                    results.append((exact_scores[best], self._ids[order[best]]))
+            return results
+
+    def _search(self, query_embedding, top_k: int, exact: Optional[bool],
+                n_probe: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        if len(self) == 0 or top_k <= 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        query = self.normalize(np.asarray(query_embedding, dtype=np.float32).ravel())
+        if exact is None:
+            exact = self._centroids is None
+
+        if exact:
+            scores = self.codec.scores(self._matrix[:self._size], query)
+            if self._deleted:
+                scores[~self._alive[:self._size]] = -np.inf
+            rows = None
+        else:
+            rows = self._candidate_rows(query, n_probe or self.n_probe)
+            if self._deleted:
+                rows = rows[self._alive[rows]]
+            scores = self.codec.scores(self._matrix[rows], query)
+
+        rerank = self._originals is not None and self.codec.lossy
+        order = self._top_k(scores, top_k * self.rerank if rerank else top_k)
+        order = order[np.isfinite(scores[order])]
+        if rows is not None:
+            order_rows = rows[order]
+        else:
+            order_rows = order
+        if not rerank:
+            return scores[order], self._ids[order_rows]
+
+        # 用原始float32向量对压缩检索的候选重新精确打分
+        exact_scores = self._originals[order_rows] @ query
+        best = self._top_k(exact_scores, top_k)
+        return exact_scores[best], self._ids[order_rows[best]]
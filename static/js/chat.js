@@ -76,25 +76,99 @@ export class ChatManager {
         input.value = '';
 
         try {
-            const response = await fetch('/api/chat', {
+            const response = await fetch('/api/chat/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ message })
             });
-            const result = await response.json();
-            
-            if (result.answer) {
-                this.appendMessage('bot', result.answer, result.sources);
-            } else {
-                this.appendMessage('bot', '抱歉，处理您的问题时出现错误。');
+            if (!response.ok || !response.body) {
+                throw new Error(`HTTP ${response.status}`);
             }
+            await this.readStream(response.body);
         } catch (error) {
             this.appendMessage('bot', '抱歉，出现错误：' + error.message);
             console.error('Chat error:', error);
         }
     }
 
+    async readStream(body) {
+        // 先创建空的机器人消息，随后逐个token追加内容
+        const { messageDiv, contentDiv } = this.createMessageElement('bot');
+        let answer = '';
+        let sources = null;
+        let renderScheduled = false;
+
+        const render = () => {
+            renderScheduled = false;
+            this.renderContent(contentDiv, 'bot', answer);
+            this.container.scrollTop = this.container.scrollHeight;
+        };
+        const scheduleRender = () => {
+            // 每帧最多渲染一次，避免每个token都重新解析Markdown
+            if (!renderScheduled) {
+                renderScheduled = true;
+                requestAnimationFrame(render);
+            }
+        };
+
+        const handleEvent = (event, data) => {
+            if (event === 'sources') {
+                sources = data;
+            } else if (event === 'token') {
+                answer += data.content;
+                scheduleRender();
+            } else if (event === 'error') {
+                answer += (answer ? '\n\n' : '') + '抱歉，处理您的问题时出现错误。';
+                console.error('Chat error:', data.error);
+                scheduleRender();
+            }
+        };
+
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // SSE事件之间以空行分隔
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                });
+                if (data) handleEvent(event, JSON.parse(data));
+            }
+        }
+
+        if (!answer) {
+            answer = '抱歉，处理您的问题时出现错误。';
+        }
+        render();
+        if (sources?.length) {
+            messageDiv.appendChild(this.createSourcesElement(sources));
+            this.container.scrollTop = this.container.scrollHeight;
+        }
+    }
+
     appendMessage(type, text, sources = null) {
+        const { messageDiv, contentDiv } = this.createMessageElement(type);
+        this.renderContent(contentDiv, type, text);
+
+        if (sources?.length) {
+            messageDiv.appendChild(this.createSourcesElement(sources));
+        }
+
+        this.container.scrollTop = this.container.scrollHeight;
+    }
+
+    createMessageElement(type) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message max-w-[80%] ${type === 'user' ? 'ml-auto' : 'mr-auto'}`;
 
@@ -103,7 +177,15 @@ export class ChatManager {
             'bg-indigo-600 text-white' : 
             'bg-gray-100 text-gray-800'
         }`;
-        
+
+        messageDiv.appendChild(contentDiv);
+        this.container.appendChild(messageDiv);
+        this.container.scrollTop = this.container.scrollHeight;
+        messageDiv.classList.add('animate__animated', 'animate__fadeInUp');
+        return { messageDiv, contentDiv };
+    }
+
+    renderContent(contentDiv, type, text) {
         // 使用marked渲染Markdown
         if (typeof marked !== 'undefined') {
             // 为用户消息和机器人消息使用不同的渲染处理
@@ -126,16 +208,6 @@ export class ChatManager {
         } else {
             contentDiv.textContent = text;
         }
-        
-        messageDiv.appendChild(contentDiv);
-
-        if (sources?.length) {
-            messageDiv.appendChild(this.createSourcesElement(sources));
-        }
-
-        this.container.appendChild(messageDiv);
-        this.container.scrollTop = this.container.scrollHeight;
-        messageDiv.classList.add('animate__animated', 'animate__fadeInUp');
     }
 
     createSourcesElement(sources) {
@@ -212,6 +212,34 @@ export class FileManager {
         }
     }
 
+    async waitForJob(jobId, progressElement, interval = 1000) {
+        const stageNames = {
+            queued: '排队中',
+            parsing: '正在解析文档',
+            embedding: '正在计算向量',
+            storing: '正在写入向量数据库',
+            done: '处理完成'
+        };
+        while (true) {
+            const response = await fetch(`/api/jobs/${encodeURIComponent(jobId)}`);
+            const job = await response.json();
+            if (!response.ok) {
+                throw new Error(job.error || '查询任务状态失败');
+            }
+            if (job.status === 'completed' || job.status === 'failed') {
+                return job;
+            }
+            if (progressElement) {
+                const stage = stageNames[job.stage] || job.stage;
+                const speed = job.chunks_per_second ? `，${job.chunks_per_second} 块/秒` : '';
+                progressElement.textContent = job.chunks
+                    ? `${stage}：已解析 ${job.chunks} 块，已写入 ${job.stored} 块${speed}`
+                    : `${stage}，请稍候...`;
+            }
+            await new Promise(resolve => setTimeout(resolve, interval));
+        }
+    }
+
     async uploadFile() {
         const file = this.fileInput.files[0];
         if (!file) {
@@ -227,7 +255,7 @@ export class FileManager {
                     <div class="flex flex-col items-center space-y-4">
                         <div class="animate-spin rounded-full h-12 w-12 border-4 border-indigo-600 border-t-transparent"></div>
                         <h3 class="text-lg font-semibold text-gray-900">正在处理文档</h3>
-                        <p class="text-gray-600 text-center text-sm">正在写入向量数据库，请稍候...</p>
+                        <p id="uploadProgress" class="text-gray-600 text-center text-sm">正在上传文件，请稍候...</p>
                     </div>
                 </div>
             </div>
@@ -243,11 +271,23 @@ export class FileManager {
                 body: formData
             });
             const result = await response.json();
+            if (!response.ok) {
+                throw new Error(result.error || `HTTP ${response.status}`);
+            }
+
+            // 上传接口立即返回任务ID，轮询任务进度直到处理完成
+            let message = result.message || '上传成功';
+            if (result.job_id) {
+                const job = await this.waitForJob(result.job_id, loadingModal.querySelector('#uploadProgress'));
+                message = job.status === 'completed'
+                    ? `文件 ${job.filename} 处理完成，共写入 ${job.stored} 个文档块`
+                    : `文件 ${job.filename} 处理失败：${job.error || '未知错误'}`;
+            }
             
             // 移除加载弹窗
             document.body.removeChild(loadingModal);
             
-            alert(result.message || '上传成功');
+            alert(message);
             await this.loadFiles();
             this.fileInput.value = '';
             this.updateFileDisplay();
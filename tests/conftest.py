@@ -0,0 +1,7 @@
+# tests/conftest.py
+
+import sys
+from pathlib import Path
+
+# Tests import the application packages (config, src, benchmarks) from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
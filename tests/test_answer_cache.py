@@ -0,0 +1,103 @@
+# tests/test_answer_cache.py
+
+import numpy as np
+import pytest
+from src.rag import answer_cache as answer_cache_module
+from src.rag.answer_cache import AnswerCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache_module.time, 'time', clock.time)
+    return clock
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def doc(source, text):
+    return {'text': text, 'metadata': {'source': source}, 'score': 0.9}
+
+
+def make_cache(**kwargs):
+    options = dict(threshold=0.95, ttl=600, time_sensitive_ttl=60, time_keywords=('今天',), max_entries=10)
+    options.update(kwargs)
+    return AnswerCache(**options)
+
+
+def test_near_duplicate_question_hits(clock):
+    cache = make_cache()
+    docs = [doc('a.txt', 'alpha'), doc('b.txt', 'beta')]
+    cache.store('how to reboot', unit(1, 0, 0), docs, {'answer': 'reboot it'})
+
+    assert cache.lookup(unit(1, 0.05, 0), docs) == {'answer': 'reboot it'}
+    assert cache.lookup(unit(0, 1, 0), docs) is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_different_retrieved_chunks_miss(clock):
+    cache = make_cache()
+    cache.store('q', unit(1, 0), [doc('a.txt', 'alpha')], {'answer': 'x'})
+    assert cache.lookup(unit(1, 0), [doc('a.txt', 'alpha v2')]) is None
+    assert cache.lookup(unit(1, 0), [doc('a.txt', 'alpha'), doc('b.txt', 'beta')]) is None
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = make_cache()
+    docs = [doc('a.txt', 'alpha')]
+    cache.store('q', unit(1, 0), docs, {'answer': 'x'})
+
+    clock.now += 599
+    assert cache.lookup(unit(1, 0), docs) is not None
+    clock.now += 2
+    assert cache.lookup(unit(1, 0), docs) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_time_sensitive_questions_use_short_ttl(clock):
+    cache = make_cache()
+    docs = [doc('a.txt', 'alpha')]
+    assert cache.ttl_for('今天谁值班') == 60
+    assert cache.ttl_for('谁负责核心交换机') == 600
+    cache.store('今天谁值班', unit(1, 0), docs, {'answer': 'x'})
+
+    clock.now += 61
+    assert cache.lookup(unit(1, 0), docs) is None
+
+
+def test_invalidate_sources_drops_answers_using_them(clock):
+    cache = make_cache()
+    cache.store('q1', unit(1, 0, 0), [doc('a.txt', 'alpha')], {'answer': 1})
+    cache.store('q2', unit(0, 1, 0), [doc('a.txt', 'alpha'), doc('b.txt', 'beta')], {'answer': 2})
+    cache.store('q3', unit(0, 0, 1), [doc('c.txt', 'gamma')], {'answer': 3})
+
+    assert cache.invalidate_sources([]) == 0
+    assert cache.invalidate_sources(['b.txt']) == 1
+    assert cache.lookup(unit(0, 1, 0), [doc('a.txt', 'alpha'), doc('b.txt', 'beta')]) is None
+    assert cache.lookup(unit(1, 0, 0), [doc('a.txt', 'alpha')]) == {'answer': 1}
+
+    assert cache.invalidate_sources(['a.txt', 'c.txt']) == 2
+    assert cache.stats()['entries'] == 0
+
+
+def test_max_entries_evicts_oldest(clock):
+    cache = make_cache(max_entries=2)
+    docs = [doc('a.txt', 'alpha')]
+    cache.store('q1', unit(1, 0, 0), docs, {'answer': 1})
+    cache.store('q2', unit(0, 1, 0), docs, {'answer': 2})
+    cache.store('q3', unit(0, 0, 1), docs, {'answer': 3})
+
+    assert cache.lookup(unit(1, 0, 0), docs) is None
+    assert cache.lookup(unit(0, 0, 1), docs) == {'answer': 3}
@@ -0,0 +1,83 @@
+# tests/test_chunker.py
+
+from src.processors.chunker import LayoutChunker, estimate_tokens, split_sentences
+
+
+def block(content, position, is_title=False, page_num=1):
+    return {
+        'content': content,
+        'metadata': {
+            'source': 'doc.pdf',
+            'block_type': 'title' if is_title else 'text',
+            'page_num': page_num,
+            'position': position,
+            'is_title': is_title
+        }
+    }
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('值班表') == 3
+    assert estimate_tokens('abcdefgh') == 2
+    assert estimate_tokens('重启 router') == 2 + 2
+
+
+def test_split_sentences_respects_limit():
+    text = '第一句话。' * 30
+    pieces = split_sentences(text, max_tokens=20)
+    assert ''.join(pieces) == text
+    assert all(estimate_tokens(piece) <= 20 for piece in pieces)
+
+
+def test_split_sentences_hard_cuts_long_sentence():
+    text = '无标点的超长句子' * 20
+    pieces = split_sentences(text, max_tokens=16)
+    assert ''.join(pieces) == text
+    assert all(estimate_tokens(piece) <= 16 for piece in pieces)
+
+
+def test_sections_do_not_cross_headings():
+    blocks = [
+        block('网络故障处理', 0, is_title=True),
+        block('检查交换机端口状态。', 1),
+        block('确认光模块告警。', 2),
+        block('数据库故障处理', 3, is_title=True),
+        block('切换到备库。', 4),
+    ]
+    documents = LayoutChunker(target_tokens=400, overlap_tokens=0).chunk(blocks)
+    assert [doc.page_content for doc in documents] == [
+        '网络故障处理\n检查交换机端口状态。\n确认光模块告警。',
+        '数据库故障处理\n切换到备库。',
+    ]
+    assert documents[0].metadata['heading'] == '网络故障处理'
+    assert documents[0].metadata['block_count'] == 2
+    assert documents[0].metadata['position'] == 1
+    assert documents[0].metadata['end_position'] == 2
+    assert documents[1].metadata['block_type'] == 'chunk'
+
+
+def test_blocks_are_ordered_by_page_and_position():
+    blocks = [block('第二段。', 0, page_num=2), block('第一段。', 1, page_num=1)]
+    documents = LayoutChunker().chunk(blocks)
+    assert documents[0].page_content == '第一段。\n第二段。'
+
+
+def test_long_sections_split_with_overlap():
+    blocks = [block('标题', 0, is_title=True)] + [block(f'第{i:02d}条操作说明。', i) for i in range(1, 21)]
+    chunker = LayoutChunker(target_tokens=40, overlap_tokens=10)
+    documents = chunker.chunk(blocks)
+    assert len(documents) > 1
+    for doc in documents:
+        assert doc.page_content.startswith('标题\n')
+        assert estimate_tokens(doc.page_content) <= 40
+    # 上一块的最后一个解析块作为重叠出现在下一块正文的开头
+    for previous, current in zip(documents, documents[1:]):
+        assert previous.page_content.splitlines()[-1] == current.page_content.splitlines()[1]
+    bodies = '\n'.join(doc.page_content for doc in documents)
+    assert all(f'第{i:02d}条' in bodies for i in range(1, 21))
+
+
+def test_title_only_document_keeps_heading():
+    documents = LayoutChunker().chunk([block('空白文档', 0, is_title=True)])
+    assert [doc.page_content for doc in documents] == ['空白文档']
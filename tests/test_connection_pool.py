@@ -0,0 +1,153 @@
+# tests/test_connection_pool.py
+
+import threading
+import time
+import pytest
+from src.storage.connection_pool import ConnectionPool
+
+
+class BrokenConnection(Exception):
+    pass
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Factory:
+    def __init__(self):
+        self.created = []
+
+    def __call__(self):
+        conn = FakeConnection(len(self.created))
+        self.created.append(conn)
+        return conn
+
+
+def make_pool(max_size=2, timeout=5.0):
+    factory = Factory()
+    return ConnectionPool(factory, max_size=max_size, timeout=timeout,
+                          broken_errors=(BrokenConnection,)), factory
+
+
+def test_connections_are_reused():
+    pool, factory = make_pool()
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    assert len(factory.created) == 1
+    assert pool.size == 1
+
+
+def test_capacity_is_bounded():
+    pool, factory = make_pool(max_size=3)
+    active, peak = [], []
+    lock = threading.Lock()
+
+    def worker():
+        with pool.connection() as conn:
+            with lock:
+                active.append(conn)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.remove(conn)
+
+    threads = [threading.Thread(target=worker) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) <= 3
+    assert len(factory.created) == 3 == pool.size
+
+
+def test_acquire_times_out_when_exhausted():
+    pool, _ = make_pool(max_size=1, timeout=0.2)
+    with pool.connection():
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            with pool.connection():
+                pass
+        assert 0.15 <= time.monotonic() - start < 2
+
+
+def test_broken_connection_is_discarded():
+    pool, factory = make_pool()
+    with pytest.raises(BrokenConnection):
+        with pool.connection() as conn:
+            raise BrokenConnection()
+    assert conn.closed
+    assert pool.size == 0
+    with pool.connection() as replacement:
+        assert replacement is not conn
+    # Other errors return the connection to the pool
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError()
+    assert pool.size == 1
+    assert not factory.created[-1].closed
+
+
+def test_discard_wakes_waiter():
+    pool, factory = make_pool(max_size=1, timeout=5.0)
+    holding = threading.Event()
+    result = {}
+
+    def holder():
+        try:
+            with pool.connection():
+                holding.set()
+                time.sleep(0.3)
+                raise BrokenConnection()
+        except BrokenConnection:
+            pass
+
+    def waiter():
+        holding.wait()
+        start = time.monotonic()
+        with pool.connection() as conn:
+            result['conn'] = conn
+        result['waited'] = time.monotonic() - start
+
+    threads = [threading.Thread(target=holder), threading.Thread(target=waiter)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # The waiter opens a new connection as soon as the broken one frees its slot
+    assert result['waited'] < 2
+    assert result['conn'] is factory.created[1]
+
+
+def test_failed_connect_frees_slot():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        if len(calls) == 1:
+            raise BrokenConnection('refused')
+        return FakeConnection(len(calls))
+
+    pool = ConnectionPool(factory, max_size=1, timeout=0.5)
+    with pytest.raises(BrokenConnection):
+        with pool.connection():
+            pass
+    with pool.connection() as conn:
+        assert conn.number == 2
+
+
+def test_close_discards_idle_and_returned_connections():
+    pool, factory = make_pool()
+    with pool.connection():
+        with pool.connection() as inner:
+            pass
+        pool.close()
+    assert all(conn.closed for conn in factory.created)
+    assert pool.size == 0
@@ -0,0 +1,79 @@
+# tests/test_context_builder.py
+
+from src.rag.context_builder import ContextAssembler, jaccard, shingles
+
+
+def doc(source, text, score, chunk_id=None, position=None, page_num=None):
+    metadata = {'source': source, 'chunk_id': chunk_id}
+    if position is not None:
+        metadata.update(position=position, page_num=page_num)
+    return {'text': text, 'metadata': metadata, 'score': score}
+
+
+def test_jaccard_of_shingles():
+    assert jaccard(shingles('abcdef'), shingles('abcdef')) == 1.0
+    assert jaccard(shingles('abcdef'), shingles('uvwxyz')) == 0.0
+
+
+def test_near_duplicates_keep_best_copy():
+    text = '核心交换机 sw-core-01 端口 Gi0/1 故障时联系网络组。'
+    docs = [
+        doc('x_1.pdf', text, 0.80, chunk_id=10),
+        doc('x.pdf', text, 0.85, chunk_id=1),
+        doc('y.pdf', '数据库主节点宕机时切换到备库。', 0.70, chunk_id=20),
+    ]
+    blocks = ContextAssembler().assemble(docs)
+    assert [block['metadata']['source'] for block in blocks] == ['x.pdf', 'y.pdf']
+
+
+def test_adjacent_chunk_ids_are_merged():
+    docs = [
+        doc('a.txt', '第一步：检查电源。', 0.9, chunk_id=5),
+        doc('a.txt', '第二步：检查端口。', 0.7, chunk_id=6),
+        doc('a.txt', '附录：联系人列表。', 0.6, chunk_id=9),
+        doc('b.txt', '第三步：重启设备。', 0.8, chunk_id=7),
+    ]
+    blocks = ContextAssembler().assemble(docs)
+
+    assert len(blocks) == 3
+    merged = blocks[0]
+    assert merged['text'] == '第一步：检查电源。\n第二步：检查端口。'
+    assert merged['metadata']['chunk_ids'] == [5, 6]
+    assert merged['score'] == 0.9
+    assert '_shingles' not in merged
+    # Chunk 7 is adjacent by id but belongs to another source
+    assert [block['metadata']['source'] for block in blocks[1:]] == ['b.txt', 'a.txt']
+
+
+def test_adjacency_uses_page_positions():
+    docs = [
+        doc('a.pdf', '上一页末尾的段落内容。', 0.6, chunk_id=1, position=12, page_num=1),
+        doc('a.pdf', '下一页开头的段落内容。', 0.9, chunk_id=40, position=13, page_num=2),
+        doc('a.pdf', '隔了很多段落的另一段。', 0.8, chunk_id=2, position=30, page_num=3),
+    ]
+    blocks = ContextAssembler().assemble(docs)
+    assert [block['text'] for block in blocks] == [
+        '上一页末尾的段落内容。\n下一页开头的段落内容。',
+        '隔了很多段落的另一段。',
+    ]
+
+
+def test_token_budget_and_max_chunks():
+    docs = [doc('a.txt', '长' * 100, 0.9, chunk_id=1),
+            doc('b.txt', '短文本一', 0.8, chunk_id=10),
+            doc('c.txt', '短文本二', 0.7, chunk_id=20)]
+    assembler = ContextAssembler(token_budget=50)
+    # The long chunk does not fit and is skipped in favour of shorter ones
+    assert [block['metadata']['source'] for block in assembler.assemble(docs)] == ['b.txt', 'c.txt']
+    assert len(assembler.assemble(docs, max_chunks=1)) == 1
+
+
+def test_rerank_score_takes_precedence():
+    docs = [dict(doc('a.txt', '甲方案说明', 0.9, chunk_id=1), rerank_score=0.1),
+            dict(doc('b.txt', '乙方案说明', 0.5, chunk_id=10), rerank_score=0.8)]
+    blocks = ContextAssembler().assemble(docs)
+    assert blocks[0]['metadata']['source'] == 'b.txt'
+
+
+def test_empty_input():
+    assert ContextAssembler().assemble([]) == []
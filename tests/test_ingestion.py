@@ -0,0 +1,49 @@
+# tests/test_ingestion.py
+
+import numpy as np
+from langchain.docstore.document import Document
+from src.rag.ingestion import IngestionPipeline
+from src.storage.base_storage import MemoryStorage
+
+
+class FakeEmbedder:
+    def compute_embeddings(self, texts):
+        rng = np.random.default_rng(len(texts))
+        return rng.standard_normal((len(texts), 8)).astype(np.float32)
+
+
+class FlakyStorage(MemoryStorage):
+    """写入包含 broken_source 的批次时抛出异常，模拟数据库故障"""
+
+    def __init__(self, broken_source):
+        super().__init__()
+        self.broken_source = broken_source
+
+    def store_documents(self, documents):
+        if any(doc['file_path'] == self.broken_source for doc in documents):
+            raise ConnectionError('MatrixOne unavailable')
+        return super().store_documents(documents)
+
+
+def files(*names, chunks=3):
+    for name in names:
+        yield name, [Document(page_content=f"{name} 第{i}段", metadata={'source': name}) for i in range(chunks)]
+
+
+def test_store_failures_are_reported_per_file():
+    storage = FlakyStorage('b.txt')
+    pipeline = IngestionPipeline(FakeEmbedder(), storage, batch_size=3)
+    stats = pipeline.run(files('a.txt', 'b.txt', 'c.txt'))
+
+    assert stats['failed_files'] == ['b.txt']
+    assert stats['stored'] == 6
+    assert stats['stages']['store']['failed'] == 3
+    assert {doc['file_path'] for doc in storage.documents.values()} == {'a.txt', 'c.txt'}
+
+
+def test_successful_run():
+    pipeline = IngestionPipeline(FakeEmbedder(), MemoryStorage(), batch_size=2)
+    stats = pipeline.run(files('a.txt', 'b.txt'))
+    assert stats['failed_files'] == []
+    assert stats['files'] == 2
+    assert stats['chunks'] == stats['stored'] == 6
@@ -0,0 +1,48 @@
+# tests/test_job_queue.py
+
+import threading
+from contextlib import contextmanager
+from src.rag.job_queue import JobQueue
+
+
+class BlockedCollections:
+    """CollectionManager 替身：任务在 release 之前一直停在加载集合阶段"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    @contextmanager
+    def use(self, name, create=False, wait=None):
+        self.release.wait()
+        raise RuntimeError('collection unavailable')
+        yield
+
+
+def test_concurrent_duplicate_uploads_create_one_job(tmp_path):
+    paths = []
+    for i in range(16):
+        path = tmp_path / f"runbook_{i}.txt"
+        path.write_text('核心交换机巡检步骤', encoding='utf-8')
+        paths.append(path)
+
+    collections = BlockedCollections()
+    jobs = JobQueue(collections)
+    results = []
+    barrier = threading.Barrier(len(paths))
+
+    def submit(path):
+        barrier.wait()
+        results.append(jobs.submit(str(path)))
+
+    threads = [threading.Thread(target=submit, args=(path,)) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    created = [job for job, coalesced in results if not coalesced]
+    assert len(created) == 1
+    assert {job['id'] for job, _ in results} == {created[0]['id']}
+
+    collections.release.set()
+    jobs.shutdown()
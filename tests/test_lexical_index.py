@@ -0,0 +1,98 @@
+# tests/test_lexical_index.py
+
+import numpy as np
+import pytest
+from src.storage.base_storage import BaseStorage, MemoryStorage
+from src.storage.lexical_index import LexicalIndex, tokenize
+
+
+def test_tokenize_cjk_runs_become_bigrams():
+    assert tokenize('张三值班') == ['张三', '三值', '值班']
+    assert tokenize('李') == ['李']
+
+
+def test_tokenize_keeps_host_names_whole_and_split():
+    tokens = tokenize('db-01.prod 报错 ORA-00600')
+    assert 'db-01.prod' in tokens
+    assert {'db', '01', 'prod'} <= set(tokens)
+    assert 'ora-00600' in tokens
+    assert {'ora', '00600'} <= set(tokens)
+    assert '报错' in tokens
+
+
+def test_bm25_ranks_rare_term_matches_first():
+    index = LexicalIndex()
+    index.add(1, 'db-01.prod 磁盘告警')
+    index.add(2, 'web-02.prod 磁盘告警')
+    index.add(3, '磁盘扩容流程')
+    ranked = index.search('db-01.prod 磁盘')
+    assert ranked[0][0] == 1
+    assert ranked[0][1] > ranked[1][1] > 0
+    assert {doc_id for doc_id, _ in ranked} == {1, 2, 3}
+
+
+def test_bm25_prefers_shorter_document_for_same_term_frequency():
+    index = LexicalIndex()
+    index.add('short', '交换机 Gi0/1 down')
+    index.add('long', '交换机 Gi0/1 down ' + '巡检记录 ' * 20)
+    index.add('other', '无关内容')
+    ranked = index.search('Gi0/1')
+    assert [doc_id for doc_id, _ in ranked] == ['short', 'long']
+
+
+def test_remove_source_drops_documents_from_search():
+    index = LexicalIndex()
+    index.add(1, 'ORA-00600 处理', source='a.txt')
+    index.add(2, 'ORA-00600 复盘', source='b.txt')
+    assert index.remove_source('a.txt') == 1
+    assert [doc_id for doc_id, _ in index.search('ORA-00600')] == [2]
+    assert len(index) == 1
+
+
+def test_search_batch_matches_search():
+    rng = np.random.default_rng(0)
+    words = ['db-01.prod', 'web-02.prod', '磁盘告警', '内存泄漏', 'ORA-00600', '值班', '张三', 'Gi0/1']
+    index = LexicalIndex()
+    for doc_id in range(200):
+        index.add(doc_id, ' '.join(rng.choice(words, size=6)))
+    queries = ['db-01.prod 磁盘', '张三值班', 'ORA-00600 内存泄漏', 'nothing matches', '']
+    batch = index.search_batch(queries, top_k=20)
+    for query, results in zip(queries, batch):
+        single = index.search(query, top_k=20)
+        assert [score for _, score in results] == pytest.approx([score for _, score in single])
+        # Ties may come out in either order; compare the ids per score
+        assert dict(results) == pytest.approx(dict(single))
+
+
+def test_fuse_sums_reciprocal_ranks():
+    lexical = [(2, 5.0), (1, 3.0)]
+    docs = [
+        {'metadata': {'chunk_id': 1}, 'score': 0.9},
+        {'metadata': {'chunk_id': 2}, 'score': 0.5},
+        {'metadata': {'chunk_id': 3}, 'score': 0.8},
+    ]
+    fused = BaseStorage._fuse(lexical, docs, top_k=3, rrf_k=60)
+    by_id = {doc['metadata']['chunk_id']: doc for doc in fused}
+    assert by_id[1]['rrf_score'] == pytest.approx(1 / 61 + 1 / 62)
+    assert by_id[2]['rrf_score'] == pytest.approx(1 / 63 + 1 / 61)
+    assert by_id[3]['rrf_score'] == pytest.approx(1 / 62)
+    assert by_id[3]['lexical_rank'] is None and by_id[3]['lexical_score'] == 0.0
+    assert [doc['metadata']['chunk_id'] for doc in fused] == [1, 2, 3]
+
+
+def test_retrieve_hybrid_batch_matches_single_queries():
+    storage = MemoryStorage()
+    rng = np.random.default_rng(1)
+    texts = ['db-01.prod 磁盘告警', 'web-02.prod 内存泄漏', 'ORA-00600 处理', '张三值班表', '交换机 Gi0/1 down']
+    storage.store_documents([
+        {'file_path': f'{i}.txt', 'chunk_content': text,
+         'embedding': rng.standard_normal(8).astype(np.float32).tolist()}
+        for i, text in enumerate(texts)
+    ])
+    queries = ['db-01.prod 告警', '张三', '没有命中']
+    embeddings = rng.standard_normal((len(queries), 8)).astype(np.float32).tolist()
+    batch = storage.retrieve_hybrid_batch(queries, embeddings, top_k=3)
+    for query, embedding, results in zip(queries, embeddings, batch):
+        single = storage.retrieve_hybrid(query, embedding, top_k=3)
+        assert [doc['metadata']['chunk_id'] for doc in results] == [doc['metadata']['chunk_id'] for doc in single]
+    assert 'db-01.prod 磁盘告警' in [doc['text'] for doc in batch[0]]
@@ -0,0 +1,71 @@
+# tests/test_llm_stream.py
+
+import json
+import pytest
+import requests
+from benchmarks.fake_services import FakeLLMServer, _FakeServer, _LLMHandler
+from src.llm.llm_client import LLMClient
+
+
+class _RawStreamHandler(_LLMHandler):
+    """按 service.frames 原样输出响应体，用于构造各种SSE分帧"""
+
+    def do_POST(self):
+        self.read_json()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for frame in self.service.frames:
+            self.write_chunk(frame)
+        self.write_chunk(b"")
+
+
+class RawStreamServer(_FakeServer):
+    handler_class = _RawStreamHandler
+
+    def __init__(self, frames):
+        super().__init__()
+        self.frames = frames
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/v1/chat/completions"
+
+
+def delta(content):
+    chunk = {'choices': [{'index': 0, 'delta': {'content': content}}]}
+    return json.dumps(chunk, ensure_ascii=False).encode('utf-8')
+
+
+def test_stream_yields_every_token():
+    with FakeLLMServer(answer='核心交换机已恢复。') as server:
+        client = LLMClient('key', api_url=server.url)
+        assert ''.join(client.generate_stream('问题：交换机')) == '核心交换机已恢复。'
+        assert client.generate_response('问题：交换机') == '核心交换机已恢复。'
+
+
+def test_stream_framing():
+    body = (
+        b": keep-alive\n\n"
+        b"data: " + delta('你好') + b"\n\n"
+        b"data:" + delta('，') + b"\r\n\r\n"
+        # 只有role或usage的数据帧没有正文
+        b'data: {"choices": [{"delta": {"role": "assistant"}}]}\n\n'
+        b'data: {"choices": [], "usage": {"total_tokens": 3}}\n\n'
+        b"event: message\ndata: " + delta('世界') + b"\n\n"
+        b"data: [DONE]\n\n"
+        b"data: " + delta('不应出现') + b"\n\n"
+    )
+    # 在任意位置切分响应体，包括多字节字符中间
+    frames = [body[i:i + 7] for i in range(0, len(body), 7)]
+    with RawStreamServer(frames) as server:
+        client = LLMClient('key', api_url=server.url)
+        assert list(client.generate_stream('prompt')) == ['你好', '，', '世界']
+
+
+def test_stream_read_timeout():
+    with FakeLLMServer(first_token_latency=1.0) as server:
+        client = LLMClient('key', api_url=server.url, timeout=(1, 0.2))
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            list(client.generate_stream('prompt'))
@@ -0,0 +1,91 @@
+# tests/test_manifest.py
+
+import os
+from src.processors import manifest
+from src.processors.manifest import FileManifest
+
+
+def write(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def indexed(paths, manifest_path=None):
+    file_manifest = FileManifest(manifest_path)
+    for file_path in paths:
+        file_manifest.mark_indexed(file_path, 1, FileManifest.snapshot(file_path))
+    return file_manifest
+
+
+def test_plan_new_changed_removed_unchanged(tmp_path):
+    kept, edited, deleted = (write(tmp_path / name, name) for name in ('kept.txt', 'edited.txt', 'deleted.txt'))
+    file_manifest = indexed([kept, edited, deleted])
+
+    write(tmp_path / 'edited.txt', 'edited with more text')
+    os.remove(deleted)
+    added = write(tmp_path / 'added.txt', 'added')
+
+    plan = file_manifest.plan([kept, edited, added], tmp_path)
+    assert plan == {'new': [added], 'changed': [edited], 'removed': [deleted], 'unchanged': [kept]}
+
+
+def test_touched_file_with_same_content_is_unchanged(tmp_path):
+    file_path = write(tmp_path / 'a.txt', 'same')
+    file_manifest = indexed([file_path])
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+
+    assert file_manifest.plan([file_path])['unchanged'] == [file_path]
+    assert file_manifest.entries[file_path]['mtime'] == os.stat(file_path).st_mtime
+
+
+def test_same_size_edit_is_changed(tmp_path):
+    file_path = write(tmp_path / 'a.txt', 'aaaa')
+    file_manifest = indexed([file_path])
+    stat = os.stat(file_path)
+    write(tmp_path / 'a.txt', 'bbbb')
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+
+    assert file_manifest.plan([file_path])['changed'] == [file_path]
+
+
+def test_edit_during_indexing_is_reindexed_next_time(tmp_path):
+    file_path = write(tmp_path / 'a.txt', 'parsed version')
+    snapshot = FileManifest.snapshot(file_path)
+    # The file is rewritten after parsing but before the manifest is updated
+    stat = os.stat(file_path)
+    write(tmp_path / 'a.txt', 'edited version')
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+
+    file_manifest = FileManifest()
+    file_manifest.mark_indexed(file_path, 1, snapshot)
+    assert file_manifest.plan([file_path])['changed'] == [file_path]
+
+
+def test_mark_indexed_uses_snapshot_without_rehashing(tmp_path, monkeypatch):
+    file_path = write(tmp_path / 'a.txt', 'content')
+    snapshot = FileManifest.snapshot(file_path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('file read again after parsing')
+
+    monkeypatch.setattr(manifest, 'file_hash', fail)
+    monkeypatch.setattr(manifest.os, 'stat', fail)
+
+    file_manifest = FileManifest()
+    file_manifest.mark_indexed(file_path, 3, snapshot)
+    assert file_manifest.entries[file_path] == dict(snapshot, chunks=3)
+
+
+def test_snapshot_of_missing_file_is_none(tmp_path):
+    assert FileManifest.snapshot(str(tmp_path / 'missing.txt')) is None
+
+
+def test_save_and_load_round_trip(tmp_path):
+    file_path = write(tmp_path / 'a.txt', 'content')
+    manifest_path = tmp_path / 'state' / 'manifest.json'
+    indexed([file_path], manifest_path).save()
+
+    reloaded = FileManifest(manifest_path)
+    assert file_path in reloaded
+    assert reloaded.plan([file_path])['unchanged'] == [file_path]
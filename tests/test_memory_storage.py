@@ -0,0 +1,62 @@
+# tests/test_memory_storage.py
+
+import threading
+import numpy as np
+from src.storage.base_storage import MemoryStorage
+from src.storage.metadata import MetadataFilter
+
+
+def chunks(file_path, round_number, count=20, dimension=8):
+    vectors = np.random.default_rng(round_number).standard_normal((count, dimension)).astype(np.float32)
+    return [
+        {'file_path': file_path, 'chunk_content': f"{file_path} round {round_number} chunk {i}",
+         'embedding': vector.tolist(), 'metadata': {'file_type': 'txt', 'tags': ['ops']}}
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def live_index_ids(storage):
+    return {doc_id for ids in storage.index._file_ids.values() for doc_id in ids}
+
+
+def test_concurrent_store_and_delete_leave_consistent_indexes():
+    storage = MemoryStorage()
+    stop = threading.Event()
+
+    def writer():
+        round_number = 0
+        while not stop.is_set():
+            round_number += 1
+            storage.store_documents(chunks('a.txt', round_number))
+
+    def deleter():
+        while not stop.is_set():
+            storage.delete_document('a.txt')
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=deleter)]
+    for thread in threads:
+        thread.start()
+    stop_timer = threading.Timer(0.5, stop.set)
+    stop_timer.start()
+    for thread in threads:
+        thread.join()
+
+    # Every index must describe exactly the chunks in documents
+    ids = set(storage.documents)
+    assert live_index_ids(storage) == ids
+    assert storage.lexical_index.doc_ids() == ids
+    assert storage.metadata_index.candidates(MetadataFilter(tags=['ops']), storage.documents) == ids
+
+    storage.delete_document('a.txt')
+    assert not storage.documents
+    assert not storage.lexical_index.doc_ids()
+    assert not storage.metadata_index.candidates(MetadataFilter(tags=['ops']), storage.documents)
+
+
+def test_duplicate_chunks_are_skipped():
+    storage = MemoryStorage()
+    assert storage.store_documents(chunks('a.txt', 1)) == 20
+    assert storage.store_documents(chunks('a.txt', 1)) == 0
+    assert storage.store_document('b.txt', 'a.txt round 1 chunk 0', [1.0] * 8)
+    assert not storage.store_document('b.txt', 'a.txt round 1 chunk 0', [1.0] * 8)
+    assert len(storage.documents) == 21
@@ -0,0 +1,75 @@
+# tests/test_metadata.py
+
+import pytest
+from src.storage.metadata import MetadataFilter, MetadataIndex
+
+
+def test_from_dict_passes_through_none_and_filters():
+    assert MetadataFilter.from_dict(None) is None
+    existing = MetadataFilter(sources=['a.txt'])
+    assert MetadataFilter.from_dict(existing) is existing
+    assert MetadataFilter.from_dict(MetadataFilter()) is None
+
+
+def test_from_dict_empty_filters_become_none():
+    assert MetadataFilter.from_dict({}) is None
+    assert MetadataFilter.from_dict({'sources': None, 'date_from': ''}) is None
+
+
+def test_from_dict_normalizes_fields():
+    filters = MetadataFilter.from_dict({
+        'sources': '/kb/a.pdf',
+        'file_types': ['.PDF', 'docx'],
+        'date_from': '2024-03-01',
+        'date_to': '2024-03-31',
+        'tags': 'oncall'
+    })
+    assert filters.sources == ['/kb/a.pdf']
+    assert filters.file_types == ['pdf', 'docx']
+    assert filters.date_from == '2024-03-01 00:00:00'
+    # A bare date as the upper bound covers the whole day
+    assert filters.date_to == '2024-03-31 23:59:59'
+    assert filters.tags == ['oncall']
+
+
+def test_from_dict_rejects_unknown_fields():
+    with pytest.raises(ValueError, match='source'):
+        MetadataFilter.from_dict({'source': 'a.txt'})
+
+
+def test_from_dict_rejects_invalid_dates():
+    with pytest.raises(ValueError):
+        MetadataFilter.from_dict({'date_from': 'last week'})
+
+
+def test_matches():
+    filters = MetadataFilter(file_types=['pdf'], date_from='2024-01-01', tags=['net'])
+    metadata = {'file_type': 'pdf', 'doc_date': '2024-02-01 00:00:00', 'tags': ['net', 'db']}
+    assert filters.matches('a.pdf', metadata)
+    assert not filters.matches('a.pdf', dict(metadata, file_type='docx'))
+    assert not filters.matches('a.pdf', dict(metadata, doc_date='2023-12-31 23:59:59'))
+    assert not filters.matches('a.pdf', dict(metadata, doc_date=None))
+    assert not filters.matches('a.pdf', dict(metadata, tags=['db']))
+
+
+def test_metadata_index_candidates_match_filter():
+    documents = {
+        0: {'file_path': 'a.pdf', 'metadata': {'file_type': 'pdf', 'doc_date': '2024-01-05 00:00:00', 'tags': ['net']}},
+        1: {'file_path': 'a.pdf', 'metadata': {'file_type': 'pdf', 'doc_date': '2023-06-01 00:00:00', 'tags': []}},
+        2: {'file_path': 'b.docx', 'metadata': {'file_type': 'docx', 'doc_date': None, 'tags': ['net']}},
+    }
+    index = MetadataIndex()
+    for doc_id, doc in documents.items():
+        index.add(doc_id, doc['file_path'], doc['metadata'])
+
+    for filters in (
+        MetadataFilter(file_types=['pdf']),
+        MetadataFilter(tags=['net']),
+        MetadataFilter(sources=['a.pdf'], date_from='2024-01-01'),
+        MetadataFilter(date_to='2023-12-31'),
+    ):
+        expected = {doc_id for doc_id, doc in documents.items() if filters.matches(doc['file_path'], doc['metadata'])}
+        assert index.candidates(filters, documents) == expected
+
+    index.remove(0, 'a.pdf', documents[0]['metadata'])
+    assert index.candidates(MetadataFilter(tags=['net']), documents) == {2}
@@ -0,0 +1,68 @@
+# tests/test_parse_cache.py
+
+import os
+from src.processors import manifest
+from src.processors.manifest import file_hash
+from src.processors.parse_cache import ParseCache
+
+
+def blocks(text, count=20):
+    return [{'content': f"{text} {i} " + os.urandom(64).hex(), 'metadata': {'source': 'x', 'position': i}}
+            for i in range(count)]
+
+
+def key(i):
+    return f"{i:02d}" + '0' * 62
+
+
+def test_round_trip_replaces_source(tmp_path):
+    cache = ParseCache(tmp_path)
+    cache.put(key(1), blocks('正文', 2))
+    hit = cache.get(key(1), '/kb/new_name.pdf')
+    assert [block['metadata'] for block in hit] == [
+        {'source': '/kb/new_name.pdf', 'position': 0},
+        {'source': '/kb/new_name.pdf', 'position': 1},
+    ]
+    assert cache.get(key(2), '/kb/a.pdf') is None
+
+
+def test_budget_evicts_least_recently_used(tmp_path):
+    probe = ParseCache(tmp_path / 'probe')
+    probe.put(key(0), blocks('x'))
+    entry_size = probe.total_bytes
+
+    cache = ParseCache(tmp_path / 'cache', max_bytes=int(entry_size * 4.5))
+    for i in range(4):
+        cache.put(key(i), blocks('x'))
+        os.utime(cache._path(key(i)), (1000 + i, 1000 + i))
+    # 命中刷新使用时间，最旧的变为 1
+    assert cache.get(key(0), 'a') is not None
+    cache.put(key(4), blocks('x'))
+
+    assert cache.total_bytes <= int(entry_size * 4.5 * 0.9)
+    assert cache.get(key(1), 'a') is None
+    assert cache.get(key(0), 'a') is not None
+    assert cache.get(key(4), 'a') is not None
+    # 重新打开时按磁盘上的文件统计大小
+    assert ParseCache(tmp_path / 'cache', max_bytes=10 ** 9).total_bytes == cache.total_bytes
+
+
+def test_file_hash_reads_unchanged_file_once(tmp_path, monkeypatch):
+    path = tmp_path / 'a.txt'
+    path.write_bytes(b'runbook')
+    first = file_hash(str(path))
+
+    opened = []
+
+    def tracking_open(file, *args, **kwargs):
+        opened.append(file)
+        return open(file, *args, **kwargs)
+
+    monkeypatch.setattr(manifest, 'open', tracking_open, raising=False)
+    assert file_hash(str(path)) == first
+    assert opened == []
+
+    path.write_bytes(b'runbook v2')
+    os.utime(path, ns=(1, 1))
+    assert file_hash(str(path)) != first
+    assert opened == [str(path)]
@@ -0,0 +1,96 @@
+# tests/test_read_write_lock.py
+
+import threading
+import time
+from src.storage.vector_index import ReadWriteLock
+
+
+def test_readers_share_the_lock():
+    lock = ReadWriteLock()
+    inside = threading.Barrier(3, timeout=2)
+
+    def reader():
+        with lock.read():
+            # All three readers must be inside at once for the barrier to open
+            inside.wait()
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not inside.broken
+
+
+def test_writer_excludes_readers_and_writers():
+    lock = ReadWriteLock()
+    state = {'writers': 0, 'readers': 0, 'violations': 0}
+    guard = threading.Lock()
+
+    def enter(kind):
+        with guard:
+            state[kind] += 1
+            if state['writers'] > 1 or (state['writers'] and state['readers']):
+                state['violations'] += 1
+
+    def leave(kind):
+        with guard:
+            state[kind] -= 1
+
+    def writer():
+        for _ in range(50):
+            with lock.write():
+                enter('writers')
+                time.sleep(0.0005)
+                leave('writers')
+
+    def reader():
+        for _ in range(100):
+            with lock.read():
+                enter('readers')
+                time.sleep(0.0002)
+                leave('readers')
+
+    threads = [threading.Thread(target=writer) for _ in range(2)] + \
+              [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert state['violations'] == 0
+
+
+def test_writer_is_not_starved_by_readers():
+    lock = ReadWriteLock()
+    stop = threading.Event()
+
+    def reader():
+        # Overlapping read sections keep the reader count above zero at all times
+        while not stop.is_set():
+            with lock.read():
+                time.sleep(0.005)
+
+    readers = [threading.Thread(target=reader) for _ in range(8)]
+    for thread in readers:
+        thread.start()
+    time.sleep(0.05)
+
+    waits = []
+
+    def writer():
+        for _ in range(5):
+            start = time.monotonic()
+            with lock.write():
+                waits.append(time.monotonic() - start)
+            time.sleep(0.01)
+
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    writer_thread.join(timeout=5)
+    finished = not writer_thread.is_alive()
+    stop.set()
+    for thread in readers + [writer_thread]:
+        thread.join()
+    assert finished
+    # A writer waits only for the read sections already in progress
+    assert max(waits) < 0.5
@@ -0,0 +1,120 @@
+# tests/test_snapshot.py
+
+import numpy as np
+from src.storage.base_storage import MemoryStorage
+from src.storage.snapshot import SnapshotStore
+from src.storage.vector_index import VectorIndex
+
+
+def unit_vectors(count: int, dimension: int = 16, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def records(start: int, count: int, file_path: str):
+    return [(i, file_path, f"chunk {i}", {'file_type': 'txt', 'tags': ['t']}) for i in range(start, start + count)]
+
+
+def test_append_and_load(tmp_path):
+    vectors = unit_vectors(30)
+    store = SnapshotStore(tmp_path)
+    store.append(vectors[:10], records(0, 10, 'a.txt'))
+    store.append(vectors[10:], records(10, 20, 'b.txt'))
+
+    loaded, documents, file_ids = SnapshotStore(tmp_path).load()
+    assert isinstance(loaded, np.memmap)
+    assert np.array_equal(np.asarray(loaded), vectors)
+    assert file_ids == {'a.txt': list(range(10)), 'b.txt': list(range(10, 30))}
+    assert documents[12] == {'file_path': 'b.txt', 'content': 'chunk 12',
+                             'metadata': {'file_type': 'txt', 'tags': ['t']}}
+
+
+def test_tombstones_hide_deleted_files(tmp_path):
+    store = SnapshotStore(tmp_path)
+    store.append(unit_vectors(10), records(0, 5, 'a.txt') + records(5, 5, 'b.txt'))
+    store.delete_file('a.txt', 5)
+
+    reopened = SnapshotStore(tmp_path)
+    loaded, documents, file_ids = reopened.load()
+    # Deleted rows stay in the vector file so ids keep matching row numbers
+    assert loaded.shape == (10, 16)
+    assert sorted(documents) == list(range(5, 10))
+    assert file_ids == {'b.txt': list(range(5, 10))}
+    assert reopened.deleted_rows == 5
+
+
+def test_torn_append_is_truncated(tmp_path):
+    vectors = unit_vectors(4)
+    store = SnapshotStore(tmp_path)
+    store.append(vectors[:2], records(0, 2, 'a.txt'))
+    # Simulate a crash after the data files were written but before meta.json
+    with open(store._vectors_path(0), 'ab') as f:
+        f.write(vectors[2:].tobytes())
+    with open(store._chunks_path(0), 'ab') as f:
+        f.write(b'[2, "a.txt", "chunk 2"')
+
+    loaded, documents, _ = SnapshotStore(tmp_path).load()
+    assert loaded.shape == (2, 16)
+    assert sorted(documents) == [0, 1]
+
+
+def test_rewrite_renumbers_live_rows(tmp_path):
+    vectors = unit_vectors(6)
+    store = SnapshotStore(tmp_path)
+    store.append(vectors, records(0, 3, 'a.txt') + records(3, 3, 'b.txt'))
+    store.delete_file('a.txt', 3)
+    store.rewrite(vectors[3:], [('b.txt', f"chunk {i}", {}) for i in range(3, 6)])
+
+    loaded, documents, file_ids = SnapshotStore(tmp_path).load()
+    assert np.array_equal(np.asarray(loaded), vectors[3:])
+    assert file_ids == {'b.txt': [0, 1, 2]}
+    assert documents[0]['content'] == 'chunk 3'
+    assert not (tmp_path / 'vectors-0.f32').exists()
+
+
+def test_attach_searches_snapshot_rows(tmp_path):
+    vectors = unit_vectors(50)
+    store = SnapshotStore(tmp_path)
+    store.append(vectors, records(0, 20, 'a.txt') + records(20, 30, 'b.txt'))
+    store.delete_file('a.txt', 20)
+    loaded, _, file_ids = SnapshotStore(tmp_path).load()
+
+    index = VectorIndex(ann_min_size=10 ** 9, codec='float32')
+    index.attach(loaded, file_ids)
+    assert len(index) == 30
+    scores, ids = index.search(vectors[25], top_k=3)
+    assert ids[0] == 25
+    assert np.isclose(scores[0], 1.0, atol=1e-5)
+    assert all(doc_id >= 20 for doc_id in ids)
+
+    # Ids continue after the attached rows
+    assert index.add(unit_vectors(1, seed=1), 'c.txt') == [50]
+
+
+def test_memory_storage_restores_from_snapshot(tmp_path):
+    vectors = unit_vectors(20)
+    storage = MemoryStorage(snapshot_dir=tmp_path)
+    storage.store_documents([
+        {'file_path': 'a.txt', 'chunk_content': f"router r{i} reboot", 'embedding': vectors[i].tolist(),
+         'metadata': {'file_type': 'txt'}}
+        for i in range(20)
+    ])
+    storage.delete_document('a.txt')
+    storage.store_documents([
+        {'file_path': 'b.txt', 'chunk_content': f"switch s{i} uplink", 'embedding': vectors[i].tolist(),
+         'metadata': {'file_type': 'txt'}}
+        for i in range(10)
+    ])
+    storage.close()
+
+    restored = MemoryStorage(snapshot_dir=tmp_path)
+    assert len(restored.documents) == 10
+    results = restored.retrieve_similar(vectors[3].tolist(), top_k=1)
+    assert results[0]['text'] == 'switch s3 uplink'
+    assert results[0]['metadata']['source'] == 'b.txt'
+
+    restored._lexical_built.wait(10)
+    assert restored.lexical_ready()
+    hybrid = restored.retrieve_hybrid('s7', vectors[7].tolist(), top_k=1)
+    assert hybrid[0]['text'] == 'switch s7 uplink'
+    restored.close()
@@ -0,0 +1,69 @@
+# tests/test_vector_codec.py
+
+import numpy as np
+import pytest
+from src.storage.vector_codec import make_codec
+from src.storage.vector_index import VectorIndex
+
+
+def unit_vectors(count: int, dimension: int = 32, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def brute_force(vectors: np.ndarray, query: np.ndarray, top_k: int) -> np.ndarray:
+    return np.argsort(-(vectors @ query), kind='stable')[:top_k]
+
+
+@pytest.mark.parametrize('codec', ['float16', 'int8'])
+def test_lossy_codec_reranks_with_originals(codec):
+    vectors = unit_vectors(500)
+    index = VectorIndex(ann_min_size=10 ** 9, codec=codec, rerank=4)
+    index.add(vectors, 'a.txt')
+
+    for query in unit_vectors(5, seed=5):
+        scores, ids = index.search(query, top_k=5)
+        assert ids.tolist() == brute_force(vectors, query, 5).tolist()
+        assert np.allclose(scores, vectors[ids] @ query, atol=1e-5)
+
+
+@pytest.mark.parametrize('name, tolerance', [
+    ('float32', 1e-7),
+    ('float16', 1e-3),
+    ('int8', 1e-2),
+])
+def test_codec_round_trip(name, tolerance):
+    vectors = unit_vectors(200, dimension=64)
+    codec = make_codec(name, 64)
+    codes = codec.encode(vectors)
+    assert codes.shape == (200, codec.code_size)
+    assert codes.dtype == codec.dtype
+    assert np.abs(codec.decode(codes) - vectors).max() <= tolerance
+
+    query = unit_vectors(1, dimension=64, seed=6)[0]
+    assert np.allclose(codec.scores(codes, query), codec.decode(codes) @ query, atol=1e-5)
+    queries = unit_vectors(3, dimension=64, seed=7)
+    assert np.allclose(codec.scores_batch(codes, queries), queries @ codec.decode(codes).T, atol=1e-5)
+
+
+def test_pq_codec_round_trip():
+    vectors = unit_vectors(2000, dimension=64)
+    codec = make_codec('pq', 64, n_subspaces=16)
+    assert not codec.is_trained
+    codec.train(vectors)
+    assert codec.is_trained
+
+    codes = codec.encode(vectors)
+    assert codes.shape == (2000, 16)
+    assert codec.bytes_per_vector == 16
+    decoded = codec.decode(codes)
+    # Quantization error must stay well below the norm of the vectors themselves
+    assert np.mean(np.linalg.norm(decoded - vectors, axis=1)) < 0.6
+
+    query = vectors[0]
+    assert np.allclose(codec.scores(codes, query), decoded @ query, atol=1e-4)
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        make_codec('float64', 8)
@@ -0,0 +1,77 @@
+# tests/test_vector_index.py
+
+import numpy as np
+from src.storage.vector_index import VectorIndex
+
+
+def unit_vectors(count: int, dimension: int = 32, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def brute_force(vectors: np.ndarray, query: np.ndarray, top_k: int) -> np.ndarray:
+    return np.argsort(-(vectors @ query), kind='stable')[:top_k]
+
+
+def test_exact_search_matches_brute_force():
+    vectors = unit_vectors(500)
+    index = VectorIndex(ann_min_size=10 ** 9, codec='float32')
+    ids = index.add(vectors, 'a.txt')
+    assert ids == list(range(500))
+    assert not index.is_approximate
+
+    for query in unit_vectors(5, seed=1):
+        scores, found = index.search(query, top_k=10)
+        assert found.tolist() == brute_force(vectors, query, 10).tolist()
+        assert np.allclose(scores, vectors[found] @ query, atol=1e-5)
+
+
+def test_ivf_search_agrees_with_exact_search():
+    vectors = unit_vectors(2000)
+    index = VectorIndex(ann_min_size=1000, n_lists=16, n_probe=16, codec='float32')
+    index.add(vectors, 'a.txt')
+    assert index.is_approximate
+
+    for query in unit_vectors(5, seed=2):
+        exact_scores, exact_ids = index.search(query, top_k=10, exact=True)
+        # Probing every list visits every row, so IVF must return the exact top_k
+        ivf_scores, ivf_ids = index.search(query, top_k=10)
+        assert ivf_ids.tolist() == exact_ids.tolist()
+        assert np.allclose(ivf_scores, exact_scores)
+
+
+def test_ivf_recall_with_few_probes():
+    vectors = unit_vectors(4000)
+    index = VectorIndex(ann_min_size=1000, n_lists=32, n_probe=8, codec='float32')
+    index.add(vectors, 'a.txt')
+    queries = vectors[:50] + 0.05 * unit_vectors(50, seed=3)
+
+    recall = np.mean([
+        index.search(query, top_k=1)[1][0] == brute_force(vectors, index.normalize(query), 1)[0]
+        for query in queries
+    ])
+    assert recall >= 0.9
+
+
+def test_search_batch_matches_search():
+    vectors = unit_vectors(300)
+    index = VectorIndex(ann_min_size=10 ** 9, codec='float32')
+    index.add(vectors, 'a.txt')
+    queries = unit_vectors(7, seed=4)
+
+    for query, (scores, ids) in zip(queries, index.search_batch(queries, top_k=5)):
+        expected_scores, expected_ids = index.search(query, top_k=5)
+        assert ids.tolist() == expected_ids.tolist()
+        assert np.allclose(scores, expected_scores, atol=1e-5)
+
+
+def test_deleted_rows_are_not_returned():
+    vectors = unit_vectors(100)
+    index = VectorIndex(ann_min_size=10 ** 9, codec='float32')
+    index.add(vectors[:50], 'a.txt')
+    index.add(vectors[50:], 'b.txt')
+
+    assert index.delete_file('a.txt') == list(range(50))
+    assert len(index) == 50
+    _, ids = index.search(vectors[0], top_k=100)
+    assert sorted(ids.tolist()) == list(range(50, 100))